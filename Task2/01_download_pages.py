@@ -1,13 +1,45 @@
 """
 Скрипт для скачивания HTML-страниц с Star Wars Fandom.
-Сохраняет исходные HTML-файлы для последующей обработки.
+Сохраняет исходные HTML-страницы для последующей обработки: по умолчанию
+в сжатое хранилище raw_store/ (blob_store.py), с флагом --raw-format html -
+отдельными файлами в raw_html/.
+
+С флагом --api страницы скачиваются через MediaWiki API (mediawiki_api.py):
+ревизии и викитекст статей запрашиваются пачками по 50 страниц, а викитекст
+преобразуется в HTML локально (wikitext.py).
 """
 
 import os
+import argparse
+import asyncio
 import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import time
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import mediawiki_api
+from blob_store import STORE_DIR, BlobStore, default_raw_format
+from rate_limit import AsyncRateLimiter, RateLimiter
+from fetch_state import (
+    FETCH_STATE_FILE,
+    CHANGED,
+    UNCHANGED,
+    FAILED,
+    load_fetch_state,
+    save_fetch_state,
+    conditional_headers,
+    record_fetch,
+    forget_page,
+)
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp нужен только для асинхронного режима
+    aiohttp = None
 
 # Список ключевых страниц для скачивания
 PAGES = [
@@ -55,18 +87,25 @@ PAGES = [
 
 BASE_URL = "https://starwars.fandom.com/wiki/"
 OUTPUT_DIR = "raw_html"
+RAW_FORMATS = ["store", "html"]  # Сжатое хранилище raw_store/ или файлы в raw_html/
 DELAY = 1  # Задержка между запросами в секундах
 
+# Параметры асинхронного режима
+CONCURRENCY = 8  # Количество одновременных запросов
+RATE_PER_HOST = 4.0  # Максимум запросов в секунду на один хост
+TIMEOUT = 30  # Таймаут запроса в секундах
 
-def download_page(page_name: str) -> str:
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+
+def download_page(page_name: str, base_url: str = BASE_URL) -> str:
     """Скачивает HTML-страницу и возвращает её содержимое."""
-    url = BASE_URL + page_name
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
+    url = base_url + page_name
     
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = requests.get(url, headers=HEADERS, timeout=TIMEOUT)
         response.raise_for_status()
         return response.text
     except requests.RequestException as e:
@@ -74,40 +113,419 @@ def download_page(page_name: str) -> str:
         return None
 
 
+def html_path(page_name: str) -> str:
+    """Возвращает путь к HTML-файлу страницы."""
+    return os.path.join(OUTPUT_DIR, f"{page_name}.html")
+
+
+def raw_page_path(page_name: str, store: Optional[BlobStore] = None) -> Optional[str]:
+    """Возвращает путь к сохраненной странице: блоб в хранилище или HTML-файл."""
+    if store is not None:
+        return store.path(page_name)
+    return html_path(page_name)
+
+
+def read_page(page_name: str, store: Optional[BlobStore] = None) -> Optional[str]:
+    """Читает сохраненную страницу или возвращает None, если ее нет."""
+    if store is not None:
+        return store.read(page_name) if store.has(page_name) else None
+    if not os.path.exists(html_path(page_name)):
+        return None
+    with open(html_path(page_name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def prepare_conditional_headers(
+    fetch_state: Dict,
+    page_name: str,
+    cached_path: Optional[str] = None,
+    store: Optional[BlobStore] = None
+) -> Dict[str, str]:
+    """
+    Возвращает заголовки условного запроса для страницы.
+    Если сохраненного результата (по умолчанию сохраненной страницы в хранилище
+    или HTML-файла) нет на диске, метаданные сбрасываются, чтобы страница была скачана заново.
+    """
+    if cached_path is None:
+        cached_path = raw_page_path(page_name, store)
+    if not (cached_path and os.path.exists(cached_path)):
+        forget_page(fetch_state, page_name)
+    return {**HEADERS, **conditional_headers(fetch_state, page_name)}
+
+
+def fetch_page(
+    page_name: str,
+    fetch_state: Dict,
+    base_url: str = BASE_URL,
+    cached_path: Optional[str] = None,
+    session: Optional[requests.Session] = None,
+    store: Optional[BlobStore] = None,
+    state_lock: Optional[ContextManager] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Скачивает страницу условным запросом (If-None-Match / If-Modified-Since).
+    
+    Args:
+        page_name: Название страницы
+        fetch_state: Состояние скачивания
+        base_url: Базовый URL вики
+        cached_path: Файл, наличие которого разрешает условный запрос
+            (по умолчанию сохраненная страница, см. raw_page_path())
+        session: Сессия requests для переиспользования соединений
+        store: Хранилище страниц (None - HTML-файлы в OUTPUT_DIR)
+        state_lock: Блокировка состояния скачивания, если его меняют несколько потоков
+            (запрос выполняется без нее)
+    
+    Returns:
+        Кортеж (статус, HTML): статус CHANGED, UNCHANGED или FAILED,
+        HTML возвращается только для изменившихся страниц
+    """
+    url = base_url + page_name
+    state_lock = state_lock or nullcontext()
+    with state_lock:
+        headers = prepare_conditional_headers(fetch_state, page_name, cached_path, store)
+    
+    try:
+        response = (session or requests).get(url, headers=headers, timeout=TIMEOUT)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"Ошибка при скачивании {page_name}: {e}")
+        with state_lock:
+            return record_fetch(fetch_state, page_name, None), None
+    
+    html_content = response.text if response.status_code == 200 else None
+    with state_lock:
+        status = record_fetch(fetch_state, page_name, response.status_code, html_content, response.headers)
+    return status, html_content if status == CHANGED else None
+
+
 def save_html(page_name: str, html_content: str):
     """Сохраняет HTML-контент в файл."""
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    filepath = os.path.join(OUTPUT_DIR, f"{page_name}.html")
+    filepath = html_path(page_name)
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(html_content)
     return filepath
 
 
-def main():
-    """Основная функция для скачивания всех страниц."""
-    print("Начинаю скачивание страниц с Star Wars Fandom...")
-    print(f"Всего страниц: {len(PAGES)}\n")
+def save_page(page_name: str, html_content: str, store: Optional[BlobStore] = None):
+    """Сохраняет страницу в хранилище или, если оно не передано, в HTML-файл."""
+    if store is not None:
+        return store.put(page_name, html_content)
+    return save_html(page_name, html_content)
+
+
+async def fetch_page_async(
+    session,
+    page_name: str,
+    buckets: Dict[str, AsyncRateLimiter],
+    rate: float,
+    fetch_state: Optional[Dict] = None,
+    base_url: str = BASE_URL,
+    store: Optional[BlobStore] = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Асинхронно скачивает страницу с учетом ограничения частоты для хоста.
+    Если передано состояние скачивания, запрос выполняется условным.
+    
+    Returns:
+        Кортеж (статус, HTML), как в fetch_page()
+    """
+    url = base_url + page_name
+    host = urlsplit(url).netloc
+    headers = prepare_conditional_headers(fetch_state, page_name, store=store) if fetch_state is not None else None
+    
+    if host not in buckets:
+        buckets[host] = AsyncRateLimiter(rate)
+    await buckets[host].acquire()
+    
+    try:
+        async with session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            status_code = response.status
+            response_headers = response.headers
+            html_content = await response.text() if status_code == 200 else None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        print(f"Ошибка при скачивании {page_name}: {e}")
+        if fetch_state is not None:
+            record_fetch(fetch_state, page_name, None)
+        return FAILED, None
+    
+    if fetch_state is None:
+        return CHANGED, html_content
+    
+    status = record_fetch(fetch_state, page_name, status_code, html_content, response_headers)
+    return status, html_content if status == CHANGED else None
+
+
+async def download_pages_async(
+    pages: List[str],
+    handle_page: Callable[[str, str], None],
+    concurrency: int = CONCURRENCY,
+    rate: float = RATE_PER_HOST,
+    base_url: str = BASE_URL,
+    fetch_state: Optional[Dict] = None,
+    store: Optional[BlobStore] = None
+) -> Tuple[int, int, List[str]]:
+    """
+    Скачивает страницы асинхронно: держит открытым пул соединений
+    и выполняет до `concurrency` запросов одновременно.
+    
+    Args:
+        pages: Список страниц для скачивания
+        handle_page: Функция, которая вызывается для каждой изменившейся страницы
+        concurrency: Количество одновременных запросов
+        rate: Ограничение запросов в секунду на один хост
+        base_url: Базовый URL вики
+        fetch_state: Состояние скачивания для условных запросов (None - скачивать всё)
+        store: Хранилище, в котором проверяется наличие сохраненных страниц
+            (None - HTML-файлы в OUTPUT_DIR)
+        
+    Returns:
+        Кортеж (скачано изменившихся страниц, не изменилось, список страниц с ошибками)
+    """
+    if aiohttp is None:
+        raise ImportError("Для асинхронного режима установите aiohttp: pip install aiohttp")
     
+    queue: asyncio.Queue = asyncio.Queue()
+    for page_name in pages:
+        queue.put_nowait(page_name)
+    
+    buckets: Dict[str, AsyncRateLimiter] = {}
     downloaded = 0
+    unchanged = 0
     failed = []
+    progress = tqdm(total=len(pages), desc="Скачивание")
+    
+    async def worker(session):
+        nonlocal downloaded, unchanged
+        while True:
+            try:
+                page_name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            
+            status, html_content = await fetch_page_async(
+                session, page_name, buckets, rate, fetch_state, base_url, store
+            )
+            if status == CHANGED and html_content:
+                handle_page(page_name, html_content)
+                downloaded += 1
+            elif status == UNCHANGED:
+                unchanged += 1
+            else:
+                failed.append(page_name)
+            progress.update(1)
+    
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=concurrency)
+    timeout = aiohttp.ClientTimeout(total=TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+        await asyncio.gather(*(worker(session) for _ in range(min(concurrency, len(pages)) or 1)))
+    
+    progress.close()
+    return downloaded, unchanged, failed
+
+
+def has_cached_page(page_name: str, store: Optional[BlobStore] = None) -> bool:
+    """Есть ли сохраненная копия страницы."""
+    cached_path = raw_page_path(page_name, store)
+    return bool(cached_path) and os.path.exists(cached_path)
+
+
+def download_pages_api(
+    pages: List[str],
+    handle_page: Callable[[str, str], None],
+    fetch_state: Dict,
+    api_url: str = mediawiki_api.API_URL,
+    rate: float = RATE_PER_HOST,
+    store: Optional[BlobStore] = None,
+    parse_articles: bool = False
+) -> Tuple[int, int, List[str]]:
+    """
+    Скачивает страницы через MediaWiki API.
+    
+    Для страниц без сохраненной копии текущая ревизия и викитекст запрашиваются
+    вместе, пачками до 50 страниц (action=query). Для остальных сначала
+    запрашиваются только номера ревизий, а викитекст - пачками по номерам
+    ревизий и только для изменившихся страниц. Номер ревизии хранится в fetch_state.json.
+    Викитекст преобразуется в HTML локально (wikitext.py); если викитекста нет
+    или parse_articles=True, HTML статьи скачивается через action=parse по одной странице.
+    
+    Returns:
+        Кортеж (скачано изменившихся страниц, не изменилось, список страниц с ошибками)
+    """
+    limiter = RateLimiter(rate)
+    session = requests.Session()
+    session.headers.update(HEADERS)
     
-    for page_name in tqdm(PAGES, desc="Скачивание"):
-        html_content = download_page(page_name)
+    cached = [page_name for page_name in pages
+              if fetch_state["pages"].get(page_name, {}).get("revid") and has_cached_page(page_name, store)]
+    cached_set = set(cached)
+    fresh = [page_name for page_name in pages if page_name not in cached_set]
+    
+    try:
+        revisions = mediawiki_api.query_revisions(session, cached, api_url, limiter)
+        revisions.update(mediawiki_api.query_revisions(session, fresh, api_url, limiter,
+                                                       content=not parse_articles))
+        changed_revids = [
+            revisions[page_name]["revid"] for page_name in cached
+            if revisions[page_name] is not None
+            and revisions[page_name]["revid"] != fetch_state["pages"][page_name]["revid"]
+        ]
+        contents = {} if parse_articles else mediawiki_api.query_contents(session, changed_revids, api_url, limiter)
+    except (requests.RequestException, ValueError, mediawiki_api.MediaWikiApiError) as e:
+        print(f"Ошибка при запросе ревизий: {e}")
+        return 0, 0, list(pages)
+    
+    downloaded = 0
+    unchanged = 0
+    failed = []
+    for page_name in tqdm(pages, desc="Скачивание"):
+        revision = revisions.get(page_name)
+        if revision is None:
+            print(f"Страница {page_name} не найдена")
+            record_fetch(fetch_state, page_name, None)
+            failed.append(page_name)
+            continue
         
-        if html_content:
-            save_html(page_name, html_content)
-            downloaded += 1
-        else:
+        revid = revision["revid"]
+        if page_name in cached_set and fetch_state["pages"][page_name]["revid"] == revid:
+            record_fetch(fetch_state, page_name, 304)
+            unchanged += 1
+            continue
+        
+        revision = contents.get(revid, revision)
+        html_content = None
+        if revision.get("content") is not None:
+            html_content = mediawiki_api.wikitext_article(revision["title"], revision["content"])
+        try:
+            if html_content is None:
+                html_content = mediawiki_api.fetch_article(session, revid, api_url, limiter)
+        except (requests.RequestException, ValueError, mediawiki_api.MediaWikiApiError) as e:
+            print(f"Ошибка при скачивании {page_name}: {e}")
+            record_fetch(fetch_state, page_name, None)
             failed.append(page_name)
+            continue
         
-        # Задержка между запросами, чтобы не перегружать сервер
-        time.sleep(DELAY)
+        status = record_fetch(fetch_state, page_name, 200, html_content)
+        fetch_state["pages"][page_name]["revid"] = revid
+        if status == CHANGED or not has_cached_page(page_name, store):
+            handle_page(page_name, html_content)
+            downloaded += 1
+        else:
+            unchanged += 1
+    
+    return downloaded, unchanged, failed
+
+
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Скачивание HTML-страниц с Star Wars Fandom")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Асинхронный режим с пулом соединений")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY,
+                        help=f"Количество одновременных запросов (по умолчанию {CONCURRENCY})")
+    parser.add_argument("--rate", type=float, default=RATE_PER_HOST,
+                        help=f"Максимум запросов в секунду на хост (по умолчанию {RATE_PER_HOST})")
+    parser.add_argument("--base-url", default=BASE_URL, help="Базовый URL вики")
+    parser.add_argument("--api", action="store_true",
+                        help="Скачивать через MediaWiki API: ревизии и викитекст пачками по 50 страниц")
+    parser.add_argument("--api-parse", action="store_true",
+                        help="В режиме --api скачивать HTML каждой статьи через action=parse "
+                             "(с раскрытыми шаблонами, запрос на страницу)")
+    parser.add_argument("--api-url", default=mediawiki_api.API_URL,
+                        help=f"Адрес api.php (по умолчанию {mediawiki_api.API_URL})")
+    parser.add_argument("--force", action="store_true",
+                        help="Скачать все страницы заново, игнорируя сохраненные ETag/Last-Modified")
+    parser.add_argument("--raw-format", choices=RAW_FORMATS, default=None,
+                        help=f"Куда сохранять страницы: сжатое хранилище {STORE_DIR}/ или файлы в "
+                             f"{OUTPUT_DIR}/ (по умолчанию {STORE_DIR}/, если оно создано "
+                             f"или нет {OUTPUT_DIR}/, иначе {OUTPUT_DIR}/)")
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция для скачивания всех страниц."""
+    args = parse_args()
+    
+    print("Начинаю скачивание страниц с Star Wars Fandom...")
+    print(f"Всего страниц: {len(PAGES)}\n")
+    
+    fetch_state = load_fetch_state()
+    if args.force:
+        fetch_state["pages"] = {}
+    
+    raw_format = args.raw_format or default_raw_format(OUTPUT_DIR)
+    store = BlobStore() if raw_format == "store" else None
+    handle_page = partial(save_page, store=store)
     
-    print(f"\n✓ Скачано успешно: {downloaded}/{len(PAGES)}")
+    try:
+        if args.api:
+            print(f"Режим MediaWiki API: {args.api_url}, не более {args.rate} запросов/с\n")
+            downloaded, unchanged, failed = download_pages_api(
+                PAGES, handle_page, fetch_state, args.api_url, args.rate, store, args.api_parse
+            )
+            report(downloaded, unchanged, failed, store)
+            return
+        
+        if args.use_async:
+            print(f"Асинхронный режим: {args.concurrency} запросов одновременно, "
+                  f"не более {args.rate} запросов/с на хост\n")
+            downloaded, unchanged, failed = asyncio.run(download_pages_async(
+                PAGES,
+                handle_page,
+                concurrency=args.concurrency,
+                rate=args.rate,
+                base_url=args.base_url,
+                fetch_state=fetch_state,
+                store=store
+            ))
+            report(downloaded, unchanged, failed, store)
+            return
+        
+        downloaded = 0
+        unchanged = 0
+        failed = []
+        
+        for page_name in tqdm(PAGES, desc="Скачивание"):
+            status, html_content = fetch_page(page_name, fetch_state, args.base_url, store=store)
+            
+            if status == CHANGED:
+                handle_page(page_name, html_content)
+                downloaded += 1
+            elif status == UNCHANGED:
+                unchanged += 1
+            else:
+                failed.append(page_name)
+            
+            # Задержка между запросами, чтобы не перегружать сервер
+            time.sleep(DELAY)
+        
+        report(downloaded, unchanged, failed, store)
+    finally:
+        save_fetch_state(fetch_state)
+        if store is not None:
+            store.close()
+
+
+def report(downloaded: int, unchanged: int, failed: List[str], store: Optional[BlobStore] = None):
+    """Выводит итоговую статистику скачивания."""
+    print(f"\n✓ Скачано успешно: {downloaded + unchanged}/{len(PAGES)}")
+    print(f"  Изменилось: {downloaded}, без изменений (304 или тот же хеш): {unchanged}")
     if failed:
         print(f"✗ Ошибки при скачивании: {', '.join(failed)}")
     
-    print(f"\nHTML-файлы сохранены в папку: {OUTPUT_DIR}/")
+    if store is not None:
+        # Старые версии изменившихся страниц больше не нужны
+        removed = store.gc()
+        stats = store.stats()
+        print(f"\nСтраницы сохранены в хранилище: {store.root}/ "
+              f"(уникальных: {stats['blobs']}, сжато {stats['size'] // 1024} КБ -> {stats['stored_size'] // 1024} КБ)")
+        if removed["blobs"]:
+            print(f"  Удалено старых версий страниц: {removed['blobs']} ({removed['bytes'] // 1024} КБ)")
+    else:
+        print(f"\nHTML-файлы сохранены в папку: {OUTPUT_DIR}/")
+    print(f"Метаданные скачивания сохранены в {FETCH_STATE_FILE}")
 
 
 if __name__ == "__main__":
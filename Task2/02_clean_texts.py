@@ -1,23 +1,75 @@
 """
 Скрипт для очистки HTML и извлечения чистого текста.
 Сохраняет тексты в отдельных файлах (один файл = одна сущность).
+Страницы читаются из сжатого хранилища raw_store/ потоком через распаковщик
+или, с флагом --raw-format html, из файлов в raw_html/.
 """
 
 import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+from functools import partial
 from bs4 import BeautifulSoup
+import lxml.html
 from tqdm import tqdm
 import re
 
+from blob_store import STORE_DIR, BlobStore, default_raw_format, store_exists
+from manifest import Manifest, stage_key
+from term_replacer import file_sha256
+
 INPUT_DIR = "raw_html"
 OUTPUT_DIR = "cleaned_texts"
+WORKERS = 1  # Количество процессов для очистки (1 - последовательная обработка)
+MAX_CHUNKSIZE = 64  # Максимум файлов в одной задаче для пула процессов
+
+# Элементы, которые не относятся к содержимому статьи
+UNWANTED_TAGS = ["script", "style", "nav", "footer", "header", "aside"]
+
+# Основной контент статьи MediaWiki (совпадает с поиском BeautifulSoup по классу)
+CONTENT_ROOT_XPATH = "//div[contains(concat(' ', normalize-space(@class), ' '), ' mw-parser-output ')]"
+FALLBACK_ROOT_TAGS = ["main", "article", "body"]
+
+# Теги, текст внутри которых BeautifulSoup не включает в get_text()
+NON_CONTENT_TEXT_XPATH = ".//template|.//rt|.//rp"
+
+EXTRACTORS = ["lxml", "bs4"]
+DEFAULT_EXTRACTOR = "lxml"
+
+RAW_FORMATS = ["store", "html"]  # Сжатое хранилище raw_store/ или файлы в raw_html/
+
+# Хранилище, открытое в этом процессе (у каждого процесса пула свое соединение с индексом)
+_worker_store: Optional[BlobStore] = None
+
+# Версия алгоритма очистки: увеличить при изменении результата clean_text(),
+# чтобы конвейер заново очистил все документы
+CLEANER_VERSION = "1"
+
+
+def clean_key(html_hash: str, extractor: str = DEFAULT_EXTRACTOR) -> str:
+    """
+    Ключ входа этапа очистки для манифеста (manifest.py): хеш HTML, версия
+    очистки и способ извлечения текста, если он не по умолчанию.
+    """
+    if extractor == DEFAULT_EXTRACTOR:
+        return stage_key(html_hash, CLEANER_VERSION)
+    return stage_key(html_hash, CLEANER_VERSION, extractor)
+
+
+def normalize_whitespace(text: str) -> str:
+    """Очищает текст от лишних пробелов и переносов строк."""
+    text = re.sub(r"\n{3,}", "\n\n", text)  # Убираем множественные переносы
+    text = re.sub(r"[ \t]+", " ", text)  # Убираем множественные пробелы
+    return text.strip()
 
 
-def clean_text(html_content: str) -> str:
-    """Извлекает и очищает текст из HTML."""
+def clean_text_bs4(html_content: str) -> str:
+    """Извлекает и очищает текст из HTML с помощью дерева BeautifulSoup."""
     soup = BeautifulSoup(html_content, "lxml")
     
     # Удаляем ненужные элементы
-    for element in soup.find_all(["script", "style", "nav", "footer", "header", "aside"]):
+    for element in soup.find_all(UNWANTED_TAGS):
         element.decompose()
     
     # Находим основной контент статьи
@@ -31,17 +83,99 @@ def clean_text(html_content: str) -> str:
     # Извлекаем текст
     text = main_content.get_text(separator="\n", strip=True)
     
-    # Очищаем от лишних пробелов и переносов
-    text = re.sub(r"\n{3,}", "\n\n", text)  # Убираем множественные переносы
-    text = re.sub(r"[ \t]+", " ", text)  # Убираем множественные пробелы
-    text = text.strip()
+    return normalize_whitespace(text)
+
+
+def clean_text_lxml(html_content: str, content_root_xpath: str = CONTENT_ROOT_XPATH) -> str:
+    """
+    Извлекает и очищает текст из HTML напрямую через lxml и XPath,
+    без построения дерева BeautifulSoup. Результат совпадает с clean_text_bs4().
     
-    return text
+    content_root_xpath задает основной контент страницы для других источников
+    (например, экспорта Confluence); по умолчанию - статья MediaWiki.
+    """
+    return extract_text_lxml(lxml.html.document_fromstring(html_content), content_root_xpath)
 
 
-def process_html_file(html_file: str) -> str:
-    """Обрабатывает один HTML-файл и возвращает очищенный текст."""
-    filepath = os.path.join(INPUT_DIR, html_file)
+def clean_text_stream(
+    stream: BinaryIO,
+    extractor: str = DEFAULT_EXTRACTOR,
+    content_root_xpath: str = CONTENT_ROOT_XPATH,
+    encoding: str = "utf-8"
+) -> str:
+    """
+    Извлекает и очищает текст из потока байтов HTML (по умолчанию в UTF-8).
+    lxml разбирает поток по частям, не собирая страницу в одну строку;
+    content_root_xpath - как в clean_text_lxml().
+    """
+    if extractor == "bs4":
+        return clean_text_bs4(stream.read().decode(encoding))
+    parser = lxml.html.HTMLParser(encoding=encoding)
+    return extract_text_lxml(lxml.html.parse(stream, parser).getroot(), content_root_xpath)
+
+
+def extract_text_lxml(root, content_root_xpath: str = CONTENT_ROOT_XPATH) -> str:
+    """Извлекает текст из разобранного lxml-дерева (общая часть clean_text_lxml и clean_text_stream)."""
+    # Удаляем ненужные элементы (drop_tree сохраняет текст после элемента)
+    for element in root.xpath("|".join(f"//{tag}" for tag in UNWANTED_TAGS)):
+        element.drop_tree()
+    
+    # Находим основной контент статьи
+    found = root.xpath(content_root_xpath)
+    if not found:
+        for tag in FALLBACK_ROOT_TAGS:
+            found = root.xpath(f"//{tag}")
+            if found:
+                break
+    
+    if not found:
+        return ""
+    main_content = found[0]
+    
+    for element in main_content.xpath(NON_CONTENT_TEXT_XPATH):
+        element.drop_tree()
+    
+    # Извлекаем текст (itertext пропускает комментарии, как get_text)
+    parts = (part.strip() for part in main_content.itertext())
+    text = "\n".join(part for part in parts if part)
+    
+    return normalize_whitespace(text)
+
+
+def clean_text(html_content: str, extractor: str = DEFAULT_EXTRACTOR) -> str:
+    """Извлекает и очищает текст из HTML выбранным способом (lxml или bs4)."""
+    if extractor == "bs4":
+        return clean_text_bs4(html_content)
+    return clean_text_lxml(html_content)
+
+
+def get_store(store_dir: str) -> BlobStore:
+    """Возвращает хранилище страниц, открытое в этом процессе."""
+    global _worker_store
+    if _worker_store is None or _worker_store.root != store_dir:
+        _worker_store = BlobStore(store_dir)
+    return _worker_store
+
+
+def process_html_file(
+    html_file: str,
+    extractor: str = DEFAULT_EXTRACTOR,
+    store_dir: Optional[str] = None,
+    input_dir: str = INPUT_DIR
+) -> str:
+    """
+    Обрабатывает одну страницу из папки input_dir и возвращает очищенный текст.
+    Если передана папка хранилища, страница <имя>.html читается из него потоком.
+    """
+    if store_dir is not None:
+        store = get_store(store_dir)
+        page_name = html_file[:-len(".html")]
+        if not store.has(page_name):
+            return None
+        with store.open(page_name) as stream:
+            return clean_text_stream(stream, extractor)
+    
+    filepath = os.path.join(input_dir, html_file)
     
     if not os.path.exists(filepath):
         return None
@@ -49,17 +183,78 @@ def process_html_file(html_file: str) -> str:
     with open(filepath, "r", encoding="utf-8") as f:
         html_content = f.read()
     
-    cleaned_text = clean_text(html_content)
+    cleaned_text = clean_text(html_content, extractor)
     return cleaned_text
 
 
-def save_cleaned_text(page_name: str, text: str):
-    """Сохраняет очищенный текст в файл."""
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def process_html_file_safe(
+    html_file: str,
+    extractor: str = DEFAULT_EXTRACTOR,
+    store_dir: Optional[str] = None,
+    input_dir: str = INPUT_DIR
+) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Обрабатывает HTML-файл, не пропуская исключения наружу.
+    Ошибка в одном файле не должна останавливать обработку остальных.
+    
+    Returns:
+        Кортеж (имя файла, очищенный текст или None, текст ошибки или None)
+    """
+    try:
+        return html_file, process_html_file(html_file, extractor, store_dir, input_dir), None
+    except Exception as e:
+        return html_file, None, f"{type(e).__name__}: {e}"
+
+
+def get_chunksize(files_count: int, workers: int) -> int:
+    """Подбирает размер пачки файлов на одну задачу: ~4 пачки на процесс."""
+    return max(1, min(MAX_CHUNKSIZE, files_count // (workers * 4)))
+
+
+def clean_html_files(
+    html_files: List[str],
+    workers: int = WORKERS,
+    chunksize: Optional[int] = None,
+    extractor: str = DEFAULT_EXTRACTOR,
+    store_dir: Optional[str] = None,
+    input_dir: str = INPUT_DIR
+) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Очищает HTML-файлы последовательно или в пуле процессов.
+    Результаты возвращаются в порядке входного списка.
+    
+    Args:
+        html_files: Имена HTML-файлов в папке input_dir (или страниц хранилища с суффиксом .html)
+        workers: Количество процессов
+        chunksize: Количество файлов в одной задаче (по умолчанию подбирается автоматически)
+        extractor: Способ извлечения текста ("lxml" или "bs4")
+        store_dir: Папка хранилища страниц (None - файлы в input_dir)
+        input_dir: Папка HTML-файлов (передается в процессы пула явно,
+            поэтому работает и при запуске процессов через spawn)
+        
+    Yields:
+        Кортежи (имя файла, очищенный текст или None, текст ошибки или None)
+    """
+    process = partial(process_html_file_safe, extractor=extractor, store_dir=store_dir, input_dir=input_dir)
+    
+    if workers <= 1:
+        yield from map(process, html_files)
+        return
+    
+    if chunksize is None:
+        chunksize = get_chunksize(len(html_files), workers)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(process, html_files, chunksize=chunksize)
+
+
+def save_cleaned_text(page_name: str, text: str, output_dir: str = OUTPUT_DIR):
+    """Сохраняет очищенный текст в файл в папке output_dir."""
+    os.makedirs(output_dir, exist_ok=True)
     
     # Убираем расширение .html если есть
     base_name = page_name.replace(".html", "")
-    filepath = os.path.join(OUTPUT_DIR, f"{base_name}.txt")
+    filepath = os.path.join(output_dir, f"{base_name}.txt")
     
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(text)
@@ -67,37 +262,96 @@ def save_cleaned_text(page_name: str, text: str):
     return filepath
 
 
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Очистка HTML и извлечение текста")
+    parser.add_argument("--force", action="store_true",
+                        help="Обработать все файлы, включая актуальные по манифесту")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Количество процессов для очистки (по умолчанию {WORKERS})")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help="Количество файлов в одной задаче пула (по умолчанию подбирается автоматически)")
+    parser.add_argument("--extractor", choices=EXTRACTORS, default=DEFAULT_EXTRACTOR,
+                        help=f"Способ извлечения текста (по умолчанию {DEFAULT_EXTRACTOR})")
+    parser.add_argument("--raw-format", choices=RAW_FORMATS, default=None,
+                        help=f"Откуда читать страницы: сжатое хранилище {STORE_DIR}/ или файлы в "
+                             f"{INPUT_DIR}/ (по умолчанию {STORE_DIR}/, если оно создано, иначе {INPUT_DIR}/)")
+    return parser.parse_args()
+
+
 def main():
     """Основная функция для очистки всех HTML-файлов."""
-    if not os.path.exists(INPUT_DIR):
-        print(f"Ошибка: папка {INPUT_DIR} не найдена!")
+    args = parse_args()
+    
+    raw_format = args.raw_format or default_raw_format(INPUT_DIR)
+    store_dir = STORE_DIR if raw_format == "store" else None
+    source = f"хранилище {STORE_DIR}/" if store_dir else f"папка {INPUT_DIR}/"
+    
+    if not (store_exists(store_dir) if store_dir else os.path.exists(INPUT_DIR)):
+        print(f"Ошибка: {source} не найдено!" if store_dir else f"Ошибка: {source} не найдена!")
         print("Сначала запустите скрипт 01_download_pages.py")
+        if store_dir and os.path.exists(INPUT_DIR):
+            print(f"или перенесите {INPUT_DIR}/ в хранилище: python blob_store.py --import {INPUT_DIR}")
         return
     
-    html_files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".html")]
+    # Ключ входа страницы: хеш HTML, версия очистки и способ извлечения
+    if store_dir:
+        store = BlobStore(store_dir)
+        html_files = [f"{page_name}.html" for page_name in store.pages()]
+        input_keys = {html_file: clean_key(store.digest(html_file[:-len(".html")]), args.extractor)
+                      for html_file in html_files}
+        store.close()
+    else:
+        html_files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".html")]
+        input_keys = {html_file: clean_key(file_sha256(os.path.join(INPUT_DIR, html_file)), args.extractor)
+                      for html_file in html_files}
     
     if not html_files:
-        print(f"Ошибка: в папке {INPUT_DIR} нет HTML-файлов!")
+        print(f"Ошибка: в {STORE_DIR if store_dir else INPUT_DIR}/ нет HTML-страниц!")
         return
     
-    print(f"Начинаю очистку текстов из {len(html_files)} HTML-файлов...\n")
+    # Страницы, у которых не изменились HTML, версия очистки и способ извлечения,
+    # а очищенный текст совпадает с записанным в манифесте, повторно не очищаем
+    manifest = Manifest()
+    html_files_to_clean = [
+        html_file for html_file in html_files
+        if args.force or not manifest.is_current(
+            "clean", html_file[:-len(".html")], input_keys[html_file],
+            os.path.join(OUTPUT_DIR, html_file.replace(".html", ".txt"))
+        )
+    ]
+    skipped = len(html_files) - len(html_files_to_clean)
+    
+    print(f"Начинаю очистку текстов из {len(html_files_to_clean)} HTML-файлов...")
+    if args.workers > 1:
+        print(f"Процессов: {args.workers}")
+    print()
     
     processed = 0
     failed = []
+    errors = []
     
-    for html_file in tqdm(html_files, desc="Очистка"):
-        cleaned_text = process_html_file(html_file)
-        
-        if cleaned_text and len(cleaned_text) > 100:  # Минимум 100 символов
-            page_name = html_file.replace(".html", "")
-            save_cleaned_text(page_name, cleaned_text)
+    results = clean_html_files(html_files_to_clean, args.workers, args.chunksize, args.extractor, store_dir)
+    for html_file, cleaned_text, error in tqdm(results, total=len(html_files_to_clean), desc="Очистка"):
+        if error:
+            failed.append(html_file)
+            errors.append(f"{html_file}: {error}")
+        elif cleaned_text and len(cleaned_text) > 100:  # Минимум 100 символов
+            save_cleaned_text(html_file.replace(".html", ""), cleaned_text)
+            manifest.record("clean", html_file[:-len(".html")], input_keys[html_file], cleaned_text)
             processed += 1
         else:
             failed.append(html_file)
     
+    manifest.save()
+    
     print(f"\n✓ Обработано успешно: {processed}/{len(html_files)}")
+    if skipped:
+        print(f"  Пропущено без изменений: {skipped}")
     if failed:
         print(f"✗ Проблемы с файлами: {', '.join(failed)}")
+    for error in errors:
+        print(f"  - {error}")
     
     print(f"\nОчищенные тексты сохранены в папку: {OUTPUT_DIR}/")
 
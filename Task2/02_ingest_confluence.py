@@ -0,0 +1,248 @@
+"""
+Скрипт для загрузки HTML-экспорта пространства Confluence в базу знаний.
+
+Страницы читаются прямо из zip-архива потоком, без распаковки на диск
+и без чтения страницы в память целиком, очищаются той же функцией, что и
+страницы вики (02_clean_texts.py), проходят замену терминов (03_replace_terms.py;
+--no-replace-terms отключает ее) и сохраняются в knowledge_base/.
+Страницы обрабатываются параллельно в пуле процессов; на каждый процесс
+в обработке одновременно не больше MAX_IN_FLIGHT_PER_WORKER страниц,
+поэтому память ограничена независимо от размера архива.
+"""
+
+import os
+import html
+import codecs
+import zipfile
+import argparse
+import importlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import PurePosixPath
+from typing import Iterator, List, Optional, Tuple
+
+from bs4 import UnicodeDammit
+from tqdm import tqdm
+
+cleaner = importlib.import_module("02_clean_texts")
+replacer = importlib.import_module("03_replace_terms")
+markdown_ingest = importlib.import_module("02_ingest_markdown")
+
+OUTPUT_DIR = replacer.OUTPUT_DIR
+WORKERS = os.cpu_count() or 1  # Процессов для обработки страниц
+MAX_IN_FLIGHT_PER_WORKER = 4  # Страниц в обработке на один процесс
+MAX_MEMBER_SIZE = 50 * 1024 * 1024  # Страницы больше 50 МБ (после распаковки) пропускаются
+HEAD_SIZE = 64 * 1024  # Начало страницы, по которому определяются кодировка и заголовок
+SOURCE_TYPE = "confluence"
+
+# Основной контент страницы в экспорте Confluence
+CONFLUENCE_CONTENT_XPATH = "//div[@id='main-content']"
+# Служебные файлы экспорта: обзор пространства, вложения, стили
+SKIP_MEMBERS = {"index.html"}
+SKIP_MEMBER_DIRS = {"attachments", "images", "styles"}
+
+# Архив, открытый в процессе пула, и нужна ли в нем замена терминов
+_worker_archive: Optional[zipfile.ZipFile] = None
+_worker_replace_terms = False
+
+
+def page_members(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    """Возвращает страницы архива (HTML-файлы без служебных)."""
+    members = []
+    for info in archive.infolist():
+        path = PurePosixPath(info.filename)
+        if info.is_dir() or path.suffix.lower() not in (".html", ".htm"):
+            continue
+        if path.name in SKIP_MEMBERS or SKIP_MEMBER_DIRS.intersection(path.parts[:-1]):
+            continue
+        members.append(info)
+    return members
+
+
+def document_name(member: str) -> str:
+    """Имя документа: путь внутри архива без расширения, каталоги через '__'."""
+    return str(PurePosixPath(member).with_suffix("")).replace("/", "__")
+
+
+def page_title(html_content: str, default: str) -> str:
+    """Заголовок страницы из <title> ("Пространство : Страница")."""
+    start = html_content.find("<title>")
+    end = html_content.find("</title>", start)
+    if start == -1 or end == -1:
+        return default
+    title = html.unescape(html_content[start + len("<title>"):end]).strip()
+    return title.split(" : ", 1)[-1] or default
+
+
+def page_encoding(head: bytes) -> str:
+    """
+    Кодировка страницы по ее началу. Экспорт Confluence обычно в UTF-8,
+    но старые пространства бывают в других кодировках.
+    """
+    try:
+        # Инкрементальный декодер не считает ошибкой символ, обрезанный на границе HEAD_SIZE
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return UnicodeDammit(head, is_html=True).original_encoding or "utf-8"
+
+
+def init_worker(zip_path: str, terms_map_file: Optional[str] = None):
+    """Открывает архив и, если задан terms_map_file, загружает словарь замен в процессе пула."""
+    global _worker_archive, _worker_replace_terms
+    _worker_archive = zipfile.ZipFile(zip_path)
+    _worker_replace_terms = terms_map_file is not None
+    if _worker_replace_terms:
+        replacer.init_worker(terms_map_file)
+
+
+def replace_terms(text: str) -> str:
+    """Заменяет термины словарем процесса пула или возвращает текст без изменений."""
+    return replacer.replace_terms_worker(text) if _worker_replace_terms else text
+
+
+def ingest_member(member: str, output_dir: str = OUTPUT_DIR) -> Tuple[str, int, Optional[str]]:
+    """
+    Читает страницу из архива, очищает, заменяет термины (если включено) и сохраняет документ.
+    Текст записывается в процессе пула и не передается обратно.
+
+    Returns:
+        Кортеж (имя страницы в архиве, размер документа в символах, текст ошибки или None)
+    """
+    try:
+        # zipfile не распаковывает больше file_size из заголовка архива
+        info = _worker_archive.getinfo(member)
+        if info.file_size > MAX_MEMBER_SIZE:
+            return member, 0, f"страница больше {MAX_MEMBER_SIZE // (1024 * 1024)} МБ"
+
+        with _worker_archive.open(info) as f:
+            head = f.read(HEAD_SIZE)
+        encoding = page_encoding(head)
+        # Страница разбирается lxml по частям прямо из архива
+        with _worker_archive.open(info) as f:
+            text = cleaner.clean_text_stream(f, "lxml", CONFLUENCE_CONTENT_XPATH, encoding)
+        if not text:
+            return member, 0, None
+        text = replace_terms(text)
+
+        name = document_name(member)
+        title = page_title(head.decode(encoding, errors="ignore"), PurePosixPath(member).stem)
+        metadata = {
+            "title": replace_terms(title),
+            "space": PurePosixPath(member).parts[0] if len(PurePosixPath(member).parts) > 1 else "",
+            "source_path": member,
+            "source_type": SOURCE_TYPE,
+        }
+        markdown_ingest.save_document(name, text, metadata, output_dir)
+        return member, len(text), None
+    except Exception as e:
+        return member, 0, f"{type(e).__name__}: {e}"
+
+
+def ingest_members(
+    zip_path: str,
+    members: List[str],
+    workers: int = WORKERS,
+    output_dir: str = OUTPUT_DIR,
+    terms_map_file: Optional[str] = None
+) -> Iterator[Tuple[str, int, Optional[str]]]:
+    """
+    Обрабатывает страницы архива последовательно или в пуле процессов.
+    Новые страницы отправляются в пул по мере завершения предыдущих,
+    чтобы в обработке было не больше workers * MAX_IN_FLIGHT_PER_WORKER страниц.
+    Термины заменяются словарем terms_map_file, если он задан.
+    Результаты возвращаются в порядке завершения.
+    """
+    if workers <= 1:
+        init_worker(zip_path, terms_map_file)
+        for member in members:
+            yield ingest_member(member, output_dir)
+        return
+
+    max_in_flight = workers * MAX_IN_FLIGHT_PER_WORKER
+    pending_members = iter(members)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(zip_path, terms_map_file)) as executor:
+        futures = set()
+        for member in pending_members:
+            futures.add(executor.submit(ingest_member, member, output_dir))
+            if len(futures) >= max_in_flight:
+                break
+
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+                member = next(pending_members, None)
+                if member is not None:
+                    futures.add(executor.submit(ingest_member, member, output_dir))
+
+
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Загрузка HTML-экспорта Confluence в базу знаний")
+    parser.add_argument("archive", help="Zip-архив с HTML-экспортом пространства Confluence")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR,
+                        help=f"Папка базы знаний (по умолчанию {OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Процессов для обработки страниц (по умолчанию {WORKERS})")
+    parser.add_argument("--no-replace-terms", dest="replace_terms", action="store_false",
+                        help=f"Не заменять термины по словарю {replacer.TERMS_MAP_FILE}")
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция для загрузки экспорта Confluence."""
+    args = parse_args()
+
+    if not zipfile.is_zipfile(args.archive):
+        print(f"Ошибка: {args.archive} не найден или не является zip-архивом!")
+        return
+
+    terms_map_file = None
+    if args.replace_terms:
+        if not os.path.exists(replacer.TERMS_MAP_FILE):
+            print(f"Ошибка: файл {replacer.TERMS_MAP_FILE} не найден! "
+                  f"Запустите с --no-replace-terms, чтобы загрузить страницы без замены терминов")
+            return
+        # Компилируем словарь заранее, чтобы процессы пула загрузили готовый
+        replacer.load_replacer(replacer.TERMS_MAP_FILE)
+        terms_map_file = replacer.TERMS_MAP_FILE
+
+    with zipfile.ZipFile(args.archive) as archive:
+        members = page_members(archive)
+    if not members:
+        print(f"Ошибка: в архиве {args.archive} нет HTML-страниц!")
+        return
+
+    total_mb = sum(info.file_size for info in members) / (1024 * 1024)
+    print(f"Страниц в архиве: {len(members)} ({total_mb:.1f} МБ после распаковки)")
+    if args.workers > 1:
+        print(f"Процессов: {args.workers}")
+    print()
+
+    processed = 0
+    empty = 0
+    errors = []
+    results = ingest_members(args.archive, [info.filename for info in members], args.workers,
+                             args.output_dir, terms_map_file)
+    for member, size, error in tqdm(results, total=len(members), desc="Страницы"):
+        if error:
+            errors.append(f"{member}: {error}")
+        elif size:
+            processed += 1
+        else:
+            empty += 1
+
+    print(f"\n✓ Обработано успешно: {processed}/{len(members)}")
+    if empty:
+        print(f"  Пропущено страниц без текста: {empty}")
+    if errors:
+        print(f"✗ Ошибок: {len(errors)}")
+        for error in errors:
+            print(f"  - {error}")
+
+    print(f"\nДокументы сохранены в папку: {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
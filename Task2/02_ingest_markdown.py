@@ -0,0 +1,337 @@
+"""
+Скрипт для загрузки Markdown/MDX-документации в базу знаний.
+Обходит дерево каталогов (например, монорепозиторий), убирает front-matter
+и MDX-компоненты и сохраняет документы в knowledge_base/ в том же формате,
+что и основной конвейер: один .txt файл на документ. Метаданные документа
+(заголовок, исходный путь) пишутся рядом в файл .meta.json.
+"""
+
+import os
+import re
+import json
+import hashlib
+import argparse
+import importlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from term_replacer import load_replacer
+
+cleaner = importlib.import_module("02_clean_texts")
+
+OUTPUT_DIR = "knowledge_base"
+TERMS_MAP_FILE = "terms_map.json"
+MARKDOWN_EXTENSIONS = (".md", ".mdx", ".markdown")
+MDX_EXTENSION = ".mdx"  # ESM и JSX убираются только из MDX: в Markdown это обычный текст
+NAME_HASH_LENGTH = 8  # Символов хеша пути в имени документа при совпадении имен
+SKIP_DIRS = {".git", ".hg", "node_modules", ".venv", "venv", "__pycache__", "dist", "build", ".next"}
+WALK_WORKERS = 8  # Потоков для обхода каталогов (os.scandir отпускает GIL)
+WORKERS = 1  # Процессов для преобразования файлов (1 - последовательная обработка)
+META_SUFFIX = ".meta.json"
+SOURCE_TYPE = "markdown"
+
+# Поля front-matter, которые попадают в метаданные документа
+FRONT_MATTER_FIELDS = ["title", "description", "tags"]
+
+FRONT_MATTER_RE = re.compile(r"\A(---|\+\+\+)[ \t]*\n(.*?)\n\1[ \t]*(?:\n|\Z)", re.S)
+# Блоки кода ``` и строчный код `...` не меняются (в них бывает List<T>)
+CODE_RE = re.compile(r"^(`{3,}|~{3,})[^\n]*\n.*?^\1[ \t]*$|(`+)[^`\n]+?\2", re.M | re.S)
+# ESM в MDX: import ... from '...' (в том числе на нескольких строках) и export const/default/function;
+# блок export заканчивается пустой строкой
+MDX_IMPORT_RE = re.compile(r"^import[ \t]+(?:[\w*${},\s]+?\s+from\s+)?['\"][^'\"\n]+['\"];?[ \t]*$", re.M)
+MDX_EXPORT_RE = re.compile(
+    r"^export[ \t]+(?:const|let|var|default|function|async[ \t]+function|class)\b"
+    r"[^\n]*(?:\n(?![ \t]*\n)[^\n]*)*",
+    re.M,
+)
+MDX_COMMENT_RE = re.compile(r"\{/\*.*?\*/\}", re.S)
+HTML_COMMENT_RE = re.compile(r"<!--.*?-->", re.S)
+JSX_SELF_CLOSING_RE = re.compile(r"<[A-Z][\w.]*\b[^>]*/>", re.S)
+# Открывающие и закрывающие теги компонентов и HTML убираются, текст внутри остается
+TAG_RE = re.compile(r"</?[A-Za-z][\w.-]*(?:\s[^>]*)?>", re.S)
+# В Markdown убираются только теги HTML: <T> в тексте вроде List<T> остается
+HTML_TAG_RE = re.compile(
+    r"</?(?:a|abbr|b|blockquote|br|code|dd|del|details|div|dl|dt|em|figcaption|figure|h[1-6]|hr|i|img"
+    r"|ins|kbd|li|mark|ol|p|picture|pre|s|small|source|span|strong|sub|summary|sup"
+    r"|table|tbody|td|th|thead|tr|u|ul|video)\b(?:\s[^>]*)?/?>",
+    re.I,
+)
+JSX_EXPRESSION_LINE_RE = re.compile(r"^[ \t]*\{[^}\n]*\}[ \t]*$", re.M)
+IMAGE_RE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+LINK_RE = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+HEADING_RE = re.compile(r"^#{1,6}[ \t]+(.*?)[ \t#]*$", re.M)
+
+
+def scan_directory(path: str) -> Tuple[List[str], List[str]]:
+    """
+    Просматривает один каталог.
+
+    Returns:
+        Кортеж (подкаталоги для обхода, найденные Markdown-файлы)
+    """
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in SKIP_DIRS:
+                        subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False) and entry.name.lower().endswith(MARKDOWN_EXTENSIONS):
+                    files.append(entry.path)
+    except OSError as e:
+        print(f"Не удалось прочитать каталог {path}: {e}")
+    return subdirs, files
+
+
+def walk_markdown_files(root: str, workers: int = WALK_WORKERS) -> List[str]:
+    """
+    Находит все Markdown/MDX-файлы в дереве каталогов.
+    Каталоги просматриваются параллельно: каждый найденный подкаталог
+    сразу отправляется в пул потоков.
+    """
+    files: List[str] = []
+    if workers <= 1:
+        pending = [root]
+        while pending:
+            subdirs, found = scan_directory(pending.pop())
+            pending.extend(subdirs)
+            files.extend(found)
+        return sorted(files)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scan_directory, root)}
+        while futures:
+            done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                subdirs, found = future.result()
+                files.extend(found)
+                futures.update(executor.submit(scan_directory, subdir) for subdir in subdirs)
+    return sorted(files)
+
+
+def parse_front_matter(text: str) -> Tuple[Dict[str, str], str]:
+    """
+    Отделяет front-matter (YAML между --- или TOML между +++) от текста.
+    Разбираются только простые строки вида `ключ: значение`.
+
+    Returns:
+        Кортеж (поля front-matter, текст без front-matter)
+    """
+    match = FRONT_MATTER_RE.match(text)
+    if not match:
+        return {}, text
+
+    separator = ":" if match.group(1) == "---" else "="
+    fields = {}
+    for line in match.group(2).splitlines():
+        if line[:1] in (" ", "\t", "-", "#") or separator not in line:
+            continue
+        key, value = line.split(separator, 1)
+        value = value.strip().strip("\"'")
+        if value:
+            fields[key.strip()] = value
+    return fields, text[match.end():]
+
+
+def strip_markup(text: str, mdx: bool = False) -> str:
+    """
+    Убирает разметку Markdown, оставляя текст (код в ``` и `...` не трогается).
+    С mdx=True убираются также import/export и JSX-компоненты MDX.
+    """
+    parts = []
+    position = 0
+    for code in CODE_RE.finditer(text):
+        parts.append(_strip_markup_segment(text[position:code.start()], mdx))
+        parts.append(code.group(0))
+        position = code.end()
+    parts.append(_strip_markup_segment(text[position:], mdx))
+    return "".join(parts)
+
+
+def _strip_markup_segment(text: str, mdx: bool) -> str:
+    text = HTML_COMMENT_RE.sub("", text)
+    if mdx:
+        text = MDX_IMPORT_RE.sub("", text)
+        text = MDX_EXPORT_RE.sub("", text)
+        text = MDX_COMMENT_RE.sub("", text)
+        text = JSX_SELF_CLOSING_RE.sub("", text)
+        text = TAG_RE.sub("", text)
+        text = JSX_EXPRESSION_LINE_RE.sub("", text)
+    else:
+        text = HTML_TAG_RE.sub("", text)
+    text = IMAGE_RE.sub(r"\1", text)
+    text = LINK_RE.sub(r"\1", text)
+    return HEADING_RE.sub(r"\1", text)
+
+
+def document_name(path: str, root: str) -> str:
+    """Имя документа в knowledge_base/: путь относительно корня, каталоги через '__'."""
+    relative = os.path.splitext(os.path.relpath(path, root))[0]
+    return relative.replace(os.sep, "__").replace("/", "__")
+
+
+def document_names(paths: Iterable[str], root: str) -> Dict[str, str]:
+    """
+    Имена документов для файлов дерева: {путь: имя}.
+    a/b.md и a__b.md, foo.md и foo.mdx дают одно имя (без учета регистра - тоже,
+    для нечувствительных к регистру ФС); такие документы получают суффикс
+    из хеша исходного пути, чтобы не перезаписывать друг друга.
+    """
+    groups: Dict[str, List[Tuple[str, str]]] = {}
+    for path in paths:
+        name = document_name(path, root)
+        groups.setdefault(name.lower(), []).append((path, name))
+
+    names = {}
+    for group in groups.values():
+        for path, name in group:
+            if len(group) > 1:
+                relative = os.path.relpath(path, root).replace(os.sep, "/")
+                digest = hashlib.sha1(relative.encode("utf-8")).hexdigest()[:NAME_HASH_LENGTH]
+                name = f"{name}__{digest}"
+            names[path] = name
+    return names
+
+
+def convert_markdown(text: str, default_title: str, mdx: bool = False) -> Tuple[str, Dict[str, str]]:
+    """
+    Преобразует Markdown/MDX в чистый текст.
+
+    Returns:
+        Кортеж (текст, метаданные из front-matter)
+    """
+    fields, body = parse_front_matter(text)
+    metadata = {key: fields[key] for key in FRONT_MATTER_FIELDS if key in fields}
+
+    if "title" not in metadata:
+        heading = HEADING_RE.search(body)
+        metadata["title"] = heading.group(1).strip() if heading else default_title
+
+    return cleaner.normalize_whitespace(strip_markup(body, mdx)), metadata
+
+
+def convert_markdown_file(
+    path: str,
+    name: str,
+    root: str
+) -> Tuple[str, Optional[str], Optional[Dict], Optional[str]]:
+    """
+    Преобразует один файл, не пропуская исключения наружу.
+
+    Returns:
+        Кортеж (имя документа, текст или None, метаданные или None, текст ошибки или None)
+    """
+    stem, extension = os.path.splitext(os.path.basename(path))
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            text, metadata = convert_markdown(f.read(), stem, extension.lower() == MDX_EXTENSION)
+        metadata["source_path"] = os.path.relpath(path, root).replace(os.sep, "/")
+        metadata["source_type"] = SOURCE_TYPE
+        return name, text, metadata, None
+    except Exception as e:
+        return name, None, None, f"{type(e).__name__}: {e}"
+
+
+def convert_markdown_files(
+    paths: List[str],
+    root: str,
+    workers: int = WORKERS,
+    names: Optional[Dict[str, str]] = None
+) -> Iterator[Tuple[str, Optional[str], Optional[Dict], Optional[str]]]:
+    """Преобразует файлы последовательно или в пуле процессов (в порядке входного списка)."""
+    if names is None:
+        names = document_names(paths, root)
+    convert = partial(convert_markdown_file, root=root)
+    path_names = [names[path] for path in paths]
+    if workers <= 1:
+        yield from map(convert, paths, path_names)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(convert, paths, path_names, chunksize=cleaner.get_chunksize(len(paths), workers))
+
+
+def save_document(name: str, text: str, metadata: Dict, output_dir: str = OUTPUT_DIR):
+    """Сохраняет документ и его метаданные в базу знаний."""
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+        f.write(text)
+    with open(os.path.join(output_dir, f"{name}{META_SUFFIX}"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Загрузка Markdown/MDX-документации в базу знаний")
+    parser.add_argument("source", help="Корневой каталог с Markdown/MDX-файлами")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR,
+                        help=f"Папка базы знаний (по умолчанию {OUTPUT_DIR})")
+    parser.add_argument("--walk-workers", type=int, default=WALK_WORKERS,
+                        help=f"Потоков для обхода каталогов (по умолчанию {WALK_WORKERS})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Процессов для преобразования файлов (по умолчанию {WORKERS})")
+    parser.add_argument("--replace-terms", action="store_true",
+                        help=f"Заменить термины по словарю {TERMS_MAP_FILE}")
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция для загрузки Markdown/MDX-файлов."""
+    args = parse_args()
+
+    if not os.path.isdir(args.source):
+        print(f"Ошибка: каталог {args.source} не найден!")
+        return
+
+    print(f"Поиск Markdown/MDX-файлов в {args.source}...")
+    paths = walk_markdown_files(args.source, args.walk_workers)
+    if not paths:
+        print(f"Ошибка: в каталоге {args.source} нет Markdown/MDX-файлов!")
+        return
+
+    replacer = load_replacer(TERMS_MAP_FILE) if args.replace_terms else None
+
+    print(f"Найдено файлов: {len(paths)}")
+    names = document_names(paths, args.source)
+    renamed = sorted(path for path, name in names.items() if name != document_name(path, args.source))
+    if renamed:
+        print(f"Файлов с совпадающими именами документов: {len(renamed)} (к имени добавлен хеш пути)")
+        for path in renamed:
+            print(f"  - {os.path.relpath(path, args.source)} -> {names[path]}.txt")
+    if args.workers > 1:
+        print(f"Процессов: {args.workers}")
+    print()
+
+    processed = 0
+    empty = 0
+    errors = []
+
+    results = convert_markdown_files(paths, args.source, args.workers, names)
+    for name, text, metadata, error in tqdm(results, total=len(paths), desc="Преобразование"):
+        if error:
+            errors.append(f"{name}: {error}")
+        elif not text:
+            empty += 1
+        else:
+            if replacer is not None:
+                text = replacer.replace(text)
+            save_document(name, text, metadata, args.output_dir)
+            processed += 1
+
+    print(f"\n✓ Обработано успешно: {processed}/{len(paths)}")
+    if empty:
+        print(f"  Пропущено пустых документов: {empty}")
+    if errors:
+        print(f"✗ Ошибок: {len(errors)}")
+        for error in errors:
+            print(f"  - {error}")
+
+    print(f"\nДокументы сохранены в папку: {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
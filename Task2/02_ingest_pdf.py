@@ -0,0 +1,309 @@
+"""
+Скрипт для загрузки PDF-спецификаций в базу знаний.
+
+Текст извлекается постранично в пуле процессов: каждая задача - несколько
+страниц одного файла. Текст страниц кешируется в pdf_cache/<SHA-256 файла>/,
+поэтому прерванная обработка продолжается с недостающих страниц, а документ
+собирается в knowledge_base/ потоково, страница за страницей, без загрузки
+всего PDF в память. Смещения начала страниц пишутся в .meta.json, чтобы
+Task3/build_index.py мог указать номера страниц у чанков.
+Неизменившиеся PDF (тот же хеш) при повторном запуске пропускаются целиком.
+"""
+
+import os
+import json
+import argparse
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pypdf import PdfReader
+from tqdm import tqdm
+
+from manifest import terms_map_key
+from term_replacer import file_sha256, load_replacer
+
+cleaner = importlib.import_module("02_clean_texts")
+markdown_ingest = importlib.import_module("02_ingest_markdown")
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+OUTPUT_DIR = markdown_ingest.OUTPUT_DIR
+# Кеш страниц и состояние лежат рядом со скриптом, а не в текущем каталоге
+CACHE_DIR = str(SCRIPT_DIR / "pdf_cache")
+STATE_FILE = str(SCRIPT_DIR / "pdf_state.json")
+NO_REPLACER = "none"  # Состояние замены терминов без --replace-terms
+WORKERS = os.cpu_count() or 1  # Процессов для извлечения текста
+PAGES_PER_TASK = 8  # Страниц в одной задаче пула
+PAGE_SEPARATOR = "\n\n"
+SOURCE_TYPE = "pdf"
+
+# Открытый PDF в процессе пула (задачи одного файла обычно идут подряд)
+_worker_reader: Tuple[Optional[str], Optional[PdfReader]] = (None, None)
+
+
+def page_cache_path(file_hash: str, page_number: int, cache_dir: str = CACHE_DIR) -> str:
+    """Путь к кешу текста страницы (нумерация страниц с 1)."""
+    return os.path.join(cache_dir, file_hash, f"{page_number:05d}.txt")
+
+
+def get_reader(path: str) -> PdfReader:
+    """Возвращает PdfReader для файла, переиспользуя открытый в этом процессе."""
+    global _worker_reader
+    if _worker_reader[0] != path:
+        _worker_reader = (path, PdfReader(path))
+    return _worker_reader[1]
+
+
+def extract_pages(
+    path: str,
+    file_hash: str,
+    page_numbers: List[int],
+    cache_dir: str = CACHE_DIR
+) -> Tuple[str, List[int], Optional[str]]:
+    """
+    Извлекает текст страниц и сохраняет его в кеш (выполняется в пуле процессов).
+    Текст не возвращается в основной процесс, чтобы не держать документ в памяти.
+
+    Returns:
+        Кортеж (путь к PDF, номера страниц, текст ошибки или None)
+    """
+    try:
+        reader = get_reader(path)
+        for page_number in page_numbers:
+            text = cleaner.normalize_whitespace(reader.pages[page_number - 1].extract_text() or "")
+            cache_path = page_cache_path(file_hash, page_number, cache_dir)
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Запись через временный файл: прерванная запись не оставит битый кеш
+            with open(cache_path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(cache_path + ".tmp", cache_path)
+        return path, page_numbers, None
+    except Exception as e:
+        return path, page_numbers, f"{type(e).__name__}: {e}"
+
+
+def document_names(paths: List[Path], root: Path) -> Dict[Path, str]:
+    """Имена документов в knowledge_base/ (как у 02_ingest_markdown.py, с разрешением совпадений)."""
+    names = markdown_ingest.document_names([str(path) for path in paths], str(root))
+    return {path: names[str(path)] for path in paths}
+
+
+def load_state(path: str = STATE_FILE) -> Dict:
+    """Загружает состояние: {исходный путь: {"sha256", "terms", "document", "pages"}}."""
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ошибка при загрузке {path}: {e}. Все PDF будут обработаны заново.")
+    return {}
+
+
+def save_state(state: Dict, path: str = STATE_FILE):
+    """Сохраняет состояние обработки PDF."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+
+
+def write_document(
+    name: str,
+    file_hash: str,
+    page_count: int,
+    metadata: Dict,
+    replacer=None,
+    output_dir: str = OUTPUT_DIR,
+    cache_dir: str = CACHE_DIR
+) -> int:
+    """
+    Собирает документ из кеша страниц, читая по одной странице.
+
+    Returns:
+        Размер документа в символах
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    page_offsets = []
+    offset = 0
+
+    with open(os.path.join(output_dir, f"{name}.txt"), "w", encoding="utf-8") as out:
+        for page_number in range(1, page_count + 1):
+            with open(page_cache_path(file_hash, page_number, cache_dir), "r", encoding="utf-8") as f:
+                text = f.read()
+            if replacer is not None:
+                text = replacer.replace(text)
+            if not text:
+                page_offsets.append(offset)
+                continue
+            if offset:
+                out.write(PAGE_SEPARATOR)
+                offset += len(PAGE_SEPARATOR)
+            page_offsets.append(offset)
+            out.write(text)
+            offset += len(text)
+
+    metadata = {**metadata, "page_count": page_count, "page_offsets": page_offsets}
+    with open(os.path.join(output_dir, f"{name}{markdown_ingest.META_SUFFIX}"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, indent=2, ensure_ascii=False)
+    return offset
+
+
+def plan_tasks(
+    path: str,
+    file_hash: str,
+    page_count: int,
+    cache_dir: str = CACHE_DIR,
+    force: bool = False
+) -> List[List[int]]:
+    """
+    Разбивает страницы без кеша на задачи по PAGES_PER_TASK страниц.
+    С force=True извлекаются все страницы: кеш перезаписывается.
+    """
+    missing = [
+        page_number for page_number in range(1, page_count + 1)
+        if force or not os.path.exists(page_cache_path(file_hash, page_number, cache_dir))
+    ]
+    return [missing[i:i + PAGES_PER_TASK] for i in range(0, len(missing), PAGES_PER_TASK)]
+
+
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Загрузка PDF-спецификаций в базу знаний")
+    parser.add_argument("source", help="Каталог с PDF-файлами")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR,
+                        help=f"Папка базы знаний (по умолчанию {OUTPUT_DIR})")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Процессов для извлечения текста (по умолчанию {WORKERS})")
+    parser.add_argument("--replace-terms", action="store_true",
+                        help=f"Заменить термины по словарю {markdown_ingest.TERMS_MAP_FILE}")
+    parser.add_argument("--force", action="store_true",
+                        help="Обработать все PDF, даже если они не изменились (кеш страниц извлекается заново)")
+    return parser.parse_args()
+
+
+def main():
+    """Основная функция для загрузки PDF-файлов."""
+    args = parse_args()
+    root = Path(args.source)
+
+    if not root.is_dir():
+        print(f"Ошибка: каталог {args.source} не найден!")
+        return
+
+    pdf_files = sorted(path for path in root.rglob("*") if path.suffix.lower() == ".pdf")
+    if not pdf_files:
+        print(f"Ошибка: в каталоге {args.source} нет PDF-файлов!")
+        return
+
+    replacer = load_replacer(markdown_ingest.TERMS_MAP_FILE) if args.replace_terms else None
+    # Замена терминов влияет на результат: документ обрабатывается заново, если
+    # изменились флаг --replace-terms, terms_map.json или версия алгоритма замены
+    terms_key = terms_map_key(markdown_ingest.TERMS_MAP_FILE) if args.replace_terms else NO_REPLACER
+    state = {} if args.force else load_state()
+
+    # Планирование: хеш файла, число страниц и страницы без кеша
+    documents = {}
+    tasks = []
+    skipped = 0
+    errors = []
+    names = document_names(pdf_files, root)
+    for path in tqdm(pdf_files, desc="Проверка PDF"):
+        source_path = path.relative_to(root).as_posix()
+        name = names[path]
+        file_hash = file_sha256(path)
+
+        entry = state.get(source_path, {})
+        if (entry.get("sha256") == file_hash and entry.get("terms") == terms_key
+                and os.path.exists(os.path.join(args.output_dir, f"{name}.txt"))):
+            skipped += 1
+            continue
+
+        try:
+            page_count = len(PdfReader(str(path)).pages)
+        except Exception as e:
+            errors.append(f"{source_path}: {type(e).__name__}: {e}")
+            continue
+
+        documents[str(path)] = {
+            "name": name,
+            "source_path": source_path,
+            "sha256": file_hash,
+            "page_count": page_count,
+            "pending": 0,
+            "failed": False,
+        }
+        for page_numbers in plan_tasks(str(path), file_hash, page_count, force=args.force):
+            tasks.append((str(path), file_hash, page_numbers))
+            documents[str(path)]["pending"] += 1
+
+    print(f"PDF-файлов: {len(pdf_files)}, к обработке: {len(documents)}, без изменений: {skipped}")
+    print(f"Страниц к извлечению: {sum(len(task[2]) for task in tasks)} (процессов: {args.workers})")
+    print()
+
+    written = 0
+
+    def finish(path: str):
+        """Собирает документ, когда все его страницы извлечены."""
+        nonlocal written
+        doc = documents[path]
+        if doc["failed"]:
+            return
+        metadata = {
+            "title": Path(path).stem.replace("_", " "),
+            "source_path": doc["source_path"],
+            "source_type": SOURCE_TYPE,
+            "sha256": doc["sha256"],
+        }
+        write_document(doc["name"], doc["sha256"], doc["page_count"], metadata, replacer, args.output_dir)
+        state[doc["source_path"]] = {
+            "sha256": doc["sha256"],
+            "terms": terms_key,
+            "document": doc["name"],
+            "pages": doc["page_count"],
+            "processed_at": datetime.now().isoformat(),
+        }
+        written += 1
+
+    def handle(result: Tuple[str, List[int], Optional[str]]):
+        path, page_numbers, error = result
+        doc = documents[path]
+        if error:
+            doc["failed"] = True
+            errors.append(f"{doc['source_path']} (стр. {page_numbers[0]}-{page_numbers[-1]}): {error}")
+        doc["pending"] -= 1
+        if doc["pending"] == 0:
+            finish(path)
+
+    try:
+        # Документы, все страницы которых уже в кеше
+        for path, doc in documents.items():
+            if doc["pending"] == 0:
+                finish(path)
+
+        with tqdm(total=len(tasks), desc="Извлечение страниц") as progress:
+            if args.workers <= 1:
+                for task in tasks:
+                    handle(extract_pages(*task))
+                    progress.update()
+            else:
+                with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                    futures = [executor.submit(extract_pages, *task) for task in tasks]
+                    for future in as_completed(futures):
+                        handle(future.result())
+                        progress.update()
+    finally:
+        save_state(state)
+
+    print(f"\n✓ Записано документов: {written}/{len(documents)}")
+    if skipped:
+        print(f"  Пропущено без изменений: {skipped}")
+    if errors:
+        print(f"✗ Ошибок: {len(errors)}")
+        for error in errors:
+            print(f"  - {error}")
+
+    print(f"\nДокументы сохранены в папку: {args.output_dir}/")
+
+
+if __name__ == "__main__":
+    main()
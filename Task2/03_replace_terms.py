@@ -5,12 +5,23 @@
 
 import os
 import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from functools import partial
 from tqdm import tqdm
-import re
+
+from manifest import Manifest, stage_key, terms_map_key
+from term_replacer import TermReplacer, file_sha256, load_replacer
 
 INPUT_DIR = "cleaned_texts"
 OUTPUT_DIR = "knowledge_base"
 TERMS_MAP_FILE = "terms_map.json"
+WORKERS = 1  # Количество процессов для замены (1 - последовательная обработка)
+MAX_CHUNKSIZE = 64  # Максимум файлов в одной задаче для пула процессов
+
+# Заменитель терминов текущего процесса пула (загружается один раз в init_worker)
+_worker_replacer: Optional[TermReplacer] = None
 
 
 def load_terms_map() -> dict:
@@ -20,35 +31,14 @@ def load_terms_map() -> dict:
     return data["replacements"]
 
 
-def create_replacement_patterns(terms_map: dict) -> list:
-    """
-    Создает список паттернов для замены.
-    Сортирует по длине (от длинных к коротким), чтобы избежать конфликтов.
-    """
-    patterns = []
-    for original, replacement in terms_map.items():
-        # Экранируем специальные символы regex
-        escaped_original = re.escape(original)
-        # Заменяем с учетом границ слов для точного совпадения
-        pattern = (rf"\b{escaped_original}\b", replacement)
-        patterns.append(pattern)
-    
-    # Сортируем по длине (от длинных к коротким)
-    patterns.sort(key=lambda x: len(x[0]), reverse=True)
-    return patterns
-
-
-def replace_terms_in_text(text: str, patterns: list) -> str:
+def replace_terms_in_text(text: str, replacer: TermReplacer) -> str:
     """Заменяет все термины в тексте согласно словарю."""
-    result = text
-    for pattern, replacement in patterns:
-        result = re.sub(pattern, replacement, result, flags=re.IGNORECASE)
-    return result
+    return replacer.replace(text)
 
 
-def process_text_file(txt_file: str, patterns: list) -> str:
-    """Обрабатывает один текстовый файл и возвращает текст с замененными терминами."""
-    filepath = os.path.join(INPUT_DIR, txt_file)
+def process_text_file(txt_file: str, replacer: TermReplacer, input_dir: str = INPUT_DIR) -> str:
+    """Обрабатывает один текстовый файл из папки input_dir и возвращает текст с замененными терминами."""
+    filepath = os.path.join(input_dir, txt_file)
     
     if not os.path.exists(filepath):
         return None
@@ -56,17 +46,71 @@ def process_text_file(txt_file: str, patterns: list) -> str:
     with open(filepath, "r", encoding="utf-8") as f:
         text = f.read()
     
-    replaced_text = replace_terms_in_text(text, patterns)
+    replaced_text = replace_terms_in_text(text, replacer)
     return replaced_text
 
 
-def save_replaced_text(page_name: str, text: str):
-    """Сохраняет текст с замененными терминами в папку knowledge_base."""
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
+def init_worker(terms_map_file: str = TERMS_MAP_FILE):
+    """
+    Загружает словарь замен в процессе пула.
+    Используется скомпилированный terms_map.compiled.json, поэтому
+    дерево терминов не строится заново в каждом процессе.
+    """
+    global _worker_replacer
+    _worker_replacer = load_replacer(terms_map_file)
+
+
+def replace_terms_worker(text: str) -> str:
+    """Заменяет термины в тексте словарем текущего процесса (см. init_worker)."""
+    return _worker_replacer.replace(text)
+
+
+def process_text_file_safe(txt_file: str, input_dir: str = INPUT_DIR) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Заменяет термины в файле словарем текущего процесса, не пропуская исключения наружу.
+    
+    Returns:
+        Кортеж (имя файла, текст с заменами или None, текст ошибки или None)
+    """
+    try:
+        return txt_file, process_text_file(txt_file, _worker_replacer, input_dir), None
+    except Exception as e:
+        return txt_file, None, f"{type(e).__name__}: {e}"
+
+
+def replace_text_files(
+    txt_files: List[str],
+    workers: int = WORKERS,
+    terms_map_file: str = TERMS_MAP_FILE,
+    input_dir: str = INPUT_DIR
+) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Заменяет термины в файлах папки input_dir последовательно или в пуле процессов.
+    Результаты возвращаются в порядке входного списка.
+    
+    Yields:
+        Кортежи (имя файла, текст с заменами или None, текст ошибки или None)
+    """
+    process = partial(process_text_file_safe, input_dir=input_dir)
+    
+    if workers <= 1:
+        init_worker(terms_map_file)
+        yield from map(process, txt_files)
+        return
+    
+    chunksize = max(1, min(MAX_CHUNKSIZE, len(txt_files) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(terms_map_file,)) as executor:
+        yield from executor.map(process, txt_files, chunksize=chunksize)
+
+
+def save_replaced_text(page_name: str, text: str, output_dir: str = OUTPUT_DIR):
+    """Сохраняет текст с замененными терминами в папку output_dir (по умолчанию knowledge_base)."""
+    os.makedirs(output_dir, exist_ok=True)
     
     # Убираем расширение .txt если есть
     base_name = page_name.replace(".txt", "")
-    filepath = os.path.join(OUTPUT_DIR, f"{base_name}.txt")
+    filepath = os.path.join(output_dir, f"{base_name}.txt")
     
     with open(filepath, "w", encoding="utf-8") as f:
         f.write(text)
@@ -74,8 +118,20 @@ def save_replaced_text(page_name: str, text: str):
     return filepath
 
 
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Замена терминов на вымышленные названия")
+    parser.add_argument("--force", action="store_true",
+                        help="Обработать все файлы, включая актуальные по манифесту")
+    parser.add_argument("--workers", type=int, default=WORKERS,
+                        help=f"Количество процессов для замены (по умолчанию {WORKERS})")
+    return parser.parse_args()
+
+
 def main():
     """Основная функция для замены терминов во всех текстовых файлах."""
+    args = parse_args()
+    
     if not os.path.exists(INPUT_DIR):
         print(f"Ошибка: папка {INPUT_DIR} не найдена!")
         print("Сначала запустите скрипт 02_clean_texts.py")
@@ -91,29 +147,52 @@ def main():
         print(f"Ошибка: в папке {INPUT_DIR} нет текстовых файлов!")
         return
     
+    # Компилируем словарь (или берем скомпилированный) до запуска процессов пула
     print("Загружаю словарь замен...")
-    terms_map = load_terms_map()
-    patterns = create_replacement_patterns(terms_map)
-    print(f"Загружено {len(terms_map)} замен\n")
-    
-    print(f"Начинаю замену терминов в {len(txt_files)} файлах...\n")
+    replacer = load_replacer(TERMS_MAP_FILE)
+    print(f"Загружено {len(replacer.replacements)} замен\n")
+    
+    # Ключ входа: хеш очищенного текста, хеш словаря и версия алгоритма замены.
+    # Документ пропускается, только если ключ и итоговый файл совпадают с манифестом
+    manifest = Manifest()
+    terms_key = terms_map_key(TERMS_MAP_FILE)
+    input_keys = {txt_file: stage_key(file_sha256(os.path.join(INPUT_DIR, txt_file)), terms_key)
+                  for txt_file in txt_files}
+    txt_files_to_replace = [
+        txt_file for txt_file in txt_files
+        if args.force or not manifest.is_current(
+            "replace", txt_file[:-len(".txt")], input_keys[txt_file], os.path.join(OUTPUT_DIR, txt_file)
+        )
+    ]
+    skipped = len(txt_files) - len(txt_files_to_replace)
+    
+    print(f"Начинаю замену терминов в {len(txt_files_to_replace)} файлах...\n")
     
     processed = 0
     failed = []
+    errors = []
     
-    for txt_file in tqdm(txt_files, desc="Замена терминов"):
-        replaced_text = process_text_file(txt_file, patterns)
-        
-        if replaced_text and len(replaced_text) > 100:
-            page_name = txt_file.replace(".txt", "")
-            save_replaced_text(page_name, replaced_text)
+    results = replace_text_files(txt_files_to_replace, args.workers)
+    for txt_file, replaced_text, error in tqdm(results, total=len(txt_files_to_replace), desc="Замена терминов"):
+        if error:
+            failed.append(txt_file)
+            errors.append(f"{txt_file}: {error}")
+        elif replaced_text and len(replaced_text) > 100:
+            save_replaced_text(txt_file.replace(".txt", ""), replaced_text)
+            manifest.record("replace", txt_file[:-len(".txt")], input_keys[txt_file], replaced_text)
             processed += 1
         else:
             failed.append(txt_file)
     
+    manifest.save()
+    
     print(f"\n✓ Обработано успешно: {processed}/{len(txt_files)}")
+    if skipped:
+        print(f"  Пропущено без изменений: {skipped}")
     if failed:
         print(f"✗ Проблемы с файлами: {', '.join(failed)}")
+    for error in errors:
+        print(f"  - {error}")
     
     print(f"\nФинальные документы сохранены в папку: {OUTPUT_DIR}/")
     
@@ -0,0 +1,15 @@
+"""
+Бенчмарки конвейера Task2.
+
+Запуск из папки Task2:
+    python -m benchmarks.corpus --docs 1000        # синтетический корпус
+    python -m benchmarks.run_suite                 # набор замеров этапов с записью в JSON
+"""
+
+import sys
+from pathlib import Path
+
+# Скрипты Task2 импортируются как модули верхнего уровня
+TASK2_DIR = Path(__file__).parent.parent.absolute()
+if str(TASK2_DIR) not in sys.path:
+    sys.path.insert(0, str(TASK2_DIR))
@@ -0,0 +1,139 @@
+"""
+Микробенчмарк извлечения текста из HTML: BeautifulSoup против lxml/XPath.
+Проверяет, что оба способа дают одинаковый текст на корпусе raw_html/,
+и измеряет время разбора одной страницы и пиковое потребление памяти.
+"""
+
+import sys
+import time
+import argparse
+import importlib
+import statistics
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # На Windows модуля resource нет
+    resource = None
+
+# Добавляем путь к скриптам Task2 для импорта
+SCRIPT_DIR = Path(__file__).parent.absolute()
+TASK2_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(TASK2_DIR))
+
+cleaner = importlib.import_module("02_clean_texts")
+
+
+def load_pages(input_dir: Path) -> dict:
+    """Загружает HTML-страницы корпуса в память."""
+    pages = {}
+    for html_file in sorted(input_dir.glob("*.html")):
+        with open(html_file, "r", encoding="utf-8") as f:
+            pages[html_file.name] = f.read()
+    return pages
+
+
+def max_rss_mb() -> float:
+    """Пиковый RSS текущего процесса в МБ (None, если недоступно)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure_extractor(extractor: str, input_dir: str, repeat: int) -> dict:
+    """
+    Измеряет один способ извлечения в отдельном процессе,
+    чтобы пиковый RSS не зависел от другого способа.
+    """
+    pages = load_pages(Path(input_dir))
+    rss_before = max_rss_mb()
+    timings = []
+    heap_peaks = []
+
+    for html_content in pages.values():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cleaner.clean_text(html_content, extractor)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+
+        # Пик Python-кучи на одну страницу (дерево lxml живет вне кучи Python,
+        # поэтому для него важнее смотреть на RSS процесса)
+        tracemalloc.start()
+        cleaner.clean_text(html_content, extractor)
+        heap_peaks.append(tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+        tracemalloc.stop()
+
+    rss_after = max_rss_mb()
+    return {
+        "extractor": extractor,
+        "pages": len(pages),
+        "total_seconds": sum(timings),
+        "median_ms": statistics.median(timings) * 1000,
+        "max_ms": max(timings) * 1000,
+        "heap_peak_mb": max(heap_peaks),
+        "rss_growth_mb": None if rss_before is None else rss_after - rss_before,
+    }
+
+
+def verify_identical(pages: dict) -> list:
+    """Возвращает страницы, на которых способы извлечения дают разный текст."""
+    return [
+        name for name, html_content in pages.items()
+        if cleaner.clean_text_bs4(html_content) != cleaner.clean_text_lxml(html_content)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк извлечения текста из HTML")
+    parser.add_argument("--input-dir", default=str(TASK2_DIR / cleaner.INPUT_DIR),
+                        help="Папка с HTML-файлами")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Количество повторов на страницу (берется лучшее время)")
+    args = parser.parse_args()
+
+    pages = load_pages(Path(args.input_dir))
+    if not pages:
+        print(f"Ошибка: в папке {args.input_dir} нет HTML-файлов!")
+        return
+
+    total_mb = sum(len(html.encode("utf-8")) for html in pages.values()) / (1024 * 1024)
+    print("=" * 60)
+    print("Бенчмарк извлечения текста: bs4 против lxml")
+    print("=" * 60)
+    print(f"Страниц: {len(pages)}, объем HTML: {total_mb:.1f} МБ")
+    print()
+
+    mismatched = verify_identical(pages)
+    if mismatched:
+        print(f"✗ Разный результат на {len(mismatched)} страницах: {', '.join(mismatched)}")
+    else:
+        print(f"✓ Результат совпадает на всех {len(pages)} страницах")
+    print()
+
+    results = []
+    for extractor in ("bs4", "lxml"):
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results.append(executor.submit(measure_extractor, extractor, args.input_dir, args.repeat).result())
+
+    print(f"{'Способ':<8}{'Всего, с':>10}{'Медиана, мс':>14}{'Макс, мс':>11}{'Куча, МБ':>11}{'RSS, МБ':>10}")
+    for r in results:
+        rss = "н/д" if r["rss_growth_mb"] is None else f"{r['rss_growth_mb']:.0f}"
+        print(f"{r['extractor']:<8}{r['total_seconds']:>10.2f}{r['median_ms']:>14.1f}"
+              f"{r['max_ms']:>11.1f}{r['heap_peak_mb']:>11.1f}{rss:>10}")
+
+    bs4_result, lxml_result = results
+    print()
+    print(f"Ускорение lxml: x{bs4_result['total_seconds'] / lxml_result['total_seconds']:.1f} "
+          f"({total_mb / lxml_result['total_seconds']:.1f} МБ/с против "
+          f"{total_mb / bs4_result['total_seconds']:.1f} МБ/с)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Бенчмарк скачивания страниц: последовательный режим против асинхронного.
+Поднимает локальный HTTP-сервер, имитирующий вики с заданной задержкой ответа,
+поэтому ускорение можно измерить без доступа к сети.
+"""
+
+import os
+import sys
+import time
+import tempfile
+import asyncio
+import argparse
+import importlib
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Добавляем путь к скриптам Task2 для импорта
+SCRIPT_DIR = Path(__file__).parent.absolute()
+sys.path.insert(0, str(SCRIPT_DIR.parent))
+
+downloader = importlib.import_module("01_download_pages")
+
+PAGE_SIZE = 200_000  # Примерный размер страницы Fandom в байтах
+
+
+def make_handler(latency: float, body: bytes, stats: dict):
+    """
+    Создает обработчик запросов, который отвечает с задержкой `latency`.
+    Поддерживает ETag: на совпадающий If-None-Match отвечает 304 без тела.
+    """
+    etag = '"stub-v1"'
+
+    class WikiStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, чтобы пул соединений имел смысл
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+            stats["bytes"] += len(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return WikiStubHandler
+
+
+def start_stub_server(latency: float):
+    """Запускает локальный сервер в фоновом потоке и возвращает его и базовый URL."""
+    body = ("<html><body><div class=\"mw-parser-output\">"
+            + "x" * PAGE_SIZE + "</div></body></html>").encode("utf-8")
+    stats = {"bytes": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(latency, body, stats))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/wiki/", stats
+
+
+def run_sequential(pages, base_url: str, delay: float) -> float:
+    """Скачивает страницы по одной, как в исходном режиме."""
+    start = time.perf_counter()
+    for page_name in pages:
+        downloader.download_page(page_name, base_url)
+        time.sleep(delay)
+    return time.perf_counter() - start
+
+
+def run_async(pages, base_url: str, concurrency: int, rate: float, fetch_state=None) -> float:
+    """Скачивает страницы в асинхронном режиме (с условными запросами, если передано состояние)."""
+    start = time.perf_counter()
+    asyncio.run(downloader.download_pages_async(
+        pages,
+        downloader.save_html,
+        concurrency=concurrency,
+        rate=rate,
+        base_url=base_url,
+        fetch_state=fetch_state
+    ))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк скачивания страниц")
+    parser.add_argument("--pages", type=int, default=200, help="Количество страниц")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа сервера, с")
+    parser.add_argument("--delay", type=float, default=0.0,
+                        help="Задержка между запросами в последовательном режиме, с")
+    parser.add_argument("--concurrency", type=int, default=downloader.CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=100.0, help="Лимит запросов/с на хост")
+    args = parser.parse_args()
+
+    server, base_url, stats = start_stub_server(args.latency)
+    pages = [f"Page_{i}" for i in range(args.pages)]
+
+    print("=" * 60)
+    print("Бенчмарк скачивания страниц")
+    print("=" * 60)
+    print(f"Страниц: {args.pages}, задержка сервера: {args.latency * 1000:.0f} мс")
+    print()
+
+    sequential_time = run_sequential(pages, base_url, args.delay)
+
+    # Страницы сохраняются во временную папку, чтобы проверить повторный запуск
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        fetch_state = downloader.load_fetch_state()
+
+        stats["bytes"] = 0
+        async_time = run_async(pages, base_url, args.concurrency, args.rate, fetch_state)
+        first_bytes = stats["bytes"]
+
+        stats["bytes"] = 0
+        rerun_time = run_async(pages, base_url, args.concurrency, args.rate, fetch_state)
+        rerun_bytes = stats["bytes"]
+        os.chdir(SCRIPT_DIR)
+    server.shutdown()
+
+    print()
+    print(f"Последовательно:  {sequential_time:.2f} с ({args.pages / sequential_time:.1f} стр/с)")
+    print(f"Асинхронно:       {async_time:.2f} с ({args.pages / async_time:.1f} стр/с)")
+    print(f"Ускорение:        x{sequential_time / async_time:.1f}")
+    print(f"Повторный запуск (условные запросы): {rerun_time:.2f} с, "
+          f"передано {rerun_bytes / 1024:.0f} КБ вместо {first_bytes / 1024:.0f} КБ")
+
+    # В исходном режиме после каждой страницы есть пауза DELAY
+    production_time = sequential_time + args.pages * (downloader.DELAY - args.delay)
+    print(f"Последовательно с DELAY={downloader.DELAY} с: ~{production_time:.0f} с "
+          f"(x{production_time / async_time:.0f} медленнее асинхронного режима)")
+
+
+if __name__ == "__main__":
+    main()
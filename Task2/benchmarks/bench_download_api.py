@@ -0,0 +1,115 @@
+"""
+Бенчмарк скачивания через MediaWiki API против скачивания полных страниц.
+Записи API собираются из raw_html/, сервер-заглушка (benchmarks/mediawiki_stub.py)
+отдает и полные страницы, и ответы api.php. Сравниваются число запросов
+и переданные байты при первом и повторном запуске для полных страниц, режима API
+(викитекст пачками) и режима API с action=parse, а также текст после очистки.
+
+Запуск из папки Task2:
+    python -m benchmarks.bench_download_api --latency 0.02
+"""
+
+import os
+import time
+import argparse
+import importlib
+import tempfile
+from pathlib import Path
+
+import requests
+
+from benchmarks import TASK2_DIR
+from benchmarks.mediawiki_stub import recordings_from_html, start_stub_server
+from blob_store import BlobStore
+from fetch_state import CHANGED
+
+cleaner = importlib.import_module("02_clean_texts")
+downloader = importlib.import_module("01_download_pages")
+
+
+def run_pages(pages, wiki_url: str, fetch_state, store: BlobStore):
+    """Прежний режим: условный запрос полной страницы на каждую статью."""
+    session = requests.Session()
+    for page_name in pages:
+        status, html_content = downloader.fetch_page(page_name, fetch_state, wiki_url, session=session, store=store)
+        if status == CHANGED:
+            store.put(page_name, html_content)
+
+
+def run_api(pages, api_url: str, fetch_state, store: BlobStore):
+    """Режим MediaWiki API: викитекст пачками, HTML собирается локально."""
+    downloader.download_pages_api(pages, store.put, fetch_state, api_url, rate=1000.0, store=store)
+
+
+def run_api_parse(pages, api_url: str, fetch_state, store: BlobStore):
+    """Режим MediaWiki API с HTML каждой статьи через action=parse."""
+    downloader.download_pages_api(pages, store.put, fetch_state, api_url, rate=1000.0, store=store,
+                                  parse_articles=True)
+
+
+def measure(run, pages, url, fetch_state, store, stats):
+    stats["requests"] = 0
+    stats["bytes"] = 0
+    start = time.perf_counter()
+    run(pages, url, fetch_state, store)
+    return time.perf_counter() - start, stats["requests"], stats["bytes"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк скачивания через MediaWiki API")
+    parser.add_argument("--html-dir", default=str(TASK2_DIR / "raw_html"), help="Папка со скачанными страницами")
+    parser.add_argument("--latency", type=float, default=0.02, help="Задержка ответа сервера, с")
+    args = parser.parse_args()
+
+    html_dir = Path(args.html_dir)
+    pages = sorted(path.stem for path in html_dir.glob("*.html"))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        recordings_from_html(html_dir, work_dir / "recordings")
+        server, api_url, wiki_url, stats = start_stub_server(work_dir / "recordings", html_dir, args.latency)
+
+        print("=" * 60)
+        print("Бенчмарк скачивания через MediaWiki API")
+        print("=" * 60)
+        print(f"Страниц: {len(pages)}, задержка сервера: {args.latency * 1000:.0f} мс")
+        print()
+        print(f"{'Режим':<28}{'Время, с':>10}{'Запросов':>10}{'Передано, КБ':>14}")
+
+        stores = {}
+        modes = (("страницы", run_pages, wiki_url), ("API", run_api, api_url),
+                 ("API parse", run_api_parse, api_url))
+        for mode, run, url in modes:
+            os.chdir(work_dir)
+            fetch_state = {"last_run": None, "pages": {}}
+            store = BlobStore(str(work_dir / f"store_{mode}"))
+            for label in ("первый запуск", "повторный"):
+                elapsed, requests_count, sent = measure(run, pages, url, fetch_state, store, stats)
+                print(f"{f'{mode}, {label}':<28}{elapsed:>10.2f}{requests_count:>10}{sent / 1024:>14.0f}")
+            stores[mode] = store
+        server.shutdown()
+
+        # Очистка должна давать тот же текст: тело статьи во всех режимах одно и то же
+        mismatched = []
+        for page_name in pages:
+            texts = []
+            for store in stores.values():
+                with store.open(page_name) as stream:
+                    # Викитекст, как и MediaWiki, не сохраняет пробелы в начале и конце строк
+                    lines = cleaner.clean_text_stream(stream).split("\n")
+                    texts.append([line.strip() for line in lines])
+            if any(text != texts[0] for text in texts[1:]):
+                mismatched.append(page_name)
+        for store in stores.values():
+            store.close()
+        os.chdir(TASK2_DIR)
+
+    print()
+    if mismatched:
+        print(f"✗ Текст после очистки отличается: {', '.join(mismatched)}")
+    else:
+        print(f"✓ Текст после очистки совпадает на всех {len(pages)} страницах")
+
+
+if __name__ == "__main__":
+    main()
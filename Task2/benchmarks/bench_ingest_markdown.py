@@ -0,0 +1,88 @@
+"""
+Бенчмарк загрузки Markdown/MDX-документации на синтетическом дереве файлов.
+Сравнивает последовательный os.walk с параллельным обходом через os.scandir
+и измеряет полную загрузку (чтение, преобразование, запись) при разном числе процессов.
+
+Запуск из папки Task2:
+    python -m benchmarks.bench_ingest_markdown --files 20000 --workers 1,2,4
+"""
+
+import os
+import time
+import shutil
+import argparse
+import importlib
+import tempfile
+from pathlib import Path
+
+from benchmarks.corpus import DEFAULT_CORPUS_DIR, generate_markdown_tree
+
+ingest = importlib.import_module("02_ingest_markdown")
+
+
+def os_walk_files(root: str) -> list:
+    """Прежний способ обхода: os.walk в одном потоке."""
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d not in ingest.SKIP_DIRS]
+        files.extend(os.path.join(dirpath, name) for name in filenames
+                     if name.lower().endswith(ingest.MARKDOWN_EXTENSIONS))
+    return sorted(files)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def ingest_all(paths: list, root: str, workers: int, output_dir: str) -> int:
+    """Полная загрузка: преобразование и запись документов."""
+    written = 0
+    for name, text, metadata, error in ingest.convert_markdown_files(paths, root, workers):
+        if error is None and text:
+            ingest.save_document(name, text, metadata, output_dir)
+            written += 1
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк загрузки Markdown/MDX")
+    parser.add_argument("--files", type=int, default=20_000, help="Файлов в синтетическом дереве")
+    parser.add_argument("--walk-workers", type=int, default=ingest.WALK_WORKERS,
+                        help="Потоков для параллельного обхода")
+    parser.add_argument("--workers", default="1,2,4", help="Числа процессов для преобразования через запятую")
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="Папка для корпусов")
+    args = parser.parse_args()
+
+    root = str(generate_markdown_tree(args.files, Path(args.corpus_dir)))
+    total_mb = sum(os.path.getsize(path) for path in os_walk_files(root)) / (1024 * 1024)
+
+    print("=" * 60)
+    print("Бенчмарк загрузки Markdown/MDX")
+    print("=" * 60)
+    print(f"Дерево: {root}")
+    print(f"Файлов: {args.files}, объем: {total_mb:.1f} МБ, ядер: {os.cpu_count()}")
+    print()
+
+    walk_files, walk_time = timed(os_walk_files, root)
+    scan_files, scan_time = timed(ingest.walk_markdown_files, root, args.walk_workers)
+    if walk_files != scan_files:
+        print("✗ Обходы нашли разные файлы!")
+    print(f"{'Обход':<32}{'Время, с':>10}{'Файлов/с':>12}")
+    print(f"{'os.walk':<32}{walk_time:>10.2f}{len(walk_files) / walk_time:>12.0f}")
+    print(f"{f'os.scandir, потоков: {args.walk_workers}':<32}{scan_time:>10.2f}{len(scan_files) / scan_time:>12.0f}")
+    print()
+
+    print(f"{'Процессов':>9}{'Время, с':>10}{'Файлов/с':>12}{'МБ/с':>8}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        output_dir = tempfile.mkdtemp(prefix="kb_markdown_")
+        try:
+            written, elapsed = timed(ingest_all, scan_files, root, workers, output_dir)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        print(f"{workers:>9}{elapsed:>10.2f}{written / elapsed:>12.0f}{total_mb / elapsed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Бенчмарк замены терминов: последовательные re.sub против однопроходного TermReplacer.
+Показывает, как время замены растет с размером словаря (100 / 1 000 / 10 000 терминов).
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+# Добавляем путь к скриптам Task2 для импорта
+SCRIPT_DIR = Path(__file__).parent.absolute()
+TASK2_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(TASK2_DIR))
+
+from term_replacer import TermReplacer
+
+SYLLABLES = ["ka", "ren", "tho", "vex", "mar", "lo", "qui", "zan", "del", "ro",
+             "sha", "tor", "vin", "bel", "ur", "kai", "nex", "dra", "sol", "mi"]
+
+
+def legacy_replace(text: str, terms_map: dict) -> str:
+    """Прежний алгоритм: отдельный re.sub на каждый термин."""
+    patterns = [(rf"\b{re.escape(original)}\b", replacement) for original, replacement in terms_map.items()]
+    patterns.sort(key=lambda x: len(x[0]), reverse=True)
+    for pattern, replacement in patterns:
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    return text
+
+
+def make_terms_map(size: int, base_terms: dict, rng: random.Random) -> dict:
+    """Дополняет настоящий словарь синтетическими терминами до нужного размера."""
+    terms_map = dict(list(base_terms.items())[:size])
+    while len(terms_map) < size:
+        words = [
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            for _ in range(rng.randint(1, 3))
+        ]
+        terms_map.setdefault(" ".join(words), f"Term{len(terms_map)}")
+    return terms_map
+
+
+def load_text(size: int) -> str:
+    """Собирает тестовый текст из очищенных статей."""
+    parts = []
+    total = 0
+    for txt_file in sorted((TASK2_DIR / "cleaned_texts").glob("*.txt")):
+        with open(txt_file, "r", encoding="utf-8") as f:
+            parts.append(f.read())
+        total += len(parts[-1])
+        if total >= size:
+            break
+    return "\n\n".join(parts)[:size]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк замены терминов")
+    parser.add_argument("--sizes", default="100,1000,10000", help="Размеры словаря через запятую")
+    parser.add_argument("--text-size", type=int, default=500_000, help="Размер текста в символах")
+    parser.add_argument("--legacy-max-terms", type=int, default=1_000,
+                        help="Не запускать прежний алгоритм на словарях больше этого размера")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with open(TASK2_DIR / "terms_map.json", "r", encoding="utf-8") as f:
+        base_terms = json.load(f)["replacements"]
+
+    text = load_text(args.text_size)
+    text_mb = len(text.encode("utf-8")) / (1024 * 1024)
+    rng = random.Random(args.seed)
+
+    print("=" * 72)
+    print("Бенчмарк замены терминов")
+    print("=" * 72)
+    print(f"Размер текста: {len(text)} символов ({text_mb:.2f} МБ)")
+    print()
+    print(f"{'Терминов':>9}{'Компиляция, с':>15}{'Один проход, с':>16}{'МБ/с':>8}{'re.sub x N, с':>15}{'Ускорение':>11}")
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        terms_map = make_terms_map(size, base_terms, rng)
+
+        replacer, compile_time = timed(TermReplacer.from_terms_map, terms_map)
+        _, single_pass_time = timed(replacer.replace, text)
+
+        if size <= args.legacy_max_terms:
+            _, legacy_time = timed(legacy_replace, text, terms_map)
+            legacy_column = f"{legacy_time:>15.2f}{legacy_time / single_pass_time:>10.0f}x"
+        else:
+            legacy_column = f"{'-':>15}{'-':>11}"
+
+        print(f"{size:>9}{compile_time:>15.3f}{single_pass_time:>16.3f}"
+              f"{text_mb / single_pass_time:>8.1f}{legacy_column}")
+
+
+if __name__ == "__main__":
+    main()
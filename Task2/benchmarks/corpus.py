@@ -0,0 +1,436 @@
+"""
+Генератор синтетического корпуса, похожего на страницы MediaWiki (Fandom).
+
+Для каждого документа создается HTML со служебной разметкой (скрипты, навигация,
+инфобокс, заголовки, списки) и соответствующий ему очищенный текст.
+Для загрузчиков документации создаются дерево Markdown/MDX-файлов, каталог PDF
+и zip-архив HTML-экспорта Confluence.
+В тексте встречаются термины из terms_map.json, чтобы замена терминов
+выполняла реальную работу. Корпус детерминирован: одинаковые параметры
+дают одинаковые файлы.
+"""
+
+import os
+import json
+import random
+import argparse
+import zipfile
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks import TASK2_DIR
+
+CORPUS_FORMAT_VERSION = 1
+CORPUS_INFO_FILE = "corpus.json"
+DEFAULT_CORPUS_DIR = Path(tempfile.gettempdir()) / "task2_bench_corpus"
+DEFAULT_PARAGRAPHS = 12  # Абзацев в документе (около 8 КБ HTML и 6 КБ текста)
+TERM_PROBABILITY = 0.04  # Доля слов текста, замененных терминами словаря
+
+WORDS = [
+    "the", "of", "and", "to", "in", "was", "his", "that", "with", "as", "for", "by",
+    "on", "he", "her", "from", "which", "after", "during", "battle", "empire", "republic",
+    "galaxy", "planet", "ship", "fleet", "war", "order", "council", "master", "apprentice",
+    "clone", "army", "senate", "rebellion", "base", "system", "moon", "desert", "city",
+    "temple", "training", "lightsaber", "pilot", "smuggler", "hunter", "droid", "ancient",
+    "powerful", "young", "later", "eventually", "returned", "escaped", "fought", "joined",
+    "led", "discovered", "destroyed", "served", "became", "known", "years", "before",
+]
+
+SECTIONS = ["Biography", "Early life", "Personality and traits", "Powers and abilities",
+            "Equipment", "Behind the scenes", "Appearances", "Sources"]
+
+# Служебные блоки страницы Fandom: скрипты, стили и навигация занимают
+# заметную часть HTML и должны быть выброшены при очистке
+BOILERPLATE_HEAD = (
+    "<head><meta charset=\"utf-8\"><title>{title} | Wookieepedia | Fandom</title>"
+    "<style>.mw-parser-output{{margin:0}}.portable-infobox{{float:right}}</style>"
+    "<script>var wgPageName=\"{title}\";var wgArticleId={doc_id};"
+    "window.ads={{slots:[\"top\",\"bottom\"],lazy:true}};</script></head>"
+)
+BOILERPLATE_NAV = (
+    "<header class=\"fandom-community-header\"><nav><ul>"
+    "<li><a href=\"/wiki/Main_Page\">Main Page</a></li>"
+    "<li><a href=\"/wiki/Special:Random\">Random page</a></li>"
+    "<li><a href=\"/wiki/Special:RecentChanges\">Recent changes</a></li>"
+    "</ul></nav></header>"
+)
+BOILERPLATE_FOOTER = (
+    "<footer class=\"global-footer\"><p>Community content is available under "
+    "CC-BY-SA unless otherwise noted.</p></footer>"
+    "<script>window.fandomTracking={{page:\"{title}\",id:{doc_id}}};</script>"
+)
+
+
+def load_terms(terms_map_file: Path = TASK2_DIR / "terms_map.json") -> List[str]:
+    """Загружает оригинальные термины словаря замен."""
+    with open(terms_map_file, "r", encoding="utf-8") as f:
+        return list(json.load(f)["replacements"])
+
+
+def make_sentence(rng: random.Random, terms: List[str]) -> str:
+    """Составляет предложение из словаря и терминов."""
+    words = [
+        rng.choice(terms) if terms and rng.random() < TERM_PROBABILITY else rng.choice(WORDS)
+        for _ in range(rng.randint(8, 24))
+    ]
+    return " ".join(words).capitalize() + "."
+
+
+def make_document(doc_id: int, rng: random.Random, terms: List[str], paragraphs: int) -> Dict:
+    """Создает структуру документа: заголовок, инфобокс и разделы с абзацами."""
+    title = f"Synthetic_{doc_id:05d}"
+    infobox = [(field, rng.choice(terms) if terms else rng.choice(WORDS))
+               for field in ("Homeworld", "Species", "Affiliation")]
+
+    sections = []
+    remaining = paragraphs
+    for section in rng.sample(SECTIONS, k=min(len(SECTIONS), max(1, paragraphs // 3))):
+        count = min(remaining, rng.randint(1, 4)) if remaining else 0
+        remaining -= count
+        sections.append({
+            "heading": section,
+            "paragraphs": [" ".join(make_sentence(rng, terms) for _ in range(rng.randint(3, 6)))
+                           for _ in range(count)],
+            "items": [make_sentence(rng, terms) for _ in range(rng.randint(0, 4))],
+        })
+    if remaining:
+        sections[-1]["paragraphs"].extend(
+            " ".join(make_sentence(rng, terms) for _ in range(rng.randint(3, 6)))
+            for _ in range(remaining)
+        )
+    return {"id": doc_id, "title": title, "infobox": infobox, "sections": sections}
+
+
+def render_html(doc: Dict) -> str:
+    """Собирает HTML-страницу в разметке MediaWiki."""
+    title = doc["title"]
+    parts = ["<!DOCTYPE html><html lang=\"en\">",
+             BOILERPLATE_HEAD.format(title=title, doc_id=doc["id"]),
+             "<body>", BOILERPLATE_NAV,
+             f"<main><h1 class=\"page-header__title\">{title}</h1>",
+             "<div class=\"mw-parser-output\">",
+             "<aside class=\"portable-infobox\">"]
+    for field, value in doc["infobox"]:
+        parts.append(f"<div class=\"pi-item\"><h3>{field}</h3><div>{value}</div></div>")
+    parts.append("</aside>")
+
+    for section in doc["sections"]:
+        parts.append(f"<h2><span class=\"mw-headline\">{section['heading']}</span>"
+                     "<span class=\"mw-editsection\">[edit]</span></h2>")
+        for paragraph in section["paragraphs"]:
+            parts.append(f"<p>{paragraph}<sup class=\"reference\">[1]</sup></p>")
+        if section["items"]:
+            parts.append("<ul>" + "".join(f"<li>{item}</li>" for item in section["items"]) + "</ul>")
+
+    parts.append("</div></main>")
+    parts.append(BOILERPLATE_FOOTER.format(title=title, doc_id=doc["id"]))
+    parts.append("</body></html>")
+    return "\n".join(parts)
+
+
+def render_text(doc: Dict) -> str:
+    """Собирает очищенный текст документа (как после этапа очистки)."""
+    lines = [doc["title"], ""]
+    for section in doc["sections"]:
+        lines.append(section["heading"])
+        lines.extend(section["paragraphs"])
+        lines.extend(section["items"])
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def corpus_path(corpus_dir: Path, docs: int, seed: int, paragraphs: int) -> Path:
+    """Папка корпуса с заданными параметрами."""
+    return Path(corpus_dir) / f"docs{docs}_seed{seed}_p{paragraphs}"
+
+
+def generate_corpus(
+    docs: int,
+    corpus_dir: Path = DEFAULT_CORPUS_DIR,
+    seed: int = 42,
+    paragraphs: int = DEFAULT_PARAGRAPHS
+) -> Tuple[Path, Path]:
+    """
+    Создает корпус из docs документов (или использует ранее созданный).
+
+    Returns:
+        Кортеж (папка с HTML, папка с текстами)
+    """
+    path = corpus_path(corpus_dir, docs, seed, paragraphs)
+    html_dir = path / "raw_html"
+    text_dir = path / "cleaned_texts"
+    info = {"format_version": CORPUS_FORMAT_VERSION, "docs": docs, "seed": seed, "paragraphs": paragraphs}
+
+    if corpus_ready(path, info):
+        return html_dir, text_dir
+
+    html_dir.mkdir(parents=True, exist_ok=True)
+    text_dir.mkdir(parents=True, exist_ok=True)
+
+    terms = load_terms()
+    rng = random.Random(seed)
+    for doc_id in range(docs):
+        doc = make_document(doc_id, rng, terms, paragraphs)
+        with open(html_dir / f"{doc['title']}.html", "w", encoding="utf-8") as f:
+            f.write(render_html(doc))
+        with open(text_dir / f"{doc['title']}.txt", "w", encoding="utf-8") as f:
+            f.write(render_text(doc))
+
+    mark_corpus_ready(path, info)
+    return html_dir, text_dir
+
+
+def corpus_ready(path: Path, info: Dict) -> bool:
+    """Проверяет, что корпус с такими параметрами уже создан."""
+    info_file = path / CORPUS_INFO_FILE
+    if not info_file.exists():
+        return False
+    with open(info_file, "r", encoding="utf-8") as f:
+        return json.load(f) == info
+
+
+def mark_corpus_ready(path: Path, info: Dict):
+    """Записывает описание корпуса. Пишется последним: прерванная генерация будет повторена."""
+    with open(path / CORPUS_INFO_FILE, "w", encoding="utf-8") as f:
+        json.dump(info, f, indent=2)
+
+
+def render_markdown(doc: Dict, mdx: bool) -> str:
+    """Собирает Markdown-документ с front-matter (и MDX-компонентами для .mdx)."""
+    parts = ["---", f"title: \"{doc['title'].replace('_', ' ')}\"",
+             f"description: {doc['sections'][0]['heading']}", "tags: [docs, synthetic]", "---", ""]
+    if mdx:
+        parts += ["import { Callout, Tabs, Tab } from '@site/components';", "",
+                  "export const meta = {", "  owner: 'platform-team',", "};", ""]
+    parts += [f"# {doc['title'].replace('_', ' ')}", ""]
+
+    for index, section in enumerate(doc["sections"]):
+        parts += [f"## {section['heading']}", ""]
+        for paragraph in section["paragraphs"]:
+            parts += [f"{paragraph} See [the runbook](../runbooks/{doc['id']}.md) for details.", ""]
+        if section["items"]:
+            parts += [f"- {item}" for item in section["items"]] + [""]
+        if mdx and index == 0:
+            parts += ["<Callout type=\"warning\">", doc["infobox"][0][1], "</Callout>", "",
+                      "{/* TODO: обновить схему */}", "", "<Diagram src=\"./arch.svg\" />", ""]
+        if index == 1:
+            parts += ["```python", "def handler(event):", "    return {\"status\": \"ok\"}", "```", ""]
+    return "\n".join(parts)
+
+
+def generate_markdown_tree(
+    files: int,
+    corpus_dir: Path = DEFAULT_CORPUS_DIR,
+    seed: int = 42,
+    files_per_dir: int = 20,
+    mdx_share: float = 0.3
+) -> Path:
+    """
+    Создает дерево Markdown/MDX-файлов, похожее на документацию монорепозитория:
+    services/<сервис>/docs/<раздел>/..., до files_per_dir файлов в каталоге.
+    В каталоги node_modules/ кладутся файлы, которые обход должен пропустить.
+
+    Returns:
+        Корень дерева
+    """
+    root = Path(corpus_dir) / f"markdown{files}_seed{seed}"
+    info = {"format_version": CORPUS_FORMAT_VERSION, "files": files, "seed": seed,
+            "files_per_dir": files_per_dir, "mdx_share": mdx_share}
+    if corpus_ready(root, info):
+        return root / "repo"
+
+    terms = load_terms()
+    rng = random.Random(seed)
+    for doc_id in range(files):
+        directory_id = doc_id // files_per_dir
+        service = f"service_{directory_id % 50:02d}"
+        area = "/".join(f"area_{(directory_id // 50) % 7}_{level}" for level in range(rng.randint(1, 3)))
+        directory = root / "repo" / "services" / service / "docs" / area / f"part_{directory_id}"
+        directory.mkdir(parents=True, exist_ok=True)
+
+        mdx = rng.random() < mdx_share
+        doc = make_document(doc_id, rng, terms, rng.randint(2, 8))
+        with open(directory / f"{doc['title']}{'.mdx' if mdx else '.md'}", "w", encoding="utf-8") as f:
+            f.write(render_markdown(doc, mdx))
+
+        if doc_id % 1000 == 0:
+            vendored = root / "repo" / "services" / service / "node_modules" / "pkg"
+            vendored.mkdir(parents=True, exist_ok=True)
+            with open(vendored / "README.md", "w", encoding="utf-8") as f:
+                f.write("# vendored package\n")
+
+    mark_corpus_ready(root, info)
+    return root / "repo"
+
+
+def corpus_size_mb(directory: Path) -> float:
+    """Суммарный размер файлов папки в МБ."""
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()) / (1024 * 1024)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_simple_pdf(path: Path, pages: List[List[str]]):
+    """
+    Записывает PDF с текстом (по списку строк на страницу) без сторонних библиотек:
+    шрифт Helvetica, один поток содержимого на страницу.
+    """
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_refs = []
+    for lines in pages:
+        content = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(content.encode('latin-1'))} >>\nstream\n{content}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>"
+
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(data)
+    data += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    data += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    data += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def generate_pdf_corpus(
+    files: int,
+    corpus_dir: Path = DEFAULT_CORPUS_DIR,
+    seed: int = 42,
+    pages: int = 40
+) -> Path:
+    """
+    Создает каталог PDF-спецификаций по pages страниц (около 60 строк на страницу).
+
+    Returns:
+        Каталог с PDF-файлами
+    """
+    root = Path(corpus_dir) / f"pdf{files}_seed{seed}_p{pages}"
+    info = {"format_version": CORPUS_FORMAT_VERSION, "files": files, "seed": seed, "pages": pages}
+    if corpus_ready(root, info):
+        return root / "pdf"
+
+    (root / "pdf").mkdir(parents=True, exist_ok=True)
+    terms = load_terms()
+    rng = random.Random(seed)
+    for doc_id in range(files):
+        pdf_pages = []
+        for _ in range(pages):
+            words = " ".join(make_sentence(rng, terms) for _ in range(60)).split()
+            lines, line = [], []
+            for word in words:
+                line.append(word)
+                if len(line) >= 14:
+                    lines.append(" ".join(line))
+                    line = []
+            pdf_pages.append(lines[:60])
+        write_simple_pdf(root / "pdf" / f"Spec_{doc_id:04d}.pdf", pdf_pages)
+
+    mark_corpus_ready(root, info)
+    return root / "pdf"
+
+
+def render_confluence_page(doc: Dict, space: str) -> str:
+    """Собирает страницу в разметке HTML-экспорта Confluence."""
+    title = doc["title"].replace("_", " ")
+    parts = [f"<html><head><title>{space} : {title}</title>",
+             "<link rel=\"stylesheet\" href=\"styles/site.css\" type=\"text/css\" /></head>",
+             "<body class=\"theme-default aui-theme-default\"><div id=\"page\"><div id=\"main\" class=\"aui-page-panel\">",
+             f"<div id=\"main-header\"><div id=\"breadcrumb-section\"><ol id=\"breadcrumbs\">"
+             f"<li><a href=\"index.html\">{space}</a></li></ol></div>",
+             f"<h1 id=\"title-heading\" class=\"pagetitle\">{title}</h1></div>",
+             "<div id=\"content\" class=\"view\"><div class=\"page-metadata\">Created by Synthetic User</div>",
+             "<div id=\"main-content\" class=\"wiki-content group\">"]
+    for section in doc["sections"]:
+        parts.append(f"<h2 id=\"{doc['title']}-{section['heading'].replace(' ', '')}\">{section['heading']}</h2>")
+        parts.extend(f"<p>{paragraph}</p>" for paragraph in section["paragraphs"])
+        if section["items"]:
+            parts.append("<ul>" + "".join(f"<li>{item}</li>" for item in section["items"]) + "</ul>")
+    parts.append("</div><div class=\"pageSection group\"><h2 class=\"pageSectionTitle\">Attachments:</h2></div>")
+    parts.append("</div></div><div id=\"footer\" role=\"contentinfo\"><section class=\"footer-body\">"
+                 "<p>Document generated by Confluence</p></section></div></div></body></html>")
+    return "\n".join(parts)
+
+
+def generate_confluence_export(
+    pages: int,
+    corpus_dir: Path = DEFAULT_CORPUS_DIR,
+    seed: int = 42,
+    space: str = "SYN",
+    paragraphs: int = DEFAULT_PARAGRAPHS
+) -> Path:
+    """
+    Создает zip-архив в формате HTML-экспорта пространства Confluence:
+    <пространство>/index.html, страницы, attachments/ и styles/.
+
+    Returns:
+        Путь к архиву
+    """
+    root = Path(corpus_dir) / f"confluence{pages}_seed{seed}_p{paragraphs}"
+    archive_path = root / f"{space}.zip"
+    info = {"format_version": CORPUS_FORMAT_VERSION, "pages": pages, "seed": seed,
+            "space": space, "paragraphs": paragraphs}
+    if corpus_ready(root, info):
+        return archive_path
+
+    root.mkdir(parents=True, exist_ok=True)
+    terms = load_terms()
+    rng = random.Random(seed)
+    with zipfile.ZipFile(archive_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(f"{space}/index.html", f"<html><head><title>{space}</title></head><body>Space</body></html>")
+        archive.writestr(f"{space}/styles/site.css", "body { margin: 0; }")
+        for doc_id in range(pages):
+            doc = make_document(doc_id, rng, terms, paragraphs)
+            archive.writestr(f"{space}/{doc['title']}_{100000 + doc_id}.html", render_confluence_page(doc, space))
+            if doc_id % 100 == 0:
+                archive.writestr(f"{space}/attachments/{100000 + doc_id}/diagram.html", "<html></html>")
+
+    mark_corpus_ready(root, info)
+    return archive_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетического корпуса MediaWiki")
+    parser.add_argument("--docs", type=int, default=1000, help="Количество документов")
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="Папка для корпусов")
+    parser.add_argument("--paragraphs", type=int, default=DEFAULT_PARAGRAPHS, help="Абзацев в документе")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--markdown", action="store_true",
+                        help="Создать дерево Markdown/MDX-файлов вместо HTML-корпуса")
+    parser.add_argument("--pdf", action="store_true",
+                        help="Создать каталог PDF-файлов вместо HTML-корпуса")
+    parser.add_argument("--confluence", action="store_true",
+                        help="Создать zip-архив HTML-экспорта Confluence вместо HTML-корпуса")
+    args = parser.parse_args()
+
+    if args.confluence:
+        archive_path = generate_confluence_export(args.docs, Path(args.corpus_dir), args.seed)
+        print(f"✓ Экспорт Confluence: {archive_path}")
+        return
+
+    if args.pdf:
+        root = generate_pdf_corpus(args.docs, Path(args.corpus_dir), args.seed)
+        print(f"✓ PDF: {root}")
+        return
+
+    if args.markdown:
+        root = generate_markdown_tree(args.docs, Path(args.corpus_dir), args.seed)
+        print(f"✓ Markdown/MDX: {root}")
+        return
+
+    html_dir, text_dir = generate_corpus(args.docs, Path(args.corpus_dir), args.seed, args.paragraphs)
+    print(f"✓ HTML: {html_dir} ({corpus_size_mb(html_dir):.1f} МБ)")
+    print(f"✓ Тексты: {text_dir} ({corpus_size_mb(text_dir):.1f} МБ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+"""
+Локальный сервер-заглушка MediaWiki API, воспроизводящий записанные ответы.
+
+Записи хранятся по одной на страницу (<страница>.json): объект страницы из ответа
+action=query (с викитекстом текущей ревизии) и объект parse из ответа action=parse.
+Из них сервер собирает ответ на любой набор titles или revids, с нормализацией
+названий, перенаправлениями и missing, как настоящий api.php; викитекст
+отдается, только если он запрошен (rvprop=content). Дополнительно может отдавать полные страницы /wiki/<страница>
+из папки HTML (с ETag для условных запросов), чтобы сравнить оба режима скачивания.
+
+Записи можно снять с настоящей вики или собрать из уже скачанных страниц:
+    python -m benchmarks.mediawiki_stub --record https://starwars.fandom.com/api.php
+    python -m benchmarks.mediawiki_stub --from-html raw_html
+Запуск сервера:
+    python -m benchmarks.mediawiki_stub --port 8766 --html-dir raw_html
+    python 01_download_pages.py --api --api-url http://127.0.0.1:8766/api.php
+"""
+
+import re
+import copy
+import json
+import time
+import zlib
+import argparse
+import importlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import lxml.html
+import requests
+
+import mediawiki_api
+from benchmarks import TASK2_DIR
+
+cleaner = importlib.import_module("02_clean_texts")
+downloader = importlib.import_module("01_download_pages")
+
+DEFAULT_RECORDINGS_DIR = TASK2_DIR / "benchmarks" / "mediawiki_recordings"
+REDIRECTS_FILE = "_redirects.json"
+# Строка текста, которую викитекст прочитал бы как разметку
+WIKI_MARKUP_RE = re.compile(r"^[*#:;=\s-]|\[|\]|\{|\}|''|<|>|&|__|\|")
+
+
+def normalize_title(title: str) -> str:
+    """Нормализует название, как MediaWiki: пробелы вместо '_', первая буква заглавная."""
+    title = title.replace("_", " ").strip()
+    return title[:1].upper() + title[1:]
+
+
+def wikitext_from_html(body) -> str:
+    """
+    Викитекст для записи из скачанной страницы: строки очищенного текста статьи
+    абзацами (строки с символами разметки - в <nowiki>), чтобы локальное
+    преобразование (wikitext.py) дало тот же текст.
+    """
+    lines = cleaner.extract_text_lxml(body, ".").split("\n")
+    return "\n\n".join(f"<nowiki>{line}</nowiki>" if WIKI_MARKUP_RE.search(line) else line
+                         for line in lines if line)
+
+
+def main_slot(content: str) -> Dict:
+    """Основной слот ревизии с викитекстом (formatversion=2)."""
+    return {"main": {"contentmodel": "wikitext", "contentformat": "text/x-wiki", "content": content}}
+
+
+def save_recording(out_dir: Path, page: Dict, parsed: Dict):
+    """Сохраняет запись одной страницы."""
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{page['title'].replace(' ', '_')}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"query": page, "parse": parsed}, f, ensure_ascii=False)
+
+
+def record_pages(api_url: str, page_names: List[str], out_dir: Path) -> int:
+    """Снимает ответы настоящего API для страниц и сохраняет их как записи."""
+    session = requests.Session()
+    session.headers.update(downloader.HEADERS)
+    redirects = {}
+    recorded = 0
+    for start in range(0, len(page_names), mediawiki_api.TITLES_PER_REQUEST):
+        batch = page_names[start:start + mediawiki_api.TITLES_PER_REQUEST]
+        query = mediawiki_api.query_pages(session, {
+            "rvprop": "ids|timestamp|content",
+            "rvslots": "main",
+            "redirects": "1",
+            "titles": "|".join(mediawiki_api.page_title(page_name) for page_name in batch),
+        }, api_url)
+        redirects.update({item["from"]: item["to"] for item in query.get("redirects", [])})
+        for page in query.get("pages", []):
+            if page.get("missing") or not page.get("revisions"):
+                continue
+            parsed = mediawiki_api.api_get(session, api_url, {
+                "action": "parse",
+                "oldid": str(page["revisions"][0]["revid"]),
+                "prop": "text",
+                "disableeditsection": "1",
+                "disablelimitreport": "1",
+            })["parse"]
+            save_recording(out_dir, page, parsed)
+            recorded += 1
+    with open(out_dir / REDIRECTS_FILE, "w", encoding="utf-8") as f:
+        json.dump(redirects, f, ensure_ascii=False, indent=2)
+    return recorded
+
+
+def recordings_from_html(html_dir: Path, out_dir: Path) -> int:
+    """
+    Собирает записи из скачанных страниц (без сети): тело статьи - div.mw-parser-output
+    полной страницы, викитекст - ее текст (wikitext_from_html), номер ревизии - CRC32 содержимого.
+    """
+    recorded = 0
+    for pageid, html_file in enumerate(sorted(html_dir.glob("*.html")), start=1):
+        root = lxml.html.parse(str(html_file), lxml.html.HTMLParser(encoding="utf-8")).getroot()
+        found = root.xpath(cleaner.CONTENT_ROOT_XPATH)
+        if not found:
+            continue
+        body = lxml.html.tostring(found[0], encoding="unicode", with_tail=False)
+        title = normalize_title(html_file.stem)
+        revid = zlib.crc32(body.encode("utf-8"))
+        page = {
+            "pageid": pageid,
+            "ns": 0,
+            "title": title,
+            "revisions": [{"revid": revid, "parentid": 0, "timestamp": "2024-01-01T00:00:00Z",
+                           "slots": main_slot(wikitext_from_html(found[0]))}],
+        }
+        save_recording(out_dir, page, {"title": title, "pageid": pageid, "revid": revid, "text": body})
+        recorded += 1
+    with open(out_dir / REDIRECTS_FILE, "w", encoding="utf-8") as f:
+        json.dump({}, f)
+    return recorded
+
+
+def load_recordings(recordings_dir: Path) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """Загружает записи: ({название: запись}, {перенаправление: цель})."""
+    recordings = {}
+    redirects = {}
+    for path in recordings_dir.glob("*.json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if path.name == REDIRECTS_FILE:
+            redirects = data
+        else:
+            recordings[data["query"]["title"]] = data
+    return recordings, redirects
+
+
+def make_handler(recordings: Dict[str, Dict], redirects: Dict[str, str], html_dir: Optional[Path],
+                 latency: float, stats: Dict):
+    """Создает обработчик запросов к api.php (и к /wiki/<страница>, если передан html_dir)."""
+    by_revid = {
+        record["query"]["revisions"][0]["revid"]: record for record in recordings.values()
+    }
+
+    def page_response(record: Dict, with_content: bool) -> Dict:
+        page = copy.deepcopy(record["query"])
+        if not with_content:
+            for revision in page.get("revisions", []):
+                revision.pop("slots", None)
+        return page
+
+    def query_response(params: Dict) -> Dict:
+        with_content = "content" in params.get("rvprop", [""])[0].split("|")
+        if "revids" in params:
+            pages = []
+            bad_revids = []
+            for revid in params["revids"][0].split("|"):
+                record = by_revid.get(int(revid))
+                if record is None:
+                    bad_revids.append({"revid": int(revid), "missing": True})
+                else:
+                    pages.append(page_response(record, with_content))
+            query = {"pages": pages}
+            if bad_revids:
+                query["badrevids"] = bad_revids
+            return {"batchcomplete": True, "query": query}
+
+        titles = params.get("titles", [""])[0].split("|")
+        normalized = []
+        redirected = []
+        pages = []
+        for title in titles:
+            target = normalize_title(title)
+            if target != title:
+                normalized.append({"fromencoded": False, "from": title, "to": target})
+            if params.get("redirects") and target in redirects:
+                redirected.append({"from": target, "to": redirects[target]})
+                target = redirects[target]
+            record = recordings.get(target)
+            pages.append(page_response(record, with_content) if record
+                         else {"ns": 0, "title": target, "missing": True})
+        query = {"pages": pages}
+        if normalized:
+            query["normalized"] = normalized
+        if redirected:
+            query["redirects"] = redirected
+        return {"batchcomplete": True, "query": query}
+
+    def parse_response(params: Dict) -> Dict:
+        if "oldid" in params:
+            record = by_revid.get(int(params["oldid"][0]))
+        else:
+            record = recordings.get(normalize_title(params.get("page", [""])[0]))
+        if record is None:
+            return {"error": {"code": "missingtitle", "info": "The page you specified doesn't exist."}}
+        return {"parse": record["parse"]}
+
+    class MediaWikiStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def send_body(self, status: int, body: bytes, content_type: str, etag: Optional[str] = None):
+            # Счетчики обновляются до отправки, чтобы клиент видел их после ответа
+            with lock:
+                stats["requests"] += 1
+                stats["bytes"] += len(body)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            if etag:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            time.sleep(latency)
+            url = urlsplit(self.path)
+            if url.path.endswith("/api.php"):
+                params = parse_qs(url.query)
+                action = params.get("action", [""])[0]
+                if action == "query":
+                    data = query_response(params)
+                elif action == "parse":
+                    data = parse_response(params)
+                else:
+                    data = {"error": {"code": "badvalue", "info": f"Unrecognized value for action: {action}"}}
+                self.send_body(200, json.dumps(data, ensure_ascii=False).encode("utf-8"),
+                               "application/json; charset=utf-8")
+                return
+
+            if html_dir is not None and url.path.startswith("/wiki/"):
+                path = html_dir / f"{unquote(url.path[len('/wiki/'):])}.html"
+                if path.exists():
+                    body = path.read_bytes()
+                    etag = f'"{zlib.crc32(body):08x}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_body(304, b"", "text/html; charset=utf-8", etag)
+                    else:
+                        self.send_body(200, body, "text/html; charset=utf-8", etag)
+                    return
+            self.send_body(404, b"", "text/plain")
+
+        def log_message(self, format, *args):
+            pass
+
+    lock = threading.Lock()
+    return MediaWikiStubHandler
+
+
+def start_stub_server(
+    recordings_dir: Path,
+    html_dir: Optional[Path] = None,
+    latency: float = 0.0,
+    port: int = 0
+):
+    """
+    Запускает сервер в фоновом потоке.
+
+    Returns:
+        Кортеж (сервер, URL api.php, базовый URL /wiki/, счетчики {"requests", "bytes"})
+    """
+    recordings, redirects = load_recordings(recordings_dir)
+    stats = {"requests": 0, "bytes": 0}
+    server = ThreadingHTTPServer(("127.0.0.1", port),
+                                 make_handler(recordings, redirects, html_dir, latency, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}/api.php", f"http://{host}:{port}/wiki/", stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер-заглушка MediaWiki API")
+    parser.add_argument("--recordings", default=str(DEFAULT_RECORDINGS_DIR), help="Папка с записями ответов")
+    parser.add_argument("--record", metavar="API_URL", help="Снять записи с настоящего api.php для страниц из PAGES")
+    parser.add_argument("--from-html", metavar="DIR", help="Собрать записи из скачанных HTML-страниц")
+    parser.add_argument("--html-dir", help="Папка HTML для ответов на /wiki/<страница>")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, с")
+    args = parser.parse_args()
+
+    recordings_dir = Path(args.recordings)
+    if args.record:
+        print(f"✓ Записано страниц: {record_pages(args.record, downloader.PAGES, recordings_dir)}")
+        return
+    if args.from_html:
+        print(f"✓ Записано страниц: {recordings_from_html(Path(args.from_html), recordings_dir)}")
+        return
+
+    if not recordings_dir.is_dir():
+        print(f"Ошибка: папка {recordings_dir} не найдена! Сначала снимите записи (--record или --from-html)")
+        return
+    server, api_url, wiki_url, _ = start_stub_server(
+        recordings_dir, Path(args.html_dir) if args.html_dir else None, args.latency, args.port
+    )
+    print(f"API: {api_url}")
+    if args.html_dir:
+        print(f"Страницы: {wiki_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
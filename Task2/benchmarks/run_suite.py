@@ -0,0 +1,267 @@
+"""
+Набор замеров этапов Task2 на синтетическом корпусе разного размера.
+
+Для каждого размера корпуса измеряются:
+- clean_text           - очистка HTML в памяти (без чтения и записи файлов)
+- replace_terms        - замена терминов в памяти
+- clean_files          - цикл скрипта 02: чтение HTML, очистка, запись текстов
+- replace_files        - цикл скрипта 03: чтение текстов, замена, запись документов
+
+Каждый замер выполняется в отдельном процессе, чтобы пиковый RSS относился
+только к нему; для циклов с --workers > 1 отдельно записывается пиковый RSS
+самого большого процесса пула. Папки корпуса передаются функциям скриптов
+аргументами, поэтому замер не зависит от способа запуска процессов пула.
+Результаты записываются в JSON; с --compare выводится изменение относительно
+прошлого запуска.
+
+Запуск из папки Task2:
+    python -m benchmarks.run_suite --sizes 40,1000,20000
+    python -m benchmarks.run_suite --compare benchmarks/results/baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import importlib
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # На Windows модуля resource нет
+    resource = None
+
+from benchmarks import TASK2_DIR
+from benchmarks.corpus import DEFAULT_CORPUS_DIR, DEFAULT_PARAGRAPHS, corpus_size_mb, generate_corpus
+
+RESULTS_DIR = Path(__file__).parent / "results"
+RESULTS_FORMAT_VERSION = 1
+STAGES = ["clean_text", "replace_terms", "clean_files", "replace_files"]
+
+
+def max_rss_mb(children: bool = False) -> Optional[float]:
+    """Пиковый RSS текущего процесса (или самого большого из дочерних) в МБ (None, если недоступно)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux - в килобайтах
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def read_file(path: Path) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def bench_clean_text(html_dir: Path, _work_dir: Path, _workers: int) -> float:
+    """Время clean_text() по всем документам; файлы читаются вне замера."""
+    cleaner = importlib.import_module("02_clean_texts")
+    elapsed = 0.0
+    for html_file in sorted(html_dir.iterdir()):
+        html_content = read_file(html_file)
+        start = time.perf_counter()
+        cleaner.clean_text(html_content)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def bench_replace_terms(text_dir: Path, _work_dir: Path, _workers: int) -> float:
+    """Время replace_terms_in_text() по всем документам; файлы читаются вне замера."""
+    replacer = importlib.import_module("03_replace_terms")
+    term_replacer = replacer.load_replacer(TASK2_DIR / replacer.TERMS_MAP_FILE)
+    elapsed = 0.0
+    for txt_file in sorted(text_dir.iterdir()):
+        text = read_file(txt_file)
+        start = time.perf_counter()
+        replacer.replace_terms_in_text(text, term_replacer)
+        elapsed += time.perf_counter() - start
+    return elapsed
+
+
+def bench_clean_files(html_dir: Path, work_dir: Path, workers: int) -> float:
+    """Время цикла скрипта 02: чтение, очистка и запись всех файлов."""
+    cleaner = importlib.import_module("02_clean_texts")
+    output_dir = str(work_dir / "cleaned_texts")
+
+    start = time.perf_counter()
+    html_files = [entry.name for entry in os.scandir(html_dir) if entry.name.endswith(".html")]
+    for html_file, text, error in cleaner.clean_html_files(html_files, workers=workers, input_dir=str(html_dir)):
+        if error is None and text:
+            cleaner.save_cleaned_text(html_file, text, output_dir)
+    return time.perf_counter() - start
+
+
+def bench_replace_files(text_dir: Path, work_dir: Path, workers: int) -> float:
+    """Время цикла скрипта 03: чтение, замена терминов и запись всех файлов."""
+    replacer = importlib.import_module("03_replace_terms")
+    output_dir = str(work_dir / "knowledge_base")
+    terms_map_file = str(TASK2_DIR / replacer.TERMS_MAP_FILE)
+    # Словарь компилируется заранее, как в main() скрипта
+    replacer.load_replacer(terms_map_file)
+
+    start = time.perf_counter()
+    txt_files = [entry.name for entry in os.scandir(text_dir) if entry.name.endswith(".txt")]
+    for txt_file, text, error in replacer.replace_text_files(txt_files, workers, terms_map_file, str(text_dir)):
+        if error is None and text:
+            replacer.save_replaced_text(txt_file, text, output_dir)
+    return time.perf_counter() - start
+
+
+BENCHMARKS = {
+    "clean_text": (bench_clean_text, "html"),
+    "replace_terms": (bench_replace_terms, "text"),
+    "clean_files": (bench_clean_files, "html"),
+    "replace_files": (bench_replace_files, "text"),
+}
+
+
+def measure(stage: str, input_dir: str, work_dir: str, workers: int) -> Dict:
+    """Выполняет один замер (вызывается в отдельном процессе)."""
+    func, _ = BENCHMARKS[stage]
+    rss_before = max_rss_mb()
+    seconds = func(Path(input_dir), Path(work_dir), workers)
+    rss_after = max_rss_mb()
+    return {
+        "seconds": seconds,
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": None if rss_before is None else rss_after - rss_before,
+        "peak_rss_children_mb": max_rss_mb(children=True),
+    }
+
+
+def run_stage(stage: str, docs: int, input_dir: Path, work_dir: Path, workers: int) -> Dict:
+    """Запускает замер в новом процессе (spawn) и дополняет его пропускной способностью."""
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(parents=True)
+
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        result = executor.submit(measure, stage, str(input_dir), str(work_dir), workers).result()
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    input_mb = corpus_size_mb(input_dir)
+    seconds = result["seconds"]
+    return {
+        "stage": stage,
+        "docs": docs,
+        "workers": workers,
+        "input_mb": input_mb,
+        "seconds": seconds,
+        "docs_per_second": docs / seconds if seconds else 0.0,
+        "mb_per_second": input_mb / seconds if seconds else 0.0,
+        "peak_rss_mb": result["peak_rss_mb"],
+        "rss_growth_mb": result["rss_growth_mb"],
+        "peak_rss_children_mb": result["peak_rss_children_mb"],
+    }
+
+
+def result_key(result: Dict) -> tuple:
+    return result["stage"], result["docs"], result["workers"]
+
+
+def load_results(path: Path) -> Dict[tuple, Dict]:
+    """Загружает прошлые результаты для сравнения."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {result_key(result): result for result in data["results"]}
+
+
+def format_change(current: float, previous: Optional[float]) -> str:
+    if not previous:
+        return "-"
+    return f"{(current - previous) / previous:+.0%}"
+
+
+def print_results(results: List[Dict], baseline: Optional[Dict[tuple, Dict]] = None):
+    """Выводит таблицу результатов (и изменение относительно базового запуска)."""
+    header = (f"{'Этап':<15}{'Док':>7}{'Вход, МБ':>10}{'Время, с':>10}"
+              f"{'Док/с':>10}{'МБ/с':>8}{'RSS, МБ':>9}{'RSS пула, МБ':>14}")
+    if baseline is not None:
+        header += f"{'Δ Док/с':>10}{'Δ RSS':>8}"
+    print(header)
+
+    for r in results:
+        rss = "н/д" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f}"
+        # В замерах без пула процессов (и в результатах до появления поля) дочерних процессов нет
+        children_rss = "-" if not r.get("peak_rss_children_mb") else f"{r['peak_rss_children_mb']:.0f}"
+        line = (f"{r['stage']:<15}{r['docs']:>7}{r['input_mb']:>10.1f}{r['seconds']:>10.2f}"
+                f"{r['docs_per_second']:>10.0f}{r['mb_per_second']:>8.1f}{rss:>9}{children_rss:>14}")
+        if baseline is not None:
+            previous = baseline.get(result_key(r), {})
+            line += (f"{format_change(r['docs_per_second'], previous.get('docs_per_second')):>10}"
+                     f"{format_change(r['peak_rss_mb'] or 0, previous.get('peak_rss_mb')):>8}")
+        print(line)
+
+
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов Task2 на синтетическом корпусе")
+    parser.add_argument("--sizes", default="40,1000,20000", help="Размеры корпуса через запятую")
+    parser.add_argument("--stages", default=",".join(STAGES),
+                        help=f"Этапы через запятую (по умолчанию все: {', '.join(STAGES)})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Процессов для циклов clean_files и replace_files (по умолчанию 1)")
+    parser.add_argument("--paragraphs", type=int, default=DEFAULT_PARAGRAPHS, help="Абзацев в документе")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--corpus-dir", default=str(DEFAULT_CORPUS_DIR), help="Папка для синтетических корпусов")
+    parser.add_argument("--output", help="Файл результатов (по умолчанию benchmarks/results/suite_<время>.json)")
+    parser.add_argument("--compare", help="Файл прошлых результатов для сравнения")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    stages = [stage for stage in args.stages.split(",") if stage]
+    unknown = [stage for stage in stages if stage not in BENCHMARKS]
+    if unknown:
+        print(f"Ошибка: неизвестные этапы: {', '.join(unknown)}")
+        sys.exit(1)
+
+    baseline = load_results(Path(args.compare)) if args.compare else None
+
+    print("=" * 60)
+    print("Бенчмарк этапов Task2")
+    print("=" * 60)
+
+    results = []
+    corpus_dir = Path(args.corpus_dir)
+    for docs in sizes:
+        print(f"Корпус: {docs} документов...")
+        html_dir, text_dir = generate_corpus(docs, corpus_dir, args.seed, args.paragraphs)
+        for stage in stages:
+            input_dir = html_dir if BENCHMARKS[stage][1] == "html" else text_dir
+            work_dir = corpus_dir / "work"
+            results.append(run_stage(stage, docs, input_dir, work_dir, args.workers))
+            print(f"  ✓ {stage}: {results[-1]['seconds']:.2f} с")
+    print()
+
+    print_results(results, baseline)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"suite_{datetime.now():%Y%m%d_%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": args.seed,
+        "paragraphs": args.paragraphs,
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    print(f"\n✓ Результаты сохранены: {output}")
+
+
+if __name__ == "__main__":
+    main()
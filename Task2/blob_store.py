@@ -0,0 +1,269 @@
+"""
+Хранилище скачанных страниц с адресацией по содержимому.
+
+Каждая уникальная страница хранится один раз в сжатом виде в
+raw_store/blobs/<первые 2 символа хеша>/<SHA-256>.<gz|zst>, а индекс SQLite
+(raw_store/index.sqlite) связывает название страницы с хешем содержимого
+и временем скачивания. Одинаковые страницы (например, перенаправления)
+занимают место один раз. Страницы читаются потоково через распаковщик,
+без загрузки сжатого и распакованного текста в память целиком.
+
+Когда страница меняется, индекс указывает на новый блоб, а старый остается
+на диске; gc() удаляет блобы, на которые индекс не ссылается. Загрузчик
+(01_download_pages.py) и конвейер (main.py --debug) вызывают его после скачивания.
+
+Использование:
+    python blob_store.py --import raw_html    # перенести raw_html/ в хранилище
+    python blob_store.py --gc                 # удалить старые версии страниц
+    python blob_store.py                      # статистика хранилища
+"""
+
+import os
+import io
+import gzip
+import sqlite3
+import hashlib
+import tempfile
+import argparse
+import time
+import threading
+from datetime import datetime
+from typing import BinaryIO, Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd необязателен, без него используется gzip
+    zstandard = None
+
+STORE_DIR = "raw_store"
+INDEX_FILE = "index.sqlite"
+GZIP = "gzip"
+ZSTD = "zstd"
+DEFAULT_CODEC = ZSTD if zstandard is not None else GZIP
+CODEC_EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+# Блобы моложе этого возраста gc() не трогает: put() в другом потоке или процессе
+# мог записать блоб и еще не успеть добавить его в индекс
+GC_MIN_AGE_SECONDS = 600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    name TEXT PRIMARY KEY,
+    blob TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    fetched_at TEXT NOT NULL
+)
+"""
+
+
+def store_exists(root: str = STORE_DIR) -> bool:
+    """Проверяет, создано ли хранилище (есть индекс)."""
+    return os.path.exists(os.path.join(root, INDEX_FILE))
+
+
+def default_raw_format(html_dir: str, root: str = STORE_DIR) -> str:
+    """
+    Формат сырых страниц по умолчанию: хранилище ("store"), если оно уже
+    создано или папки html_dir нет, иначе файлы в html_dir ("html") - например,
+    raw_html/ из репозитория, который еще не перенесен в хранилище.
+    """
+    if store_exists(root) or not os.path.exists(html_dir):
+        return "store"
+    return "html"
+
+
+class BlobStore:
+    """Сжатое хранилище страниц с индексом {страница: хеш содержимого}."""
+
+    def __init__(self, root: str = STORE_DIR, codec: str = DEFAULT_CODEC):
+        if codec == ZSTD and zstandard is None:
+            raise ValueError("Для сжатия zstd установите пакет zstandard")
+        self.root = root
+        self.codec = codec
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(root, INDEX_FILE), check_same_thread=False)
+        self._connection.execute(SCHEMA)
+        self._connection.commit()
+        self._lock = threading.Lock()
+
+    def blob_path(self, blob_hash: str, codec: str) -> str:
+        """Путь к файлу блоба."""
+        return os.path.join(self.root, "blobs", blob_hash[:2], blob_hash + CODEC_EXTENSIONS[codec])
+
+    def _entry(self, page_name: str) -> Optional[tuple]:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT blob, codec, size, stored_size, fetched_at FROM pages WHERE name = ?", (page_name,)
+            ).fetchone()
+
+    def put(self, page_name: str, html_content: str) -> str:
+        """
+        Сохраняет страницу. Если такое содержимое уже есть, блоб не записывается повторно.
+
+        Returns:
+            SHA-256 содержимого
+        """
+        data = html_content.encode("utf-8")
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(blob_hash, self.codec)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = self._compress(data)
+            # Запись через временный файл: прерванная запись не оставит битый блоб.
+            # Имя файла уникально, чтобы одновременные put() одной страницы
+            # (потоки или процессы) не писали в один и тот же файл
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (name, blob, codec, size, stored_size, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (page_name, blob_hash, self.codec, len(data), os.path.getsize(path), datetime.now().isoformat())
+            )
+            self._connection.commit()
+        return blob_hash
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.codec == ZSTD:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+        # mtime=0: одинаковое содержимое дает одинаковый файл
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+    def path(self, page_name: str) -> Optional[str]:
+        """Путь к блобу страницы или None, если страницы нет в хранилище."""
+        entry = self._entry(page_name)
+        if entry is None:
+            return None
+        path = self.blob_path(entry[0], entry[1])
+        return path if os.path.exists(path) else None
+
+    def digest(self, page_name: str) -> Optional[str]:
+        """SHA-256 содержимого страницы (как fetch_state.content_hash) или None, если страницы нет."""
+        entry = self._entry(page_name)
+        return entry[0] if entry is not None else None
+
+    def has(self, page_name: str) -> bool:
+        return self.path(page_name) is not None
+
+    def open(self, page_name: str) -> BinaryIO:
+        """Открывает страницу как поток распакованных байтов (UTF-8)."""
+        entry = self._entry(page_name)
+        if entry is None:
+            raise KeyError(page_name)
+        blob_file = open(self.blob_path(entry[0], entry[1]), "rb")
+        if entry[1] == ZSTD:
+            return zstandard.ZstdDecompressor().stream_reader(blob_file, closefd=True)
+        return gzip.GzipFile(fileobj=blob_file, mode="rb")
+
+    def read(self, page_name: str) -> str:
+        """Читает страницу целиком."""
+        with self.open(page_name) as stream:
+            return io.TextIOWrapper(stream, encoding="utf-8").read()
+
+    def pages(self) -> List[str]:
+        """Названия всех страниц хранилища."""
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT name FROM pages ORDER BY name")]
+
+    def stats(self) -> Dict:
+        """Статистика: страницы, уникальные блобы, исходный и сжатый объем."""
+        with self._lock:
+            pages, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+            blobs, stored_size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(stored_size), 0) FROM "
+                "(SELECT DISTINCT blob, codec, stored_size FROM pages)"
+            ).fetchone()
+        return {"pages": pages, "blobs": blobs, "size": size, "stored_size": stored_size}
+
+    def gc(self, min_age: float = GC_MIN_AGE_SECONDS) -> Dict:
+        """
+        Удаляет блобы, на которые не ссылается индекс (старые версии страниц),
+        и временные файлы прерванных записей.
+
+        Returns:
+            Словарь {"blobs": удалено файлов, "bytes": освобождено байт}
+        """
+        with self._lock:
+            referenced = {
+                self.blob_path(blob_hash, codec)
+                for blob_hash, codec in self._connection.execute("SELECT DISTINCT blob, codec FROM pages")
+            }
+
+        removed = 0
+        freed = 0
+        cutoff = time.time() - min_age
+        blobs_dir = os.path.join(self.root, "blobs")
+        for subdir in os.listdir(blobs_dir):
+            subdir_path = os.path.join(blobs_dir, subdir)
+            if not os.path.isdir(subdir_path):
+                continue
+            for name in os.listdir(subdir_path):
+                path = os.path.join(subdir_path, name)
+                if path in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+            if not os.listdir(subdir_path):
+                os.rmdir(subdir_path)
+        return {"blobs": removed, "bytes": freed}
+
+    def close(self):
+        self._connection.close()
+
+
+def import_directory(store: BlobStore, html_dir: str) -> int:
+    """Переносит HTML-файлы из папки (например, raw_html/) в хранилище."""
+    imported = 0
+    for html_file in sorted(os.listdir(html_dir)):
+        if html_file.endswith(".html"):
+            with open(os.path.join(html_dir, html_file), "r", encoding="utf-8") as f:
+                store.put(html_file[:-len(".html")], f.read())
+            imported += 1
+    return imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранилище скачанных страниц")
+    parser.add_argument("--store-dir", default=STORE_DIR, help=f"Папка хранилища (по умолчанию {STORE_DIR})")
+    parser.add_argument("--codec", choices=[GZIP, ZSTD], default=DEFAULT_CODEC,
+                        help=f"Сжатие новых блобов (по умолчанию {DEFAULT_CODEC})")
+    parser.add_argument("--import", dest="import_dir", help="Импортировать HTML-файлы из папки")
+    parser.add_argument("--gc", action="store_true",
+                        help="Удалить блобы, на которые не ссылается индекс (старые версии страниц)")
+    args = parser.parse_args()
+
+    store = BlobStore(args.store_dir, args.codec)
+    if args.import_dir:
+        print(f"✓ Импортировано страниц: {import_directory(store, args.import_dir)}")
+    if args.gc:
+        removed = store.gc()
+        print(f"✓ Удалено блобов: {removed['blobs']} ({removed['bytes'] / (1024 * 1024):.1f} МБ)")
+
+    stats = store.stats()
+    mb = 1024 * 1024
+    print(f"Страниц: {stats['pages']}, уникальных блобов: {stats['blobs']}")
+    print(f"Объем HTML: {stats['size'] / mb:.1f} МБ, на диске: {stats['stored_size'] / mb:.1f} МБ")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
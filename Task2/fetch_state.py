@@ -0,0 +1,105 @@
+"""
+Хранилище метаданных скачивания страниц (ETag, Last-Modified, хеш содержимого).
+Позволяет отправлять условные запросы и не скачивать заново страницы,
+которые не изменились с прошлого запуска.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime
+from typing import Dict, Optional
+
+FETCH_STATE_FILE = "fetch_state.json"
+
+# Статусы страницы после последнего запуска скачивания
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+def load_fetch_state(path: str = FETCH_STATE_FILE) -> Dict:
+    """Загружает метаданные скачивания из JSON-файла."""
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ошибка при загрузке {path}: {e}. Создаю новое состояние.")
+    return {
+        "last_run": None,
+        "pages": {}  # {page_name: {"etag", "last_modified", "sha256", "status", "checked_at"}}
+    }
+
+
+def save_fetch_state(state: Dict, path: str = FETCH_STATE_FILE):
+    """Сохраняет метаданные скачивания в JSON-файл."""
+    state["last_run"] = datetime.now().isoformat()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+
+
+def content_hash(text: str) -> str:
+    """Вычисляет SHA-256 хеш содержимого страницы."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def conditional_headers(state: Dict, page_name: str) -> Dict[str, str]:
+    """Возвращает заголовки If-None-Match / If-Modified-Since для страницы."""
+    entry = state["pages"].get(page_name, {})
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def record_fetch(
+    state: Dict,
+    page_name: str,
+    status_code: Optional[int],
+    html_content: Optional[str] = None,
+    headers: Optional[Dict] = None
+) -> str:
+    """
+    Записывает результат запроса страницы и определяет, изменилась ли она.
+
+    Args:
+        state: Состояние скачивания
+        page_name: Название страницы
+        status_code: HTTP-код ответа (None, если запрос не удался)
+        html_content: Тело ответа для кода 200
+        headers: Заголовки ответа
+
+    Returns:
+        CHANGED, UNCHANGED или FAILED
+    """
+    entry = state["pages"].setdefault(page_name, {})
+    entry["checked_at"] = datetime.now().isoformat()
+    headers = headers or {}
+
+    if status_code == 304:
+        status = UNCHANGED
+    elif status_code == 200 and html_content is not None:
+        new_hash = content_hash(html_content)
+        status = UNCHANGED if entry.get("sha256") == new_hash else CHANGED
+        entry["sha256"] = new_hash
+    else:
+        # Ошибка: прошлые метаданные не трогаем, чтобы не потерять валидаторы
+        entry["status"] = FAILED
+        return FAILED
+
+    if headers.get("ETag"):
+        entry["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        entry["last_modified"] = headers["Last-Modified"]
+
+    entry["status"] = status
+    return status
+
+
+def forget_page(state: Dict, page_name: str):
+    """Удаляет метаданные страницы (например, если её файл пропал с диска)."""
+    state["pages"].pop(page_name, None)
+
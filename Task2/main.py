@@ -3,56 +3,171 @@
 1. Скачивание HTML-страниц
 2. Очистка текстов
 3. Замена терминов
+
+Этапы работают одновременно как потоковый конвейер: страница проходит
+очистку, замену и запись, пока остальные страницы еще скачиваются.
+Манифест этапов позволяет заново обрабатывать только изменившиеся документы.
 """
 
 import os
 import sys
+import shutil
+import argparse
+from functools import partial
 
-def run_script(script_name: str):
-    """Запускает Python-скрипт и обрабатывает ошибки."""
-    print(f"\n{'='*60}")
-    print(f"Запуск: {script_name}")
-    print(f"{'='*60}\n")
-    
-    try:
-        with open(script_name, "r", encoding="utf-8") as f:
-            code = f.read()
-        exec(compile(code, script_name, "exec"), {"__name__": "__main__"})
-        return True
-    except Exception as e:
-        print(f"\n✗ Ошибка при выполнении {script_name}: {e}")
-        return False
+from tqdm import tqdm
 
+from blob_store import STORE_DIR, BlobStore, default_raw_format
+from fetch_state import load_fetch_state, save_fetch_state
+from manifest import Manifest, terms_map_key
+from pipeline import Pipeline, Stage, QUEUE_SIZE, format_stats
+from stages import (
+    downloader,
+    cleaner,
+    replacer,
+    DownloadStage,
+    ManifestRecorder,
+    save_raw_html,
+    clean_stage,
+    init_replace_worker,
+    replace_stage,
+    write_stage,
+)
 
-def main():
-    """Запускает все этапы обработки последовательно."""
-    scripts = [
-        "01_download_pages.py",
-        "02_clean_texts.py",
-        "03_replace_terms.py"
+
+def parse_args():
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Создание базы знаний для RAG")
+    parser.add_argument("--download-concurrency", type=int, default=downloader.CONCURRENCY,
+                        help=f"Одновременных запросов к вики (по умолчанию {downloader.CONCURRENCY})")
+    parser.add_argument("--rate", type=float, default=downloader.RATE_PER_HOST,
+                        help=f"Максимум запросов в секунду (по умолчанию {downloader.RATE_PER_HOST})")
+    parser.add_argument("--clean-workers", type=int, default=os.cpu_count() or 1,
+                        help="Процессов для очистки HTML (по умолчанию число ядер)")
+    parser.add_argument("--replace-workers", type=int, default=1,
+                        help="Процессов для замены терминов (по умолчанию 1 - в основном процессе)")
+    parser.add_argument("--write-concurrency", type=int, default=2,
+                        help="Потоков для записи документов (по умолчанию 2)")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE,
+                        help=f"Размер очереди между этапами (по умолчанию {QUEUE_SIZE})")
+    parser.add_argument("--base-url", default=downloader.BASE_URL, help="Базовый URL вики")
+    parser.add_argument("--force", action="store_true",
+                        help="Обработать все страницы, даже если они не изменились")
+    parser.add_argument("--debug", action="store_true",
+                        help=f"Сохранять скачанный HTML (см. --raw-format) и очищенные тексты "
+                             f"в {cleaner.OUTPUT_DIR}/")
+    parser.add_argument("--raw-format", choices=downloader.RAW_FORMATS, default=None,
+                        help=f"Куда сохранять HTML в отладочном режиме: сжатое хранилище {STORE_DIR}/ "
+                             f"или файлы в {downloader.OUTPUT_DIR}/ (по умолчанию {STORE_DIR}/, если оно "
+                             f"создано или нет {downloader.OUTPUT_DIR}/, иначе {downloader.OUTPUT_DIR}/)")
+    return parser.parse_args()
+
+
+def build_pipeline(args, fetch_state, manifest: Manifest, raw_store=None) -> Pipeline:
+    """Собирает конвейер скачивание -> очистка -> замена -> запись."""
+    terms_key = terms_map_key(replacer.TERMS_MAP_FILE)
+    recorder = ManifestRecorder(manifest, terms_key, keep_cleaned=args.debug)
+    download = DownloadStage(
+        fetch_state,
+        rate=args.rate,
+        base_url=args.base_url,
+        manifest=manifest,
+        terms_key=terms_key,
+        reuse_unchanged=not args.force,
+        keep_raw_html=args.debug,
+        raw_store=raw_store,
+        keep_cleaned=args.debug
+    )
+
+    stages = [
+        Stage("download", download, concurrency=args.download_concurrency,
+              on_result=partial(save_raw_html, store=raw_store) if args.debug else None),
+        Stage("clean", clean_stage, concurrency=args.clean_workers,
+              use_processes=args.clean_workers > 1,
+              on_result=recorder.cleaned),
+        Stage("replace", replace_stage, concurrency=args.replace_workers,
+              use_processes=args.replace_workers > 1,
+              initializer=init_replace_worker, initargs=(replacer.TERMS_MAP_FILE,)),
+        Stage("write", write_stage, concurrency=args.write_concurrency,
+              on_result=recorder.written),
     ]
+    return Pipeline(stages, queue_size=args.queue_size)
+
+
+def main():
+    """Запускает все этапы обработки потоковым конвейером."""
+    args = parse_args()
     
     print("="*60)
     print("Создание базы знаний для RAG")
     print("="*60)
     
-    for script in scripts:
-        if not os.path.exists(script):
-            print(f"\n✗ Файл {script} не найден!")
-            sys.exit(1)
-        
-        success = run_script(script)
-        if not success:
-            print(f"\n✗ Процесс остановлен из-за ошибки в {script}")
-            sys.exit(1)
+    if not os.path.exists(replacer.TERMS_MAP_FILE):
+        print(f"\n✗ Файл {replacer.TERMS_MAP_FILE} не найден!")
+        sys.exit(1)
+    
+    # Компилируем словарь заранее, чтобы процессы замены загрузили готовый
+    replacer.load_replacer(replacer.TERMS_MAP_FILE)
+    
+    fetch_state = load_fetch_state()
+    if args.force:
+        fetch_state["pages"] = {}
+    
+    manifest = Manifest()
+    raw_format = args.raw_format or default_raw_format(downloader.OUTPUT_DIR)
+    raw_store = BlobStore() if args.debug and raw_format == "store" else None
+    pipeline = build_pipeline(args, fetch_state, manifest, raw_store)
+    download_stage = pipeline.stages[0].func
+    
+    print(f"Страниц: {len(downloader.PAGES)}")
+    if args.debug:
+        raw_dir = raw_store.root if raw_store is not None else downloader.OUTPUT_DIR
+        print(f"Отладочный режим: скачанный HTML сохраняется в {raw_dir}/, "
+              f"очищенные тексты - в {cleaner.OUTPUT_DIR}/")
+    print()
+    
+    written = 0
+    try:
+        source = ((page_name, None) for page_name in downloader.PAGES)
+        for _ in tqdm(pipeline.run(source), total=len(downloader.PAGES), desc="Документы"):
+            written += 1
+        if raw_store is not None:
+            # Старые версии изменившихся страниц больше не нужны
+            raw_store.gc()
+    finally:
+        save_fetch_state(fetch_state)
+        manifest.save()
+        if raw_store is not None:
+            raw_store.close()
+    
+    # Копируем terms_map.json в knowledge_base
+    os.makedirs(replacer.OUTPUT_DIR, exist_ok=True)
+    shutil.copy(replacer.TERMS_MAP_FILE, os.path.join(replacer.OUTPUT_DIR, replacer.TERMS_MAP_FILE))
+    
+    print()
+    print(format_stats(pipeline.stats))
+    
+    errors = [error for stage in pipeline.stats for error in stage.errors]
+    print(f"\n✓ Записано документов: {written}/{len(downloader.PAGES)}")
+    if download_stage.unchanged:
+        print(f"  Пропущено без изменений: {download_stage.unchanged}")
+    if download_stage.reused_cleaned:
+        print(f"  Только замена терминов (очищенный текст актуален): {download_stage.reused_cleaned}")
+    if errors:
+        print(f"✗ Ошибок: {len(errors)}")
+        for error in errors:
+            print(f"  - {error}")
+    
+    if errors and written == 0:
+        print("\n✗ Не удалось создать ни одного документа")
+        sys.exit(1)
     
     print("\n" + "="*60)
-    print("✓ Все этапы выполнены успешно!")
+    print("⚠ Конвейер завершен с ошибками" if errors else "✓ Все этапы выполнены успешно!")
     print("="*60)
-    print(f"\nРезультаты сохранены в папку: knowledge_base/")
-    print(f"Словарь замен: knowledge_base/terms_map.json")
+    print(f"\nРезультаты сохранены в папку: {replacer.OUTPUT_DIR}/")
+    print(f"Словарь замен: {replacer.OUTPUT_DIR}/{replacer.TERMS_MAP_FILE}")
 
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,88 @@
+"""
+Манифест этапов конвейера: для каждого этапа и документа хранит ключ входа
+(хеши входных данных и версий кода) и хеш результата.
+Как make, позволяет пересобирать только документы с устаревшими результатами.
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from fetch_state import content_hash
+from term_replacer import COMPILED_FORMAT_VERSION, file_sha256
+
+MANIFEST_FILE = "pipeline_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def stage_key(*parts: str) -> str:
+    """Собирает ключ входа этапа из хешей входных данных и версий кода."""
+    return ":".join(parts)
+
+
+def terms_map_key(terms_map_file: str) -> str:
+    """Версия словаря замен для манифеста: хеш terms_map.json и версия алгоритма замены."""
+    return stage_key(file_sha256(terms_map_file), f"v{COMPILED_FORMAT_VERSION}")
+
+
+class Manifest:
+    """
+    Манифест вида {этап: {документ: {"input": ключ входа, "output": хеш результата}}}.
+    Методы потокобезопасны, поэтому манифест можно обновлять из обработчиков этапов.
+    """
+
+    def __init__(self, path: str = MANIFEST_FILE):
+        self.path = path
+        self.stages: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.stages = data.get("stages", {})
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Ошибка при загрузке {path}: {e}. Создаю новый манифест.")
+
+    def get(self, stage: str, doc: str) -> Optional[Dict]:
+        """Возвращает запись этапа для документа."""
+        with self._lock:
+            return self.stages.get(stage, {}).get(doc)
+
+    def is_current(self, stage: str, doc: str, input_key: str, output_path: Optional[str]) -> bool:
+        """
+        Проверяет, что результат этапа актуален: ключ входа не изменился,
+        а файл результата существует и совпадает с записанным хешем.
+        Для несохраняемого результата (output_path=None) проверяется только ключ входа.
+        """
+        entry = self.get(stage, doc)
+        if entry is None or entry.get("input") != input_key:
+            return False
+        if output_path is None:
+            return True
+        if not os.path.exists(output_path):
+            return False
+
+        with open(output_path, "r", encoding="utf-8") as f:
+            return content_hash(f.read()) == entry.get("output")
+
+    def record(self, stage: str, doc: str, input_key: str, output_text: str) -> str:
+        """Записывает результат этапа для документа и возвращает его хеш."""
+        output_hash = content_hash(output_text)
+        with self._lock:
+            self.stages.setdefault(stage, {})[doc] = {
+                "input": input_key,
+                "output": output_hash,
+                "built_at": datetime.now().isoformat(),
+            }
+        return output_hash
+
+    def save(self):
+        """Сохраняет манифест в JSON-файл."""
+        with self._lock:
+            data = {"version": MANIFEST_VERSION, "stages": self.stages}
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,194 @@
+"""
+Клиент MediaWiki API для пакетного скачивания статей.
+
+Вместо отрисованной страницы целиком (с навигацией, скриптами и стилями,
+которые очистка все равно выбрасывает) используются два метода API:
+- action=query: текущие ревизии до TITLES_PER_REQUEST страниц за один запрос
+  (по ним определяется, какие страницы изменились) и викитекст статей
+  тоже пачками по названиям или номерам ревизий; викитекст преобразуется
+  в HTML локально (wikitext.py);
+- action=parse: HTML тела статьи (div.mw-parser-output) одной ревизии - если
+  викитекст не получен или нужен HTML с раскрытыми шаблонами.
+"""
+
+import html
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+import wikitext
+
+API_URL = "https://starwars.fandom.com/api.php"
+TITLES_PER_REQUEST = 50  # Максимум titles в одном запросе для обычных клиентов
+TIMEOUT = 30  # Таймаут запроса в секундах
+WIKITEXT_MODEL = "wikitext"
+
+
+class MediaWikiApiError(Exception):
+    """Ошибка, которую вернул MediaWiki API (поле error в ответе)."""
+
+
+def page_title(page_name: str) -> str:
+    """Название страницы в API: пробелы вместо подчеркиваний."""
+    return page_name.replace("_", " ")
+
+
+def api_get(session: requests.Session, api_url: str, params: Dict, limiter=None) -> Dict:
+    """Выполняет GET-запрос к API и возвращает разобранный JSON."""
+    if limiter is not None:
+        limiter.acquire()
+    response = session.get(api_url, params={**params, "format": "json", "formatversion": "2"}, timeout=TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise MediaWikiApiError(f"{data['error'].get('code')}: {data['error'].get('info')}")
+    return data
+
+
+def resolve_titles(titles: Iterable[str], query: Dict) -> Dict[str, str]:
+    """
+    Сопоставляет запрошенные названия с итоговыми с учетом
+    нормализации (регистр первой буквы, подчеркивания) и перенаправлений.
+    """
+    renames = {item["from"]: item["to"] for item in query.get("normalized", [])}
+    redirects = {item["from"]: item["to"] for item in query.get("redirects", [])}
+    resolved = {}
+    for title in titles:
+        target = renames.get(title, title)
+        seen = set()
+        while target in redirects and target not in seen:
+            seen.add(target)
+            target = redirects[target]
+        resolved[title] = target
+    return resolved
+
+
+def revision_content(revision: Dict) -> Optional[str]:
+    """Викитекст основного слота ревизии или None (скрыт, не получен или не викитекст)."""
+    main = revision.get("slots", {}).get("main", {})
+    if main.get("contentmodel", WIKITEXT_MODEL) != WIKITEXT_MODEL or main.get("texthidden"):
+        return None
+    return main.get("content")
+
+
+def query_pages(session: requests.Session, params: Dict, api_url: str = API_URL, limiter=None) -> Dict:
+    """
+    Выполняет action=query с prop=revisions и продолжениями (continue), которые API
+    возвращает, если викитекст пачки не поместился в один ответ.
+
+    Returns:
+        Ответ query, в котором у каждой страницы собраны ревизии из всех продолжений
+    """
+    params = {"action": "query", "prop": "revisions", **params}
+    pages = {}
+    result = {}
+    while True:
+        data = api_get(session, api_url, params, limiter)
+        query = data.get("query", {})
+        for key in ("normalized", "redirects"):
+            result.setdefault(key, []).extend(query.get(key, []))
+        for page in query.get("pages", []):
+            known = pages.setdefault(page["title"], page)
+            if known is not page:
+                revisions = known.setdefault("revisions", [])
+                seen = {revision["revid"] for revision in revisions}
+                revisions.extend(revision for revision in page.get("revisions", [])
+                                 if revision["revid"] not in seen)
+        if "continue" not in data:
+            break
+        params = {**params, **data["continue"]}
+    result["pages"] = list(pages.values())
+    return result
+
+
+def query_revisions(
+    session: requests.Session,
+    page_names: List[str],
+    api_url: str = API_URL,
+    limiter=None,
+    content: bool = False
+) -> Dict[str, Optional[Dict]]:
+    """
+    Запрашивает текущие ревизии страниц пачками по TITLES_PER_REQUEST.
+    С content=True в тех же запросах приходит и викитекст статей.
+
+    Returns:
+        Словарь {название страницы: {"revid", "title", "content"} или None, если страницы нет};
+        content - викитекст или None (не запрашивался или недоступен)
+    """
+    rvprop = "ids|timestamp|content" if content else "ids|timestamp"
+    revisions = {}
+    for start in range(0, len(page_names), TITLES_PER_REQUEST):
+        batch = page_names[start:start + TITLES_PER_REQUEST]
+        titles = {page_title(page_name): page_name for page_name in batch}
+        params = {"rvprop": rvprop, "redirects": "1", "titles": "|".join(titles)}
+        if content:
+            params["rvslots"] = "main"
+        query = query_pages(session, params, api_url, limiter)
+
+        current = {
+            page["title"]: {
+                "revid": page["revisions"][0]["revid"],
+                "title": page["title"],
+                "content": revision_content(page["revisions"][0]),
+            }
+            for page in query["pages"]
+            if not page.get("missing") and page.get("revisions")
+        }
+        for title, target in resolve_titles(titles, query).items():
+            revisions[titles[title]] = current.get(target)
+    return revisions
+
+
+def query_contents(
+    session: requests.Session,
+    revids: List[int],
+    api_url: str = API_URL,
+    limiter=None
+) -> Dict[int, Dict]:
+    """
+    Запрашивает викитекст ревизий пачками по TITLES_PER_REQUEST номеров.
+
+    Returns:
+        Словарь {revid: {"revid", "title", "content"}}; content - викитекст или None
+    """
+    contents = {}
+    for start in range(0, len(revids), TITLES_PER_REQUEST):
+        batch = revids[start:start + TITLES_PER_REQUEST]
+        query = query_pages(session, {
+            "rvprop": "ids|content",
+            "rvslots": "main",
+            "revids": "|".join(str(revid) for revid in batch),
+        }, api_url, limiter)
+        for page in query["pages"]:
+            for revision in page.get("revisions", []):
+                contents[revision["revid"]] = {
+                    "revid": revision["revid"],
+                    "title": page["title"],
+                    "content": revision_content(revision),
+                }
+    return contents
+
+
+def article_html(title: str, body: str) -> str:
+    """Оборачивает тело статьи в HTML-документ, который понимает 02_clean_texts.py."""
+    return (f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title></head>"
+            f"<body>\n{body}\n</body></html>\n")
+
+
+def wikitext_article(title: str, content: str) -> Optional[str]:
+    """HTML статьи из викитекста или None, если в статье не осталось текста."""
+    body = wikitext.wikitext_to_html(content)
+    return article_html(title, body) if body else None
+
+
+def fetch_article(session: requests.Session, revid: int, api_url: str = API_URL, limiter=None) -> str:
+    """Скачивает HTML тела статьи для ревизии (без навигации и оформления вики)."""
+    parsed = api_get(session, api_url, {
+        "action": "parse",
+        "oldid": str(revid),
+        "prop": "text",
+        "disableeditsection": "1",
+        "disablelimitreport": "1",
+    }, limiter)["parse"]
+    return article_html(parsed["title"], parsed["text"])
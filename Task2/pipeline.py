@@ -0,0 +1,225 @@
+"""
+Потоковый конвейер обработки: этапы соединены ограниченными очередями,
+поэтому документ проходит все этапы, пока другие документы еще скачиваются.
+У каждого этапа своя степень параллелизма и свои счетчики пропускной способности.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Маркер конца потока данных
+_DONE = object()
+
+QUEUE_SIZE = 16  # Размер очереди между этапами по умолчанию
+
+
+class StageStats:
+    """Счетчики одного этапа конвейера."""
+
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.items_in = 0
+        self.items_out = 0
+        self.dropped = 0
+        self.errors: List[str] = []
+        self.bytes_out = 0
+        self.busy_seconds = 0.0
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def wall_seconds(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items_in / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def utilization(self) -> float:
+        """Доля времени, которую обработчики этапа были заняты работой."""
+        capacity = self.wall_seconds * self.concurrency
+        return self.busy_seconds / capacity if capacity else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "concurrency": self.concurrency,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "dropped": self.dropped,
+            "errors": len(self.errors),
+            "wall_seconds": self.wall_seconds,
+            "busy_seconds": self.busy_seconds,
+            "items_per_second": self.items_per_second,
+            "mb_out_per_second": self.bytes_out / (1024 * 1024) / self.wall_seconds if self.wall_seconds else 0.0,
+            "utilization": self.utilization,
+        }
+
+
+class Stage:
+    """
+    Этап конвейера.
+
+    Функция этапа получает (ключ, данные) и возвращает новые данные
+    или None, если документ дальше передавать не нужно; исключение
+    записывается в ошибки этапа и не останавливает конвейер.
+    Если use_processes=True, функция выполняется в пуле процессов
+    (для CPU-bound этапов) и должна быть доступна для pickle.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        concurrency: int = 1,
+        use_processes: bool = False,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+        on_result: Optional[Callable[[str, Any], None]] = None
+    ):
+        self.name = name
+        self.func = func
+        self.concurrency = max(1, concurrency)
+        self.use_processes = use_processes
+        self.initializer = initializer
+        self.initargs = initargs
+        self.on_result = on_result
+        self.stats = StageStats(name, self.concurrency)
+
+
+class Pipeline:
+    """Запускает этапы в отдельных потоках, соединяя их ограниченными очередями."""
+
+    def __init__(self, stages: List[Stage], queue_size: int = QUEUE_SIZE):
+        self.stages = stages
+        self.queue_size = queue_size
+
+    def _feed(self, source: Iterable[Tuple[str, Any]], out_queue: queue.Queue):
+        try:
+            for item in source:
+                out_queue.put(item)
+        finally:
+            out_queue.put(_DONE)
+
+    def _run_worker(self, stage: Stage, executor, in_queue: queue.Queue,
+                    out_queue: queue.Queue, active: List[int], lock: threading.Lock):
+        stats = stage.stats
+        while True:
+            item = in_queue.get()
+            if item is _DONE:
+                # Возвращаем маркер остальным обработчикам этапа;
+                # последний завершившийся передает его следующему этапу
+                in_queue.put(_DONE)
+                with lock:
+                    active[0] -= 1
+                    if active[0] == 0:
+                        stats.finished = time.perf_counter()
+                        out_queue.put(_DONE)
+                return
+
+            key, payload = item
+            with stats._lock:
+                if stats.started is None:
+                    stats.started = time.perf_counter()
+                stats.items_in += 1
+
+            start = time.perf_counter()
+            try:
+                if executor is not None:
+                    result = executor.submit(stage.func, key, payload).result()
+                else:
+                    result = stage.func(key, payload)
+                if result is not None and stage.on_result is not None:
+                    stage.on_result(key, result)
+            except Exception as e:
+                result = None
+                with stats._lock:
+                    stats.errors.append(f"{key}: {type(e).__name__}: {e}")
+            elapsed = time.perf_counter() - start
+
+            with stats._lock:
+                stats.busy_seconds += elapsed
+                if result is None:
+                    stats.dropped += 1
+                else:
+                    stats.items_out += 1
+                    if isinstance(result, (str, bytes)):
+                        stats.bytes_out += len(result)
+                    else:
+                        # Составные данные могут сообщать свой размер сами
+                        stats.bytes_out += getattr(result, "size", 0)
+
+            if result is not None:
+                out_queue.put((key, result))
+
+    def run(self, source: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        """
+        Пропускает элементы (ключ, данные) через все этапы.
+        Возвращает результаты последнего этапа по мере готовности.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        executors = []
+        threads = [threading.Thread(target=self._feed, args=(source, queues[0]), daemon=True)]
+
+        for index, stage in enumerate(self.stages):
+            executor = None
+            if stage.use_processes:
+                executor = ProcessPoolExecutor(
+                    max_workers=stage.concurrency,
+                    initializer=stage.initializer,
+                    initargs=stage.initargs
+                )
+                executors.append(executor)
+            elif stage.initializer is not None:
+                stage.initializer(*stage.initargs)
+
+            active = [stage.concurrency]
+            lock = threading.Lock()
+            for _ in range(stage.concurrency):
+                threads.append(threading.Thread(
+                    target=self._run_worker,
+                    args=(stage, executor, queues[index], queues[index + 1], active, lock),
+                    daemon=True
+                ))
+
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            for executor in executors:
+                executor.shutdown(cancel_futures=True)
+
+    @property
+    def stats(self) -> List[StageStats]:
+        return [stage.stats for stage in self.stages]
+
+
+def format_stats(stats: List[StageStats]) -> str:
+    """Форматирует счетчики этапов в виде таблицы."""
+    lines = [
+        f"{'Этап':<12}{'Потоки':>7}{'Вход':>7}{'Выход':>7}{'Ошибки':>8}"
+        f"{'Время, с':>10}{'Док/с':>8}{'МБ/с':>7}{'Загрузка':>10}"
+    ]
+    for s in stats:
+        d = s.to_dict()
+        lines.append(
+            f"{d['stage']:<12}{d['concurrency']:>7}{d['items_in']:>7}{d['items_out']:>7}"
+            f"{d['errors']:>8}{d['wall_seconds']:>10.2f}{d['items_per_second']:>8.1f}"
+            f"{d['mb_out_per_second']:>7.1f}{d['utilization']:>9.0%}"
+        )
+    return "\n".join(lines)
+
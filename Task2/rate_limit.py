@@ -0,0 +1,71 @@
+"""
+Ограничение частоты запросов к вики по алгоритму token bucket: общий для
+загрузчика (01_download_pages.py) и этапа скачивания потокового конвейера
+(stages.py). Потоки используют RateLimiter, асинхронный режим - AsyncRateLimiter;
+пополнение и списание токенов у них общее (TokenBucket).
+"""
+
+import time
+import asyncio
+import threading
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов по алгоритму token bucket (без блокировок).
+
+    Токены пополняются со скоростью `rate` в секунду, но не больше `capacity`.
+    Каждый запрос забирает один токен; если токенов нет, запрос ждет.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Забирает токен и возвращает 0 или, если токенов нет, сколько секунд ждать до следующего."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter(TokenBucket):
+    """Потокобезопасный token bucket: не больше `rate` запросов в секунду."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate, capacity)
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Ждет, пока не появится свободный токен, и забирает его."""
+        with self._lock:
+            while True:
+                delay = self.take()
+                if not delay:
+                    return
+                time.sleep(delay)
+
+
+class AsyncRateLimiter(TokenBucket):
+    """Token bucket для asyncio: ожидание не блокирует цикл событий."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        super().__init__(rate, capacity)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ждет, пока не появится свободный токен, и забирает его."""
+        async with self._lock:
+            while True:
+                delay = self.take()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
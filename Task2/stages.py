@@ -0,0 +1,245 @@
+"""
+Этапы потокового конвейера Task2: скачивание -> очистка -> замена терминов -> запись.
+Используют функции скриптов 01-03, поэтому результат совпадает с их последовательным запуском.
+
+Результаты этапов записываются в манифест (manifest.py), поэтому при повторном
+запуске заново обрабатываются только документы, у которых изменился HTML,
+версия очистки или словарь замен. Промежуточные raw_html/ и cleaned_texts/
+пишутся только в отладочном режиме (--debug в main.py).
+"""
+
+import os
+import importlib
+import threading
+from typing import Dict, Optional
+
+import requests
+
+from blob_store import BlobStore
+from fetch_state import FAILED, forget_page
+from manifest import Manifest, stage_key
+from rate_limit import RateLimiter
+
+downloader = importlib.import_module("01_download_pages")
+cleaner = importlib.import_module("02_clean_texts")
+replacer = importlib.import_module("03_replace_terms")
+
+MIN_TEXT_LENGTH = 100  # Минимальная длина текста документа (как в скриптах 02 и 03)
+
+
+def cleaned_path(page_name: str) -> str:
+    """Путь к очищенному тексту страницы (результат этапа очистки)."""
+    return os.path.join(cleaner.OUTPUT_DIR, f"{page_name}.txt")
+
+
+def knowledge_base_path(page_name: str) -> str:
+    """Путь к итоговому документу страницы (результат этапа замены)."""
+    return os.path.join(replacer.OUTPUT_DIR, f"{page_name}.txt")
+
+
+class Document:
+    """Документ, передаваемый между этапами конвейера."""
+
+    def __init__(
+        self,
+        html: Optional[str] = None,
+        html_hash: Optional[str] = None,
+        text: Optional[str] = None,
+        clean_hash: Optional[str] = None
+    ):
+        self.html = html
+        self.html_hash = html_hash
+        self.text = text
+        self.clean_hash = clean_hash
+
+    @property
+    def size(self) -> int:
+        """Размер текущего содержимого в символах (для счетчиков конвейера)."""
+        return len(self.text if self.text is not None else self.html or "")
+
+
+class DownloadStage:
+    """
+    Этап скачивания: условный запрос к вики с ограничением частоты.
+
+    Если результат очистки страницы актуален по манифесту, HTML дальше
+    не передается: при актуальном итоговом документе страница пропускается,
+    иначе (например, изменился словарь замен) в конвейер идет сохраненный
+    очищенный текст, и выполняется только этап замены. Без сохраненного
+    очищенного текста (keep_cleaned=False) страница скачивается и очищается заново.
+
+    Потоки этапа меняют общее состояние скачивания только под блокировкой.
+    """
+
+    def __init__(
+        self,
+        fetch_state: Dict,
+        rate: float,
+        base_url: str = downloader.BASE_URL,
+        manifest: Optional[Manifest] = None,
+        terms_key: str = "",
+        reuse_unchanged: bool = True,
+        keep_raw_html: bool = False,
+        raw_store: Optional[BlobStore] = None,
+        keep_cleaned: bool = False
+    ):
+        self.fetch_state = fetch_state
+        self.limiter = RateLimiter(rate)
+        self.base_url = base_url
+        self.manifest = manifest
+        self.terms_key = terms_key
+        self.reuse_unchanged = reuse_unchanged and manifest is not None
+        self.keep_raw_html = keep_raw_html
+        self.raw_store = raw_store
+        self.keep_cleaned = keep_cleaned
+        self.unchanged = 0
+        self.reused_cleaned = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        """Сессия requests для текущего потока (соединения переиспользуются)."""
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _fetch(self, page_name: str, cached_path: str):
+        self.limiter.acquire()
+        return downloader.fetch_page(
+            page_name, self.fetch_state, self.base_url, cached_path, self._session(),
+            state_lock=self._state_lock
+        )
+
+    def _html_hash(self, page_name: str) -> Optional[str]:
+        with self._state_lock:
+            return self.fetch_state["pages"].get(page_name, {}).get("sha256")
+
+    def _reuse(self, page_name: str, html_hash: Optional[str]):
+        """
+        Проверяет по манифесту сохраненные результаты страницы.
+
+        Returns:
+            None, если очищенный текст устарел; False, если актуален и итоговый
+            документ; иначе Document с сохраненным очищенным текстом
+        """
+        if not self.reuse_unchanged or not html_hash:
+            return None
+
+        clean_key = cleaner.clean_key(html_hash)
+        clean_output = cleaned_path(page_name) if self.keep_cleaned else None
+        if not self.manifest.is_current("clean", page_name, clean_key, clean_output):
+            return None
+
+        clean_hash = self.manifest.get("clean", page_name)["output"]
+        replace_key = stage_key(clean_hash, self.terms_key)
+        if self.manifest.is_current("replace", page_name, replace_key, knowledge_base_path(page_name)):
+            return False
+        if not self.keep_cleaned:
+            return None
+
+        with open(cleaned_path(page_name), "r", encoding="utf-8") as f:
+            return Document(html_hash=html_hash, text=f.read(), clean_hash=clean_hash)
+
+    def __call__(self, page_name: str, _payload=None) -> Optional[Document]:
+        # Условный запрос имеет смысл, только если сохранен HTML (отладочный режим)
+        # или результат, из которого страница пропускается или пересобирается
+        if self.keep_raw_html:
+            cached_path = downloader.raw_page_path(page_name, self.raw_store) or ""
+        elif self.keep_cleaned:
+            cached_path = cleaned_path(page_name)
+        else:
+            cached_path = knowledge_base_path(page_name)
+
+        status, html_content = self._fetch(page_name, cached_path)
+        if status == FAILED:
+            raise RuntimeError("не удалось скачать страницу")
+
+        html_hash = self._html_hash(page_name)
+        reused = self._reuse(page_name, html_hash)
+        if reused is False:
+            with self._lock:
+                self.unchanged += 1
+            return None
+        if reused is not None:
+            with self._lock:
+                self.reused_cleaned += 1
+            return reused
+
+        if html_content is None and self.keep_raw_html:
+            html_content = downloader.read_page(page_name, self.raw_store)
+
+        if html_content is None:
+            # Тело страницы нужно, а сохраненной копии нет - скачиваем без условий
+            with self._state_lock:
+                forget_page(self.fetch_state, page_name)
+            status, html_content = self._fetch(page_name, cached_path)
+            html_hash = self._html_hash(page_name)
+
+        if status == FAILED or html_content is None:
+            raise RuntimeError("не удалось скачать страницу")
+        return Document(html=html_content, html_hash=html_hash)
+
+
+def save_raw_html(page_name: str, doc: Document, store: Optional[BlobStore] = None):
+    """Сохраняет скачанный HTML в хранилище или в raw_html/ (отладочный режим)."""
+    if doc.html is not None:
+        downloader.save_page(page_name, doc.html, store)
+
+
+def clean_stage(page_name: str, doc: Document) -> Document:
+    """Этап очистки HTML (выполняется в пуле процессов)."""
+    if doc.text is not None:
+        # Очищенный текст взят из сохраненного результата
+        return doc
+
+    text = cleaner.clean_text(doc.html)
+    if len(text) <= MIN_TEXT_LENGTH:
+        raise ValueError(f"слишком короткий текст после очистки ({len(text)} символов)")
+    return Document(html_hash=doc.html_hash, text=text)
+
+
+def init_replace_worker(terms_map_file: str = replacer.TERMS_MAP_FILE):
+    """Загружает скомпилированный словарь замен в процессе (или потоке) этапа замены."""
+    replacer.init_worker(terms_map_file)
+
+
+def replace_stage(page_name: str, doc: Document) -> Document:
+    """Этап замены терминов."""
+    replaced_text = replacer.replace_terms_worker(doc.text)
+    if len(replaced_text) <= MIN_TEXT_LENGTH:
+        raise ValueError(f"слишком короткий текст после замены ({len(replaced_text)} символов)")
+    return Document(html_hash=doc.html_hash, text=replaced_text, clean_hash=doc.clean_hash)
+
+
+def write_stage(page_name: str, doc: Document) -> Document:
+    """Этап записи итогового документа в knowledge_base/."""
+    replacer.save_replaced_text(page_name, doc.text)
+    return doc
+
+
+class ManifestRecorder:
+    """
+    Записывает результаты этапов очистки и замены в манифест; очищенный текст
+    сохраняется в cleaned_texts/ только с keep_cleaned=True.
+    """
+
+    def __init__(self, manifest: Manifest, terms_key: str, keep_cleaned: bool = False):
+        self.manifest = manifest
+        self.terms_key = terms_key
+        self.keep_cleaned = keep_cleaned
+
+    def cleaned(self, page_name: str, doc: Document):
+        """Обработчик результата очистки: отмечает его в манифесте (и сохраняет в отладочном режиме)."""
+        if doc.clean_hash is not None:
+            # Текст взят из сохраненного результата - он уже в манифесте
+            return
+        if self.keep_cleaned:
+            cleaner.save_cleaned_text(page_name, doc.text)
+        doc.clean_hash = self.manifest.record(
+            "clean", page_name, cleaner.clean_key(doc.html_hash or ""), doc.text
+        )
+
+    def written(self, page_name: str, doc: Document):
+        """Обработчик результата записи: отмечает итоговый документ в манифесте."""
+        self.manifest.record("replace", page_name, stage_key(doc.clean_hash, self.terms_key), doc.text)
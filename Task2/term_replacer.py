@@ -0,0 +1,159 @@
+"""
+Однопроходная замена терминов по словарю.
+Все термины компилируются в одно регулярное выражение в виде префиксного дерева,
+поэтому текст просматривается один раз независимо от размера словаря.
+
+Скомпилированный словарь сохраняется рядом с terms_map.json и переиспользуется,
+пока не изменится содержимое словаря.
+"""
+
+import os
+import re
+import json
+import hashlib
+from typing import Dict, Iterable, Pattern, Union
+
+# Служебный ключ узла дерева: на этом узле заканчивается термин
+_END = ""
+
+# Версия формата скомпилированного словаря (увеличить при изменении алгоритма)
+COMPILED_FORMAT_VERSION = 1
+COMPILED_SUFFIX = ".compiled.json"
+
+
+def build_trie(terms: Iterable[str]) -> Dict:
+    """Строит префиксное дерево из терминов (в нижнем регистре)."""
+    trie: Dict = {}
+    for term in terms:
+        node = trie
+        for char in term.lower():
+            node = node.setdefault(char, {})
+        node[_END] = {}
+    return trie
+
+
+def trie_to_regex(node: Dict) -> str:
+    """
+    Преобразует префиксное дерево в регулярное выражение.
+
+    Ветви узла начинаются с разных символов, поэтому альтернатива однозначна,
+    а жадный квантификатор `?` на окончании термина сначала пробует
+    более длинное совпадение и откатывается к короткому, только если
+    после длинного нет границы слова.
+    """
+    branches = [
+        re.escape(char) + trie_to_regex(child)
+        for char, child in sorted(node.items())
+        if char != _END
+    ]
+    if not branches:
+        return ""
+
+    is_end = _END in node
+    if len(branches) == 1 and not is_end:
+        return branches[0]
+
+    regex = "(?:" + "|".join(branches) + ")"
+    return regex + "?" if is_end else regex
+
+
+class TermReplacer:
+    """
+    Заменяет термины словаря за один проход по тексту.
+
+    Семантика совпадает с заменой по шаблонам `\\bтермин\\b` без учета регистра:
+    в каждой позиции выбирается самый длинный термин, за которым есть граница слова.
+    В отличие от последовательных `re.sub`, уже замененный текст повторно не сопоставляется.
+    """
+
+    def __init__(self, pattern: Pattern, replacements: Dict[str, str]):
+        self.pattern = pattern
+        self.replacements = replacements
+
+    @classmethod
+    def from_terms_map(cls, terms_map: Dict[str, str]) -> "TermReplacer":
+        """Компилирует словарь замен {оригинал: замена}."""
+        replacements: Dict[str, str] = {}
+        # Если термины отличаются только регистром, побеждает первый (как и раньше)
+        for original, replacement in sorted(terms_map.items(), key=lambda item: len(item[0]), reverse=True):
+            if original:
+                replacements.setdefault(original.lower(), replacement)
+
+        if not replacements:
+            # Шаблон, который ничего не находит
+            return cls(re.compile(r"(?!x)x"), replacements)
+
+        regex = rf"\b{trie_to_regex(build_trie(replacements))}\b"
+        return cls(re.compile(regex, re.IGNORECASE), replacements)
+
+    def _substitute(self, match: "re.Match") -> str:
+        matched = match.group(0)
+        return self.replacements.get(matched.lower(), matched)
+
+    def replace(self, text: str) -> str:
+        """Заменяет все термины в тексте."""
+        return self.pattern.sub(self._substitute, text)
+
+    def to_dict(self) -> Dict:
+        """Возвращает скомпилированный словарь в виде, пригодном для JSON."""
+        return {
+            "format_version": COMPILED_FORMAT_VERSION,
+            "pattern": self.pattern.pattern,
+            "flags": self.pattern.flags,
+            "replacements": self.replacements,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TermReplacer":
+        """Восстанавливает заменитель из скомпилированного словаря без построения дерева."""
+        return cls(re.compile(data["pattern"], data["flags"]), data["replacements"])
+
+
+def file_sha256(path: Union[str, os.PathLike]) -> str:
+    """Вычисляет SHA-256 хеш файла."""
+    hash_sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            hash_sha256.update(chunk)
+    return hash_sha256.hexdigest()
+
+
+def compiled_path(terms_map_file: Union[str, os.PathLike]) -> str:
+    """Возвращает путь к скомпилированному словарю: terms_map.json -> terms_map.compiled.json."""
+    base, _ = os.path.splitext(os.fspath(terms_map_file))
+    return base + COMPILED_SUFFIX
+
+
+def load_replacer(terms_map_file: Union[str, os.PathLike]) -> TermReplacer:
+    """
+    Загружает заменитель терминов для словаря terms_map.json.
+
+    Если рядом лежит скомпилированный словарь с тем же хешем исходного JSON,
+    используется он; иначе словарь компилируется заново и сохраняется.
+    """
+    source_hash = file_sha256(terms_map_file)
+    artifact_path = compiled_path(terms_map_file)
+
+    if os.path.exists(artifact_path):
+        try:
+            with open(artifact_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if (data.get("source_sha256") == source_hash
+                    and data.get("format_version") == COMPILED_FORMAT_VERSION):
+                return TermReplacer.from_dict(data)
+        except (OSError, json.JSONDecodeError, KeyError, re.error) as e:
+            print(f"Не удалось загрузить {artifact_path}: {e}. Компилирую словарь заново.")
+
+    with open(terms_map_file, "r", encoding="utf-8") as f:
+        terms_map = json.load(f)["replacements"]
+    replacer = TermReplacer.from_terms_map(terms_map)
+
+    data = {"source_sha256": source_hash, **replacer.to_dict()}
+    try:
+        with open(artifact_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+    except OSError as e:
+        # Папка может быть доступна только для чтения - работаем без кеша
+        print(f"Не удалось сохранить {artifact_path}: {e}")
+
+    return replacer
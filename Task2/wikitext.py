@@ -0,0 +1,140 @@
+"""
+Преобразование викитекста статьи MediaWiki в простой HTML для 02_clean_texts.py.
+
+Режим --api получает викитекст статей пачками до 50 страниц (action=query)
+вместо отрисованного HTML каждой статьи (action=parse, запрос на страницу).
+Преобразование упрощенное:
+- шаблоны {{...}}, таблицы {|...|}, сноски <ref>, галереи, файлы, категории
+  и межъязыковые ссылки удаляются;
+- из ссылок [[цель|текст]] и [http://... текст] остается текст;
+- заголовки, списки и абзацы становятся <hN>, <li> и <p> внутри div.mw-parser-output.
+Текст, который выводят шаблоны (карточки, цитаты), в результат не попадает;
+HTML с раскрытыми шаблонами дает action=parse (флаг --api-parse).
+"""
+
+import re
+import html
+from typing import List
+
+COMMENT_RE = re.compile(r"<!--.*?(?:-->|$)", re.DOTALL)
+NOWIKI_RE = re.compile(r"<nowiki\s*>(.*?)</nowiki\s*>|<nowiki\s*/>", re.DOTALL | re.IGNORECASE)
+# Элементы, содержимое которых не является текстом статьи
+DROPPED_ELEMENTS_RE = re.compile(
+    r"<(ref|references|gallery|math|timeline|syntaxhighlight|source|noinclude)\b[^>]*?(?:/>|>.*?</\1\s*>)",
+    re.DOTALL | re.IGNORECASE,
+)
+MAGIC_WORD_RE = re.compile(r"__[A-Z]+__")
+# Самая внутренняя ссылка [[цель|текст]] и окончание слова сразу после нее
+INTERNAL_LINK_RE = re.compile(r"\[\[([^\[\]]*)\]\]([a-zа-яё]*)")
+EXTERNAL_LINK_RE = re.compile(r"\[(?:https?:)?//[^\s\]]+(?:\s+([^\]]*))?\]")
+# Пространства имен, ссылки на которые не выводят текст в статье
+DROPPED_NAMESPACES = {"file", "image", "category", "файл", "изображение", "категория"}
+INTERWIKI_RE = re.compile(r"^[a-z]{2,3}(?:-[a-z]+)?:")
+EMPHASIS_RE = re.compile(r"'{2,}")
+# '<', который не начинает HTML-тег, - обычный символ текста
+BARE_LT_RE = re.compile(r"<(?!/?[A-Za-z][^<>]*>)")
+HEADING_RE = re.compile(r"^(={1,6})\s*(.+?)\s*\1\s*$")
+LIST_ITEM_RE = re.compile(r"^[*#:;]+\s*(.*)$")
+HORIZONTAL_RULE_RE = re.compile(r"^-{4,}\s*$")
+NOWIKI_PLACEHOLDER = "\x00{}\x00"
+NOWIKI_PLACEHOLDER_RE = re.compile(r"\x00(\d+)\x00")
+
+
+def strip_nested(text: str, start: str, end: str) -> str:
+    """Удаляет конструкции start...end с учетом вложенности (шаблоны, таблицы)."""
+    parts = []
+    depth = 0
+    position = 0
+    for match in re.finditer(f"{re.escape(start)}|{re.escape(end)}", text):
+        if match.group() == start:
+            if depth == 0:
+                parts.append(text[position:match.start()])
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                position = match.end()
+    if depth == 0:
+        parts.append(text[position:])
+    return "".join(parts)
+
+
+def link_text(match: re.Match) -> str:
+    """Текст внутренней ссылки или пустая строка для файлов, категорий и межъязыковых ссылок."""
+    target, _, label = match.group(1).partition("|")
+    namespace = target.split(":", 1)[0].strip().lower() if ":" in target else ""
+    if not target.startswith(":") and (namespace in DROPPED_NAMESPACES or INTERWIKI_RE.match(target)):
+        return ""
+    text = label if label else target.lstrip(":")
+    return text + match.group(2)
+
+
+def replace_links(text: str) -> str:
+    """Заменяет ссылки их текстом, начиная с самых внутренних (подписи к файлам содержат ссылки)."""
+    while True:
+        replaced = INTERNAL_LINK_RE.sub(link_text, text)
+        if replaced == text:
+            break
+        text = replaced
+    return EXTERNAL_LINK_RE.sub(lambda match: match.group(1) or "", text)
+
+
+def inline_markup(text: str) -> str:
+    """Убирает строчную разметку: шаблоны, ссылки, выделение."""
+    text = strip_nested(text, "{{", "}}")
+    text = strip_nested(text, "{|", "|}")
+    text = replace_links(text)
+    text = EMPHASIS_RE.sub("", text)
+    text = MAGIC_WORD_RE.sub("", text)
+    return BARE_LT_RE.sub("&lt;", text)
+
+
+def html_blocks(text: str) -> List[str]:
+    """Разбивает викитекст без строчной разметки на заголовки, элементы списков и абзацы."""
+    blocks = []
+    paragraph = []
+
+    def close_paragraph():
+        if paragraph:
+            lines = "\n".join(paragraph)
+            blocks.append(f"<p>{lines}</p>")
+            paragraph.clear()
+
+    for line in text.split("\n"):
+        stripped = line.strip()
+        heading = HEADING_RE.match(stripped)
+        item = LIST_ITEM_RE.match(stripped)
+        if not stripped or HORIZONTAL_RULE_RE.match(stripped):
+            close_paragraph()
+        elif heading:
+            close_paragraph()
+            level = len(heading.group(1))
+            blocks.append(f"<h{level}>{heading.group(2)}</h{level}>")
+        elif item:
+            close_paragraph()
+            if item.group(1).strip():
+                blocks.append(f"<li>{item.group(1).strip()}</li>")
+        else:
+            paragraph.append(stripped)
+    close_paragraph()
+    return blocks
+
+
+def wikitext_to_html(wikitext: str) -> str:
+    """Тело статьи (div.mw-parser-output) из викитекста или "", если текста в статье нет."""
+    nowiki = []
+
+    def hide_nowiki(match: re.Match) -> str:
+        nowiki.append(html.escape(match.group(1) or ""))
+        return NOWIKI_PLACEHOLDER.format(len(nowiki) - 1)
+
+    text = NOWIKI_RE.sub(hide_nowiki, wikitext)
+    text = COMMENT_RE.sub("", text)
+    text = DROPPED_ELEMENTS_RE.sub("", text)
+    text = inline_markup(text)
+    blocks = html_blocks(text)
+    if not blocks:
+        return ""
+    body = "\n".join(blocks)
+    body = NOWIKI_PLACEHOLDER_RE.sub(lambda match: nowiki[int(match.group(1))], body)
+    return f"<div class=\"mw-parser-output\">\n{body}\n</div>"
@@ -0,0 +1,14 @@
+"""
+Бенчмарки индексации Task3.
+
+Запуск из папки Task3:
+    python -m benchmarks.bench_embedding_pool --workers 1 2 4 8
+"""
+
+import sys
+from pathlib import Path
+
+# Скрипты Task3 импортируются как модули верхнего уровня
+TASK3_DIR = Path(__file__).parent.parent.absolute()
+if str(TASK3_DIR) not in sys.path:
+    sys.path.insert(0, str(TASK3_DIR))
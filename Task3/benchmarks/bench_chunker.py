@@ -0,0 +1,92 @@
+"""
+Бенчмарк разбиения на чанки (chunker.py).
+
+Документы базы знаний повторяются, пока корпус не достигнет --size-mb мегабайт,
+и разбиваются прежним способом (RecursiveCharacterTextSplitter.split_documents
+с add_start_index, как раньше в build_index.py) и TextChunker.split_offsets().
+Выводятся время, скорость в МБ/с, ускорение и число документов, у которых
+чанки или их начала (start_index) отличаются.
+
+Запуск из папки Task3:
+    python -m benchmarks.bench_chunker --size-mb 100
+"""
+
+import time
+import argparse
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import benchmarks  # noqa: F401 (добавляет Task3 в sys.path)
+import build_index
+from chunker import SEPARATORS, TextChunker
+
+
+def load_corpus(input_dir: Path, size_mb: float) -> list:
+    """Тексты документов, повторенные до size_mb мегабайт."""
+    texts = []
+    for file_path in build_index.list_documents(input_dir):
+        with open(file_path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    if not texts:
+        raise FileNotFoundError(f"Документы не найдены в {input_dir}")
+    corpus = []
+    size = 0
+    while size < size_mb * 1024 * 1024:
+        text = texts[len(corpus) % len(texts)]
+        corpus.append(text)
+        size += len(text.encode("utf-8"))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбиения на чанки")
+    parser.add_argument("--input", default=str(build_index.KNOWLEDGE_BASE_PATH), help="Папка с документами")
+    parser.add_argument("--size-mb", type=float, default=100, help="Размер корпуса в МБ")
+    args = parser.parse_args()
+
+    corpus = load_corpus(Path(args.input), args.size_mb)
+    size_mb = sum(len(text.encode("utf-8")) for text in corpus) / 1024 / 1024
+
+    print("=" * 60)
+    print("Бенчмарк разбиения на чанки")
+    print("=" * 60)
+    print(f"Документов: {len(corpus)}, размер: {size_mb:.1f} МБ")
+    print(f"Размер чанка: {build_index.CHUNK_SIZE}, перекрытие: {build_index.CHUNK_OVERLAP}")
+    print()
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=build_index.CHUNK_SIZE,
+        chunk_overlap=build_index.CHUNK_OVERLAP,
+        length_function=len,
+        separators=SEPARATORS,
+        add_start_index=True
+    )
+    metadata = {"source": "benchmark", "filename": "benchmark.txt", "title": "benchmark"}
+    start = time.perf_counter()
+    reference = [splitter.split_documents([Document(page_content=text, metadata=metadata)]) for text in corpus]
+    reference_time = time.perf_counter() - start
+
+    chunker = TextChunker(build_index.CHUNK_SIZE, build_index.CHUNK_OVERLAP, SEPARATORS)
+    start = time.perf_counter()
+    offsets = [chunker.split_offsets(text) for text in corpus]
+    chunker_time = time.perf_counter() - start
+
+    different = sum(
+        1 for text, chunks, bounds in zip(corpus, reference, offsets)
+        if [(chunk.metadata["start_index"], chunk.page_content) for chunk in chunks]
+        != [(chunk_start, text[chunk_start:chunk_end]) for chunk_start, chunk_end in bounds]
+    )
+
+    print(f"{'Способ':<32}{'Время, с':>10}{'МБ/с':>10}{'Ускорение':>11}")
+    print(f"{'RecursiveCharacterTextSplitter':<32}{reference_time:>10.2f}{size_mb / reference_time:>10.1f}{1.0:>10.2f}x")
+    print(f"{'TextChunker':<32}{chunker_time:>10.2f}{size_mb / chunker_time:>10.1f}"
+          f"{reference_time / chunker_time:>10.2f}x")
+    print()
+    print(f"Чанков: {sum(len(bounds) for bounds in offsets)}")
+    print(f"{'✓' if different == 0 else '✗'} Документов с отличающимися чанками: {different}")
+
+
+if __name__ == "__main__":
+    main()
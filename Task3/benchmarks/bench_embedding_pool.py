@@ -0,0 +1,84 @@
+"""
+Бенчмарк многопроцессной генерации эмбеддингов (embedding_pool.py).
+
+Чанки базы знаний кодируются моделью в текущем процессе (как раньше в
+create_embeddings()) и пулом EmbeddingPool с разным числом воркеров.
+Загрузка модели в воркерах не входит в замер. Для каждого варианта выводятся
+время, чанков в секунду, ускорение относительно одного процесса
+и максимальное отличие эмбеддингов от него.
+
+Запуск из папки Task3:
+    python -m benchmarks.bench_embedding_pool --workers 1 2 4 8
+    python -m benchmarks.bench_embedding_pool --input ../Task2/knowledge_base --limit 2000
+"""
+
+import os
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+import benchmarks  # noqa: F401 (добавляет Task3 в sys.path)
+import build_index
+from embedding_pool import EmbeddingPool, default_torch_threads
+
+
+def load_chunk_texts(input_dir: Path, limit: int) -> list:
+    """Тексты первых limit чанков базы знаний."""
+    splitter = build_index.create_text_splitter()
+    texts = []
+    for doc in build_index.iter_documents(build_index.list_documents(input_dir), {}):
+        texts.extend(chunk.page_content for chunk in build_index.split_document(doc, splitter))
+        if len(texts) >= limit:
+            break
+    return texts[:limit]
+
+
+def measure(model, texts: list, batch_size: int) -> tuple:
+    """Время кодирования всех текстов и результат."""
+    model.encode(texts[:batch_size], batch_size=batch_size)  # Прогрев
+    start = time.perf_counter()
+    embeddings = model.encode(texts, batch_size=batch_size)
+    return time.perf_counter() - start, np.asarray(embeddings, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк многопроцессной генерации эмбеддингов")
+    parser.add_argument("--input", default=str(build_index.KNOWLEDGE_BASE_PATH), help="Папка с документами")
+    parser.add_argument("--limit", type=int, default=1000, help="Число чанков")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Числа воркеров")
+    parser.add_argument("--torch-threads", type=int, default=0,
+                        help="Потоков PyTorch на воркер (0 - ядра поровну между воркерами)")
+    parser.add_argument("--batch-size", type=int, default=build_index.EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+
+    texts = load_chunk_texts(Path(args.input), args.limit)
+
+    print("=" * 60)
+    print("Бенчмарк многопроцессной генерации эмбеддингов")
+    print("=" * 60)
+    print(f"Модель: {build_index.EMBEDDING_MODEL}")
+    print(f"Чанков: {len(texts)}, ядер CPU: {os.cpu_count()}")
+    print()
+    print(f"{'Вариант':<26}{'Время, с':>10}{'Чанков/с':>10}{'Ускорение':>11}{'Отличие':>10}")
+
+    model = SentenceTransformer(build_index.EMBEDDING_MODEL, device="cpu")
+    baseline_time, baseline = measure(model, texts, args.batch_size)
+    del model
+    print(f"{'1 процесс (без пула)':<26}{baseline_time:>10.2f}{len(texts) / baseline_time:>10.1f}"
+          f"{1.0:>10.2f}x{0.0:>10.1e}")
+
+    for workers in args.workers:
+        threads = args.torch_threads or default_torch_threads(workers)
+        with EmbeddingPool(build_index.EMBEDDING_MODEL, workers, threads) as pool:
+            elapsed, embeddings = measure(pool, texts, args.batch_size)
+        diff = float(np.abs(embeddings - baseline).max())
+        label = f"{workers} воркер(ов) x {threads} пот."
+        print(f"{label:<26}{elapsed:>10.2f}{len(texts) / elapsed:>10.1f}"
+              f"{baseline_time / elapsed:>10.2f}x{diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
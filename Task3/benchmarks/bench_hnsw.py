@@ -0,0 +1,221 @@
+"""
+Бенчмарк метрики расстояния и параметров HNSW (hnsw_settings.py).
+
+Эмбеддинги чанков берутся из индекса (по умолчанию текущая версия). Запросы -
+вопросы золотого набора Task7, закодированные моделью индекса, и --holdout
+случайных чанков, которые исключаются из индексируемых векторов (иначе
+ближайшим к такому запросу всегда был бы он сам). Для каждой метрики,
+M и construction_ef векторы записываются во временную коллекцию (время
+сборки), затем для каждого search_ef измеряются:
+- recall@k - доля найденных HNSW чанков, которые входят в top-k точного
+  поиска перебором (numpy, в той же метрике);
+- p50 и p99 задержки одиночного запроса (collection.query с одним эмбеддингом).
+
+Запуск из папки Task3:
+    python -m benchmarks.bench_hnsw --spaces cosine l2 --m 8 16 32 --search-ef 10 32 64 128
+"""
+
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+
+try:
+    from chromadb.api.client import SharedSystemClient
+except ImportError:  # ранние ChromaDB 0.4.x: кеша клиентов нет
+    SharedSystemClient = None
+
+import benchmarks  # noqa: F401 (добавляет Task3 в sys.path)
+import build_index
+import embedding_backend
+from check_backend_parity import GOLDEN_QUESTIONS_PATH, load_questions
+from chunk_ids import PAGE_SIZE
+from hnsw_settings import COSINE, DISTANCE_METRICS, L2, hnsw_metadata
+from index_versions import resolve_index_path
+
+WRITE_BATCH_SIZE = 5000  # Векторов в одном collection.add()
+WARMUP_QUERIES = 10
+BENCH_COLLECTION = "hnsw_benchmark"
+TIE_TOLERANCE = 1e-5  # Погрешность сравнения расстояний float32
+# search_ef меняется в конфигурации коллекции (modify(configuration=...)) только с ChromaDB 1.0
+CONFIGURABLE_SEARCH_EF = int(chromadb.__version__.split(".")[0]) >= 1
+
+
+def load_vectors(index_path: Path) -> Tuple[List[str], np.ndarray]:
+    """ID и эмбеддинги всех чанков индекса."""
+    client = chromadb.PersistentClient(path=str(index_path), settings=Settings(anonymized_telemetry=False))
+    collection = client.get_collection(name=build_index.COLLECTION_NAME)
+    ids, vectors = [], []
+    offset = 0
+    while True:
+        page = collection.get(limit=PAGE_SIZE, offset=offset, include=["embeddings"])
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    if not ids:
+        raise ValueError(f"В индексе {index_path} нет чанков")
+    return ids, np.concatenate(vectors)
+
+
+def normalized(vectors: np.ndarray, queries: np.ndarray, space: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Для cosine векторы и запросы нормализуются, и метрика сводится к скалярному произведению."""
+    if space != COSINE:
+        return vectors, queries
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True),
+            queries / np.linalg.norm(queries, axis=1, keepdims=True))
+
+
+def ranking_distances(vectors: np.ndarray, queries: np.ndarray, space: str) -> np.ndarray:
+    """
+    Величины, упорядочивающие векторы так же, как расстояние space до каждого
+    запроса: для l2 |x|^2 - 2 q.x (|q|^2 одинаков для всех x), для cosine
+    (после normalized) и ip - скалярное произведение со знаком минус.
+    """
+    dots = queries @ vectors.T
+    return (vectors ** 2).sum(axis=1) - 2 * dots if space == L2 else -dots
+
+
+def exact_kth_distances(vectors: np.ndarray, queries: np.ndarray, space: str, k: int,
+                        batch: int = 64) -> np.ndarray:
+    """Расстояние до k-го ближайшего вектора для каждого запроса (точный перебор)."""
+    result = []
+    for start in range(0, len(queries), batch):
+        distances = ranking_distances(vectors, queries[start:start + batch], space)
+        result.append(np.partition(distances, k - 1, axis=1)[:, k - 1])
+    return np.concatenate(result)
+
+
+def build_collection(path: Path, ids: List[str], vectors: np.ndarray, metadata: Dict) -> float:
+    """Записывает векторы в новую коллекцию с метаданными HNSW; возвращает время сборки."""
+    client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection(name=BENCH_COLLECTION, metadata=metadata)
+    start = time.perf_counter()
+    for offset in range(0, len(ids), WRITE_BATCH_SIZE):
+        collection.add(ids=ids[offset:offset + WRITE_BATCH_SIZE],
+                       embeddings=vectors[offset:offset + WRITE_BATCH_SIZE])
+    return time.perf_counter() - start
+
+
+def reset_clients():
+    """Закрывает закешированные клиенты ChromaDB (и загруженные ими индексы)."""
+    if SharedSystemClient is not None:
+        SharedSystemClient.clear_system_cache()
+
+
+def open_collection(path: Path, search_ef: int, ids: List[str], vectors: np.ndarray, metadata: Dict):
+    """
+    Открывает коллекцию с другим search_ef. В ChromaDB 1.x граф не пересобирается:
+    search_ef меняется в конфигурации коллекции, а загруженный индекс сбрасывается,
+    чтобы ChromaDB прочитал его с новым значением. В ChromaDB 0.x search_ef задается
+    только метаданными при создании, поэтому коллекция собирается заново из ids и vectors.
+    """
+    client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+    if not CONFIGURABLE_SEARCH_EF:
+        client.delete_collection(name=BENCH_COLLECTION)
+        build_collection(path, ids, vectors, dict(metadata, **{"hnsw:search_ef": search_ef}))
+        return client.get_collection(name=BENCH_COLLECTION)
+    client.get_collection(name=BENCH_COLLECTION).modify(configuration={"hnsw": {"ef_search": search_ef}})
+    reset_clients()
+    client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+    return client.get_collection(name=BENCH_COLLECTION)
+
+
+def measure(collection, vectors: np.ndarray, queries: np.ndarray, kth: np.ndarray,
+            positions: Dict[str, int], space: str, k: int) -> Dict:
+    """
+    recall@k относительно точного поиска и задержки одиночных запросов.
+    Найденный чанк считается верным, если он не дальше k-го ближайшего
+    при точном переборе: одинаковые чанки (равные расстояния) не снижают recall.
+    """
+    for query in queries[:WARMUP_QUERIES]:
+        collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+    latencies = []
+    recalls = []
+    for query, limit in zip(queries, kth):
+        start = time.perf_counter()
+        found = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])["ids"][0]
+        latencies.append(time.perf_counter() - start)
+        distances = ranking_distances(vectors[[positions[item_id] for item_id in found]], query[None, :], space)[0]
+        recalls.append(int((distances <= limit + TIE_TOLERANCE).sum()) / k)
+    return {
+        "recall": float(np.mean(recalls)),
+        "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "p99_ms": float(np.percentile(latencies, 99)) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк метрики и параметров HNSW")
+    parser.add_argument("--index", default=None, help="Папка индекса (по умолчанию текущая версия)")
+    parser.add_argument("--questions", default=str(GOLDEN_QUESTIONS_PATH), help="Файл золотых вопросов")
+    parser.add_argument("--no-questions", action="store_true", help="Только запросы из отложенных чанков")
+    parser.add_argument("--holdout", type=int, default=200, help="Чанков индекса, отложенных как запросы")
+    parser.add_argument("--k", type=int, default=5, help="k для recall@k")
+    parser.add_argument("--spaces", nargs="+", default=[COSINE], choices=DISTANCE_METRICS, help="Метрики")
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32], help="Значения M")
+    parser.add_argument("--construction-ef", type=int, nargs="+", default=[100, 200], help="Значения construction_ef")
+    parser.add_argument("--search-ef", type=int, nargs="+", default=[10, 32, 64, 128], help="Значения search_ef")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    index_path = Path(args.index) if args.index else resolve_index_path()
+    ids, vectors = load_vectors(index_path)
+    rng = np.random.default_rng(args.seed)
+    holdout = rng.choice(len(ids), size=min(args.holdout, len(ids) - args.k), replace=False)
+    keep = np.ones(len(ids), dtype=bool)
+    keep[holdout] = False
+    queries = [vectors[holdout]]
+    questions = []
+    if not args.no_questions and Path(args.questions).exists():
+        questions = load_questions(Path(args.questions))
+        model = embedding_backend.load_embedding_model(build_index.EMBEDDING_MODEL, build_index.EMBEDDING_BACKEND)
+        queries.append(np.asarray(model.encode(questions, convert_to_numpy=True), dtype=np.float32))
+        del model
+    queries = np.concatenate(queries)
+    ids = [item_id for item_id, kept in zip(ids, keep) if kept]
+    vectors = vectors[keep]
+
+    print("=" * 60)
+    print("Бенчмарк метрики и параметров HNSW")
+    print("=" * 60)
+    print(f"Индекс: {index_path}")
+    print(f"Векторов: {len(ids)} (размер {vectors.shape[1]}), запросов: {len(queries)} "
+          f"(отложенных чанков: {len(holdout)}, золотых вопросов: {len(questions)}), k = {args.k}")
+    print()
+    print(f"{'Метрика':<9}{'M':>5}{'constr_ef':>11}{'search_ef':>11}{'Сборка, с':>11}"
+          f"{'recall@' + str(args.k):>11}{'p50, мс':>10}{'p99, мс':>10}")
+
+    positions = {item_id: index for index, item_id in enumerate(ids)}
+    for space in args.spaces:
+        space_vectors, space_queries = normalized(vectors, queries, space)
+        kth = exact_kth_distances(space_vectors, space_queries, space, args.k)
+        for m in args.m:
+            for construction_ef in args.construction_ef:
+                path = Path(tempfile.mkdtemp(prefix="bench_hnsw_"))
+                try:
+                    metadata = hnsw_metadata(space, m, construction_ef, args.search_ef[0])
+                    build_time = build_collection(path, ids, vectors, metadata)
+                    for search_ef in args.search_ef:
+                        collection = open_collection(path, search_ef, ids, vectors, metadata)
+                        result = measure(collection, space_vectors, space_queries,
+                                         kth, positions, space, args.k)
+                        print(f"{space:<9}{m:>5}{construction_ef:>11}{search_ef:>11}{build_time:>11.2f}"
+                              f"{result['recall']:>11.3f}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+                finally:
+                    reset_clients()
+                    shutil.rmtree(path, ignore_errors=True)
+    print()
+    print(f"Текущие настройки индекса: {build_index.DISTANCE_METRIC}, M={build_index.HNSW_M}, "
+          f"construction_ef={build_index.HNSW_CONSTRUCTION_EF}, search_ef={build_index.HNSW_SEARCH_EF}")
+
+
+if __name__ == "__main__":
+    main()
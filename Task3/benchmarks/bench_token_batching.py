@@ -0,0 +1,69 @@
+"""
+Бенчмарк батчей по бюджету токенов (token_batching.py).
+
+Чанки базы знаний кодируются прежним способом (model.encode с batch_size=32,
+как в create_embeddings()) и через BucketedEncoder с несколькими бюджетами
+токенов. Для каждого варианта выводятся доля паддинга, время, чанков в секунду,
+ускорение и максимальное отличие эмбеддингов от прежнего способа.
+
+Запуск из папки Task3:
+    python -m benchmarks.bench_token_batching --budgets 4096 8192 16384
+"""
+
+import os
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+import benchmarks  # noqa: F401 (добавляет Task3 в sys.path)
+import build_index
+from benchmarks.bench_embedding_pool import load_chunk_texts
+from token_batching import BucketedEncoder, baseline_batches, padded_tokens, token_lengths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк батчей по бюджету токенов")
+    parser.add_argument("--input", default=str(build_index.KNOWLEDGE_BASE_PATH), help="Папка с документами")
+    parser.add_argument("--limit", type=int, default=2000, help="Число чанков")
+    parser.add_argument("--budgets", type=int, nargs="+", default=[4096, 8192, 16384], help="Бюджеты токенов")
+    parser.add_argument("--batch-size", type=int, default=build_index.EMBEDDING_BATCH_SIZE,
+                        help="batch_size прежнего способа")
+    args = parser.parse_args()
+
+    texts = load_chunk_texts(Path(args.input), args.limit)
+    model = SentenceTransformer(build_index.EMBEDDING_MODEL, device="cpu")
+    lengths = token_lengths(texts, getattr(model, "tokenizer", None))
+
+    print("=" * 60)
+    print("Бенчмарк батчей по бюджету токенов")
+    print("=" * 60)
+    print(f"Модель: {build_index.EMBEDDING_MODEL}, ядер CPU: {os.cpu_count()}")
+    print(f"Чанков: {len(texts)}, токенов: {sum(lengths)} "
+          f"(от {min(lengths)} до {max(lengths)}, в среднем {sum(lengths) / len(lengths):.0f})")
+    print()
+    print(f"{'Вариант':<24}{'Паддинг':>9}{'Время, с':>10}{'Чанков/с':>10}{'Ускорение':>11}{'Отличие':>10}")
+
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size)  # Прогрев
+    start = time.perf_counter()
+    baseline = np.asarray(model.encode(texts, batch_size=args.batch_size, convert_to_numpy=True), dtype=np.float32)
+    baseline_time = time.perf_counter() - start
+    baseline_padding = 1 - sum(lengths) / padded_tokens(lengths, baseline_batches(texts, args.batch_size))
+    print(f"{f'batch_size={args.batch_size}':<24}{baseline_padding:>9.1%}{baseline_time:>10.2f}"
+          f"{len(texts) / baseline_time:>10.1f}{1.0:>10.2f}x{0.0:>10.1e}")
+
+    for budget in args.budgets:
+        encoder = BucketedEncoder(model, token_budget=budget)
+        start = time.perf_counter()
+        embeddings = encoder.encode(texts, batch_size=args.batch_size)
+        elapsed = time.perf_counter() - start
+        stats = encoder.stats()
+        diff = float(np.abs(embeddings - baseline).max())
+        print(f"{f'бюджет {budget} токенов':<24}{stats['padding_ratio']:>9.1%}{elapsed:>10.2f}"
+              f"{len(texts) / elapsed:>10.1f}{baseline_time / elapsed:>10.2f}x{diff:>10.1e}")
+
+
+if __name__ == "__main__":
+    main()
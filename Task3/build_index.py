@@ -1,35 +1,163 @@
 """
 Скрипт для создания векторного индекса базы знаний.
 Использует BGE-base-en-v1.5 для генерации эмбеддингов и ChromaDB для хранения индекса.
+
+Индекс строится потоково: загрузка документов, разбиение на чанки, генерация
+эмбеддингов и запись в ChromaDB работают одновременно в отдельных потоках,
+соединенных ограниченными очередями. В памяти одновременно находится лишь
+несколько документов и батчей чанков, поэтому пиковое потребление памяти
+не зависит от размера базы знаний, а эмбеддинги считаются, пока идет чтение и запись.
+
+Работающий индекс не удаляется: сборка пишется в новую версию (index_versions.py),
+которая становится текущей только после проверки набором запросов. Сборка идет
+под блокировкой записи в индекс, общей с Task5 и Task6. Новая версия
+начинается с копии текущей: ID чанков детерминированы (chunk_ids.py), поэтому
+эмбеддинги считаются и записываются только для новых и изменившихся чанков,
+а чанки, которых больше нет, удаляются.
+
+Время, CPU, скорость и память по этапам сборки (stage_profiler.py) сохраняются
+в index_stats.json; с PROFILE_INDEXING=1 рядом сохраняется профиль cProfile.
 """
 
 import os
+import json
 import time
+import queue
+import shutil
+import threading
+from bisect import bisect_right
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from sentence_transformers import SentenceTransformer
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import chromadb
 from chromadb.config import Settings
 from tqdm import tqdm
 
+try:
+    from chromadb.api.client import SharedSystemClient
+except ImportError:  # ранние ChromaDB 0.4.x: кеша клиентов нет
+    SharedSystemClient = None
+
+import embedding_backend
+import hnsw_settings
+import index_versions
+from chunk_ids import IndexDiff, chunk_id, delete_ids, existing_chunks
+from chunker import SEPARATORS, TextChunker
+from dedup import DEDUP_THRESHOLD, plan_deduplication
+from embedding_cache import EmbeddingCache
+from embedding_pool import EmbeddingPool
+from stage_profiler import StageProfiler, format_report, measure, profile_thread
+from token_batching import BucketedEncoder
+
 
 # Конфигурация
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
 EMBEDDING_SIZE = 768  # Размер эмбеддингов для BGE-base-en-v1.5
+# Реализация модели: torch, onnx или onnx-int8 (embedding_backend.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", embedding_backend.DEFAULT_BACKEND)
 
 # Определяем пути относительно текущего файла
 SCRIPT_DIR = Path(__file__).parent.absolute()
 KNOWLEDGE_BASE_PATH = SCRIPT_DIR.parent / "Task2" / "knowledge_base"
-CHROMA_DB_PATH = SCRIPT_DIR / "chroma_db"
+CHROMA_DB_PATH = SCRIPT_DIR / "chroma_db"  # Индекс до появления версий
+INDEX_VERSIONS_PATH = index_versions.VERSIONS_DIR  # Версии индекса и указатель на текущую
 COLLECTION_NAME = "star_wars_knowledge_base"
 
 # Параметры разбиения на чанки
 CHUNK_SIZE = 1000  # ~500-1000 токенов
 CHUNK_OVERLAP = 200  # Перекрытие для сохранения контекста
 
+# Метрика расстояния и параметры графа HNSW (hnsw_settings.py, метаданные коллекции hnsw:*)
+DISTANCE_METRIC = hnsw_settings.DISTANCE_METRIC  # cosine, l2 или ip
+HNSW_M = hnsw_settings.HNSW_M
+HNSW_CONSTRUCTION_EF = hnsw_settings.HNSW_CONSTRUCTION_EF
+HNSW_SEARCH_EF = hnsw_settings.HNSW_SEARCH_EF
+
+# Метаданные документа рядом с ним: <имя>.meta.json
+META_SUFFIX = ".meta.json"
+BASE_METADATA_KEYS = {"source", "filename", "title", "chunk_id", "chunk_index", "total_chunks", "aliases"}
+
+# Почти дубликаты (сходство Жаккара >= DEDUP_THRESHOLD) индексируются один раз
+DEDUPLICATE = True
+
+# Кеш эмбеддингов (embedding_cache/): неизменившиеся чанки не пересчитываются
+USE_EMBEDDING_CACHE = True
+
+# Многопроцессная генерация эмбеддингов: число процессов с копией модели
+# (1 - модель в текущем процессе) и потоков PyTorch в каждом (0 - ядра поровну)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_TORCH_THREADS = int(os.getenv("EMBEDDING_TORCH_THREADS", "0"))
+
+# Пересборка начинается с копии текущей версии и меняет только изменившиеся
+# чанки (если модель и параметры разбиения те же)
+REUSE_CURRENT_VERSION = True
+
+# Предыдущих версий индекса, которые хранятся для отката
+KEEP_INDEX_VERSIONS = index_versions.KEEP_VERSIONS
+
+# Параметры потоковой индексации
+EMBEDDING_BATCH_SIZE = 32  # Чанков в одном вызове модели
+PIPELINE_BATCH_SIZE = 256  # Чанков в батче, который проходит эмбеддинги и запись в ChromaDB
+DOCUMENT_QUEUE_SIZE = 4  # Документов в очереди между загрузкой и разбиением
+BATCH_QUEUE_SIZE = 4  # Батчей в очередях между разбиением, эмбеддингами и записью
+
+# Файл статистики сборки и профиль cProfile (PROFILE_INDEXING=1) рядом с ним
+STATS_FILE = Path("index_stats.json")
+PROFILE_FILE = STATS_FILE.with_name("index_profile.prof")
+PROFILE_INDEXING = os.getenv("PROFILE_INDEXING", "false").lower() in ("1", "true", "yes")
+
+# Маркер конца потока данных в очереди
+_DONE = object()
+
+
+def load_sidecar_metadata(file_path: Path) -> Dict:
+    """
+    Загружает метаданные документа из файла <имя>.meta.json, если он есть
+    (их пишут загрузчики дополнительных источников, например 02_ingest_markdown.py).
+    ChromaDB хранит только скалярные значения, поэтому остальные пропускаются;
+    исключение - смещения страниц page_offsets, по которым split_documents
+    определяет страницы чанков.
+    """
+    meta_path = file_path.with_suffix(META_SUFFIX)
+    if not meta_path.exists():
+        return {}
+    
+    with open(meta_path, "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+    return {
+        key: value for key, value in metadata.items()
+        if isinstance(value, (str, int, float, bool)) or key == "page_offsets"
+    }
+
+
+def list_documents(knowledge_base_path: Path) -> List[Path]:
+    """Возвращает пути ко всем текстовым документам базы знаний."""
+    return sorted(knowledge_base_path.glob("*.txt"))
+
+
+def load_document(file_path: Path) -> Optional[Document]:
+    """Загружает один документ с метаданными (None, если файл не удалось прочитать)."""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            content = f.read()
+    except Exception as e:
+        print(f"Ошибка при загрузке {file_path}: {e}")
+        return None
+    
+    # Извлекаем название статьи из имени файла
+    title = file_path.stem.replace("_", " ")
+    
+    metadata = {
+        "source": str(file_path),
+        "filename": file_path.name,
+        "title": title
+    }
+    metadata.update(load_sidecar_metadata(file_path))
+    
+    return Document(page_content=content, metadata=metadata)
+
 
 def load_documents(knowledge_base_path: Path) -> List[Document]:
     """
@@ -41,35 +169,63 @@ def load_documents(knowledge_base_path: Path) -> List[Document]:
     Returns:
         Список документов LangChain с метаданными
     """
-    documents = []
-    
-    # Получаем все .txt файлы, исключая terms_map.json
-    txt_files = list(knowledge_base_path.glob("*.txt"))
-    
+    txt_files = list_documents(knowledge_base_path)
     print(f"Найдено {len(txt_files)} документов для обработки")
     
-    for file_path in tqdm(txt_files, desc="Загрузка документов"):
-        try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            
-            # Извлекаем название статьи из имени файла
-            title = file_path.stem.replace("_", " ")
-            
-            # Создаем документ с метаданными
-            doc = Document(
-                page_content=content,
-                metadata={
-                    "source": str(file_path),
-                    "filename": file_path.name,
-                    "title": title
-                }
-            )
-            documents.append(doc)
-        except Exception as e:
-            print(f"Ошибка при загрузке {file_path}: {e}")
-    
-    return documents
+    documents = (load_document(file_path) for file_path in tqdm(txt_files, desc="Загрузка документов"))
+    return [doc for doc in documents if doc is not None]
+
+
+def iter_documents(
+    paths: Iterable[Path],
+    aliases: Dict[str, List[str]],
+    profiler: Optional[StageProfiler] = None
+) -> Iterator[Document]:
+    """
+    Загружает документы по одному, пропуская дубликаты.
+    Каноническим документам кластеров добавляются метаданные "aliases".
+    """
+    duplicates = {name for names in aliases.values() for name in names}
+    for file_path in paths:
+        if file_path.name in duplicates:
+            continue
+        with measure(profiler, "load") as stage:
+            doc = load_document(file_path)
+            stage.items = int(doc is not None)
+        if doc is None:
+            continue
+        if file_path.name in aliases:
+            doc.metadata["aliases"] = ",".join(aliases[file_path.name])
+        yield doc
+
+
+def create_text_splitter() -> TextChunker:
+    """Создает разбиватель текста с параметрами индекса."""
+    return TextChunker(CHUNK_SIZE, CHUNK_OVERLAP, SEPARATORS)
+
+
+def split_document(doc: Document, text_splitter: TextChunker) -> List[Document]:
+    """Разбивает один документ на чанки и добавляет метаданные позиции и ID чанка."""
+    # Смещения страниц (у PDF) не копируются в каждый чанк
+    page_offsets = doc.metadata.pop("page_offsets", None)
+    offsets = text_splitter.split_offsets(doc.page_content)
+    doc_chunks = []
+    
+    for chunk_index, (start, end) in enumerate(offsets):
+        # Добавляем информацию о позиции чанка
+        text = doc.page_content[start:end]
+        metadata = dict(
+            doc.metadata,
+            start_index=start,
+            chunk_id=chunk_id(doc.metadata["filename"], chunk_index, text),
+            chunk_index=chunk_index,
+            total_chunks=len(offsets)
+        )
+        if page_offsets:
+            metadata["page"] = bisect_right(page_offsets, start)
+            metadata["page_end"] = bisect_right(page_offsets, end - 1)
+        doc_chunks.append(Document(page_content=text, metadata=metadata))
+    return doc_chunks
 
 
 def split_documents(documents: List[Document]) -> List[Document]:
@@ -82,52 +238,104 @@ def split_documents(documents: List[Document]) -> List[Document]:
     Returns:
         Список чанков с метаданными
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    
+    text_splitter = create_text_splitter()
     chunks = []
-    chunk_id = 0
     
     for doc in tqdm(documents, desc="Разбиение на чанки"):
-        doc_chunks = text_splitter.split_documents([doc])
-        
-        for chunk_index, chunk in enumerate(doc_chunks):
-            # Добавляем информацию о позиции чанка
-            chunk.metadata["chunk_id"] = chunk_id
-            chunk.metadata["chunk_index"] = chunk_index
-            chunk.metadata["total_chunks"] = len(doc_chunks)
-            chunks.append(chunk)
-            chunk_id += 1
+        chunks.extend(split_document(doc, text_splitter))
     
     return chunks
 
 
-def create_embeddings(chunks: List[Document], model: SentenceTransformer) -> List[List[float]]:
+def iter_chunk_batches(
+    documents: Iterable[Document],
+    batch_size: int = PIPELINE_BATCH_SIZE,
+    profiler: Optional[StageProfiler] = None
+) -> Iterator[List[Document]]:
+    """Разбивает поток документов на чанки и собирает их в батчи по batch_size."""
+    text_splitter = create_text_splitter()
+    batch = []
+    
+    for doc in documents:
+        with measure(profiler, "split") as stage:
+            chunks = split_document(doc, text_splitter)
+            stage.items = len(chunks)
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def iter_changed_batches(
+    batches: Iterable[List[Document]],
+    diff: IndexDiff,
+    batch_size: int = PIPELINE_BATCH_SIZE,
+    profiler: Optional[StageProfiler] = None
+) -> Iterator[List[Document]]:
+    """
+    Оставляет в потоке батчей только чанки, ID которых нет в индексе,
+    и собирает их в батчи по batch_size. Чанки с прежним ID, но другими
+    метаданными копятся в diff.updated.
+    """
+    pending = []
+    for batch in batches:
+        with measure(profiler, "diff", len(batch)):
+            new = diff.classify([chunk.metadata["chunk_id"] for chunk in batch],
+                                [chunk_metadata(chunk) for chunk in batch])
+        pending.extend(batch[i] for i in new)
+        while len(pending) >= batch_size:
+            yield pending[:batch_size]
+            pending = pending[batch_size:]
+    if pending:
+        yield pending
+
+
+def load_embedding_model(workers: int = EMBEDDING_WORKERS, torch_threads: int = EMBEDDING_TORCH_THREADS):
+    """
+    Загружает модель эмбеддингов (бэкенд EMBEDDING_BACKEND): в текущем процессе
+    или, если workers > 1, пул процессов EmbeddingPool с тем же методом encode().
+    """
+    if workers > 1:
+        return EmbeddingPool(EMBEDDING_MODEL, workers, torch_threads or None, backend=EMBEDDING_BACKEND)
+    return embedding_backend.load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND, torch_threads or None)
+
+
+def encode_texts(texts: List[str], model: SentenceTransformer):
+    """Вызывает модель для списка текстов (numpy массив)."""
+    return model.encode(
+        texts,
+        show_progress_bar=False,
+        batch_size=EMBEDDING_BATCH_SIZE,
+        convert_to_numpy=True  # Сначала получаем numpy массив
+    )
+
+
+def create_embeddings(
+    chunks: List[Document],
+    model: SentenceTransformer,
+    cache: Optional[EmbeddingCache] = None
+) -> List[List[float]]:
     """
     Генерирует эмбеддинги для всех чанков.
     
     Args:
         chunks: Список чанков
-        model: Модель для генерации эмбеддингов
+        model: Модель для генерации эмбеддингов (или EmbeddingPool)
+        cache: Кеш эмбеддингов; модель вызывается только для чанков, которых в нем нет
         
     Returns:
         Список векторов эмбеддингов
     """
     texts = [chunk.page_content for chunk in chunks]
     
-    print(f"Генерация эмбеддингов для {len(texts)} чанков...")
-    
     # Генерируем эмбеддинги батчами для оптимизации
-    embeddings = model.encode(
-        texts,
-        show_progress_bar=True,
-        batch_size=32,
-        convert_to_numpy=True  # Сначала получаем numpy массив
-    )
+    if cache is not None:
+        embeddings = cache.encode(texts, lambda missing: encode_texts(missing, model))
+    else:
+        embeddings = encode_texts(texts, model)
     
     # Конвертируем numpy массив в список списков Python
     # Это гарантирует правильный формат для ChromaDB
@@ -138,19 +346,171 @@ def create_embeddings(chunks: List[Document], model: SentenceTransformer) -> Lis
         return [emb.tolist() if hasattr(emb, 'tolist') else list(emb) for emb in embeddings]
 
 
+def iter_embedded_batches(
+    batches: Iterable[List[Document]],
+    model: SentenceTransformer,
+    cache: Optional[EmbeddingCache] = None,
+    profiler: Optional[StageProfiler] = None
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    """
+    Генерирует эмбеддинги для потока батчей чанков. Для профиля этапа
+    считаются токены, прошедшие через модель (счетчик BucketedEncoder.tokens).
+    """
+    for batch in batches:
+        with measure(profiler, "embed", len(batch)) as stage:
+            tokens = getattr(model, "tokens", 0)
+            embeddings = create_embeddings(batch, model, cache)
+            stage.values["tokens"] = getattr(model, "tokens", 0) - tokens
+        yield batch, embeddings
+
+
+def chunk_metadata(chunk: Document) -> Dict:
+    """Метаданные чанка для ChromaDB."""
+    return {
+        "source": chunk.metadata["source"],
+        "filename": chunk.metadata["filename"],
+        "title": chunk.metadata["title"],
+        "chunk_id": chunk.metadata["chunk_id"],
+        "chunk_index": chunk.metadata["chunk_index"],
+        "total_chunks": chunk.metadata["total_chunks"],
+        "aliases": chunk.metadata.get("aliases", ""),
+        # Дополнительные поля из <имя>.meta.json (source_path, source_type и т.д.)
+        **{key: value for key, value in chunk.metadata.items() if key not in BASE_METADATA_KEYS}
+    }
+
+
+def threaded(items: Iterable, maxsize: int, profiler: Optional[StageProfiler] = None) -> Iterator:
+    """
+    Выполняет генератор в отдельном потоке и отдает его элементы через очередь
+    размера maxsize: генератор работает одновременно с потребителем, но уходит
+    вперед не больше чем на maxsize элементов. Исключение генератора
+    передается потребителю. Если включено профилирование, поток попадает
+    в профиль cProfile.
+    """
+    buffer: queue.Queue = queue.Queue(maxsize=maxsize)
+    stopped = threading.Event()
+    
+    def put(item) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def produce():
+        with profile_thread(profiler):
+            try:
+                for item in items:
+                    if not put((item, None)):
+                        return
+            except BaseException as e:
+                put((_DONE, e))
+                return
+            finally:
+                # Закрываем генератор, чтобы остановить и предыдущие этапы
+                if hasattr(items, "close"):
+                    items.close()
+            put((_DONE, None))
+    
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        # Потребитель остановился (или упал) - генератор больше не нужен
+        stopped.set()
+        thread.join()
+
+
+def index_settings() -> Dict:
+    """
+    Параметры, при которых чанки и эмбеддинги версии можно переиспользовать
+    (метаданные коллекции). Метрику и параметры HNSW у созданной коллекции
+    не поменять, поэтому при их изменении индекс собирается заново.
+    """
+    return {
+        "embedding_model": embedding_backend.cache_model_name(EMBEDDING_MODEL, EMBEDDING_BACKEND),
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        **hnsw_settings.hnsw_metadata(DISTANCE_METRIC, HNSW_M, HNSW_CONSTRUCTION_EF, HNSW_SEARCH_EF),
+    }
+
+
+def release_client(client):
+    """
+    Закрывает клиент ChromaDB и загруженный им индекс. В ChromaDB 0.x без close()
+    сбрасывается кеш клиентов: до создания новой версии других клиентов в процессе сборки нет.
+    """
+    if hasattr(client, "close"):
+        index_versions.close_client(client)
+    elif SharedSystemClient is not None:
+        SharedSystemClient.clear_system_cache()
+
+
+def reusable_version() -> Optional[Path]:
+    """Папка текущей версии индекса, если она собрана с теми же параметрами (иначе None)."""
+    version = index_versions.current_version(INDEX_VERSIONS_PATH)
+    if version is None:
+        return None
+    path = INDEX_VERSIONS_PATH / version
+    client = None
+    try:
+        client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+        metadata = client.get_collection(name=COLLECTION_NAME).metadata or {}
+    except Exception:
+        return None
+    finally:
+        # Клиент отпускает папку версии до того, как run_build() ее скопирует
+        if client is not None:
+            release_client(client)
+    if any(metadata.get(key) != value for key, value in index_settings().items()):
+        return None
+    return path
+
+
+def read_texts(paths: Iterable[Path]) -> Iterator[Tuple[str, str]]:
+    """Читает документы по одному для поиска дубликатов."""
+    for file_path in paths:
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                yield file_path.name, f.read()
+        except Exception as e:
+            print(f"Ошибка при загрузке {file_path}: {e}")
+
+
 def build_index():
     """
-    Основная функция для построения векторного индекса.
+    Основная функция для построения векторного индекса. Пока идет сборка,
+    Task5 и Task6 не дописывают текущую версию (index_versions.IndexLock).
     """
+    with index_versions.IndexLock(
+        INDEX_VERSIONS_PATH, on_wait=lambda: print("Индекс собирается или обновляется другим процессом, ожидание...")
+    ):
+        run_build()
+
+
+def run_build():
+    """Сборка, проверка и активация новой версии индекса."""
     start_time = time.time()
+    profiler = StageProfiler(profile=PROFILE_INDEXING)
     
     print("=" * 60)
     print("Создание векторного индекса базы знаний")
     print("=" * 60)
-    print(f"Модель эмбеддингов: {EMBEDDING_MODEL}")
+    print(f"Модель эмбеддингов: {EMBEDDING_MODEL} ({EMBEDDING_BACKEND})")
     print(f"Размер эмбеддингов: {EMBEDDING_SIZE}")
     print(f"Размер чанка: {CHUNK_SIZE} символов")
     print(f"Перекрытие чанков: {CHUNK_OVERLAP} символов")
+    print(f"Метрика: {DISTANCE_METRIC}, HNSW: M={HNSW_M}, construction_ef={HNSW_CONSTRUCTION_EF}, "
+          f"search_ef={HNSW_SEARCH_EF}")
     print()
     
     # Проверка существования базы знаний
@@ -159,91 +519,191 @@ def build_index():
         print("Убедитесь, что Task2/knowledge_base/ существует и содержит документы")
         return
     
-    # 1. Загрузка документов
-    print("Шаг 1: Загрузка документов из базы знаний...")
-    documents = load_documents(KNOWLEDGE_BASE_PATH)
+    # 1. Список документов
+    print("Шаг 1: Поиск документов в базе знаний...")
+    paths = list_documents(KNOWLEDGE_BASE_PATH)
     
-    if len(documents) == 0:
+    if len(paths) == 0:
         print("Ошибка: Не найдено документов для обработки")
         return
     
-    print(f"Загружено документов: {len(documents)}")
-    print()
-    
-    # 2. Разбиение на чанки
-    print("Шаг 2: Разбиение документов на чанки...")
-    chunks = split_documents(documents)
-    print(f"Создано чанков: {len(chunks)}")
+    print(f"Найдено документов: {len(paths)}")
     print()
     
-    # 3. Загрузка модели эмбеддингов
-    print("Шаг 3: Загрузка модели эмбеддингов...")
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL)
-    print("Модель загружена")
+    aliases: Dict[str, List[str]] = {}
+    duplicate_clusters = []
+    duplicates_skipped = 0
+    if DEDUPLICATE:
+        # Отдельный проход по документам: в памяти остаются только сигнатуры
+        print(f"Поиск почти дубликатов (порог сходства {DEDUP_THRESHOLD})...")
+        with profiler.stage("dedup", len(paths)):
+            aliases, duplicate_clusters = plan_deduplication(
+                read_texts(tqdm(paths, desc="Сигнатуры документов")), DEDUP_THRESHOLD
+            )
+        print(f"Найдено кластеров дубликатов: {len(duplicate_clusters)}")
+        for cluster in duplicate_clusters:
+            print(f"  {cluster['canonical']} <- {', '.join(cluster['aliases'])}")
+        duplicates_skipped = sum(len(names) for names in aliases.values())
+        print(f"Документов для индексации: {len(paths) - duplicates_skipped} (пропущено дубликатов: {duplicates_skipped})")
+        print()
+    
+    # 2. Загрузка модели эмбеддингов
+    print("Шаг 2: Загрузка модели эмбеддингов...")
+    with profiler.stage("model_load"):
+        embedding_model = load_embedding_model()
+    if isinstance(embedding_model, EmbeddingPool):
+        print(f"Модель загружена в {embedding_model.workers} процессах "
+              f"по {embedding_model.torch_threads} потоков вычислений")
+    else:
+        print("Модель загружена")
+    # Батчи по бюджету токенов вместо фиксированных EMBEDDING_BATCH_SIZE чанков
+    encoder = BucketedEncoder(embedding_model)
     print()
     
-    # 4. Генерация эмбеддингов
-    print("Шаг 4: Генерация эмбеддингов...")
-    embeddings = create_embeddings(chunks, embedding_model)
-    print(f"Сгенерировано эмбеддингов: {len(embeddings)}")
-    print()
+    # 3. Создание ChromaDB индекса
+    print("Шаг 3: Создание векторного индекса в ChromaDB...")
     
-    # 5. Создание ChromaDB индекса
-    print("Шаг 5: Создание векторного индекса в ChromaDB...")
+    # Новая версия рядом с текущей: работающий индекс продолжает обслуживать запросы
+    index_path = index_versions.new_version_dir(INDEX_VERSIONS_PATH)
+    print(f"Новая версия индекса: {index_path.name}")
+    print(f"Текущая версия: {index_versions.current_version(INDEX_VERSIONS_PATH) or CHROMA_DB_PATH.name}")
     
-    # Удаляем существующую БД, если есть
-    if CHROMA_DB_PATH.exists():
-        import shutil
-        shutil.rmtree(CHROMA_DB_PATH)
-        print("Удалена существующая база данных")
+    # Копия текущей версии: дальше меняются только изменившиеся чанки
+    base_path = reusable_version() if REUSE_CURRENT_VERSION else None
+    if base_path is not None:
+        try:
+            with profiler.stage("base_copy"):
+                shutil.copytree(base_path, index_path, dirs_exist_ok=True)
+        except BaseException:
+            index_versions.discard_version(index_path)
+            raise
+        print(f"Скопирована текущая версия {base_path.name}: записываются только изменившиеся чанки")
     
     # Создаем клиент ChromaDB
     client = chromadb.PersistentClient(
-        path=str(CHROMA_DB_PATH),
+        path=str(index_path),
         settings=Settings(anonymized_telemetry=False)
     )
     
     # Создаем или получаем коллекцию
     collection = client.get_or_create_collection(
         name=COLLECTION_NAME,
-        metadata={"description": "Star Wars knowledge base vector index"}
+        metadata={"description": "Star Wars knowledge base vector index", **index_settings()}
     )
+    with profiler.stage("base_read") as stage:
+        diff = IndexDiff(existing_chunks(collection) if base_path is not None else None)
+        stage.items = len(diff.existing)
+    if base_path is not None:
+        print(f"Чанков в копии: {len(diff.existing)}")
+    print()
     
-    # Подготавливаем данные для добавления
-    ids = [f"chunk_{i}" for i in range(len(chunks))]
-    texts = [chunk.page_content for chunk in chunks]
-    metadatas = [
-        {
-            "source": chunk.metadata["source"],
-            "filename": chunk.metadata["filename"],
-            "title": chunk.metadata["title"],
-            "chunk_id": chunk.metadata["chunk_id"],
-            "chunk_index": chunk.metadata["chunk_index"],
-            "total_chunks": chunk.metadata["total_chunks"]
-        }
-        for chunk in chunks
-    ]
-    
-    # Добавляем данные в коллекцию батчами (ChromaDB имеет ограничение на размер батча)
-    print("Добавление чанков в индекс...")
-    BATCH_SIZE = 5000  # Безопасный размер батча для ChromaDB
-    
-    total_chunks = len(chunks)
-    for i in tqdm(range(0, total_chunks, BATCH_SIZE), desc="Добавление батчей"):
-        end_idx = min(i + BATCH_SIZE, total_chunks)
-        batch_ids = ids[i:end_idx]
-        batch_embeddings = embeddings[i:end_idx]
-        batch_texts = texts[i:end_idx]
-        batch_metadatas = metadatas[i:end_idx]
+    # 4. Потоковая индексация: загрузка -> разбиение -> эмбеддинги -> запись
+    print("Шаг 4: Загрузка, разбиение, генерация эмбеддингов и запись в индекс...")
+    documents_count = 0
+    
+    def counted(documents: Iterable[Document]) -> Iterator[Document]:
+        nonlocal documents_count
+        for doc in documents:
+            documents_count += 1
+            progress.update(1)
+            yield doc
+    
+    cache_name = embedding_backend.cache_model_name(EMBEDDING_MODEL, EMBEDDING_BACKEND)
+    cache = EmbeddingCache(cache_name) if USE_EMBEDDING_CACHE else None
+    if cache is not None:
+        print(f"Кеш эмбеддингов: {cache.cache_dir}")
+    
+    chunks_written = 0
+    validation = None
+    cache_stats = None
+    try:
+        with tqdm(total=len(paths) - duplicates_skipped, desc="Документы") as progress:
+            documents = threaded(counted(iter_documents(paths, aliases, profiler)), DOCUMENT_QUEUE_SIZE, profiler)
+            # Эмбеддинги считаются только для чанков, которых нет в индексе
+            batches = threaded(
+                iter_changed_batches(iter_chunk_batches(documents, profiler=profiler), diff, profiler=profiler),
+                BATCH_QUEUE_SIZE, profiler
+            )
+            embedded = threaded(iter_embedded_batches(batches, encoder, cache, profiler), BATCH_QUEUE_SIZE, profiler)
+            
+            # Запись в ChromaDB в основном потоке, пока следующие батчи считаются
+            for batch, embeddings in embedded:
+                with profiler.stage("write", len(batch)):
+                    collection.upsert(
+                        ids=[chunk.metadata["chunk_id"] for chunk in batch],
+                        embeddings=embeddings,
+                        documents=[chunk.page_content for chunk in batch],
+                        metadatas=[chunk_metadata(chunk) for chunk in batch]
+                    )
+                chunks_written += len(batch)
+                progress.set_postfix(записано=chunks_written)
+        
+        # Метаданные изменившихся чанков и удаление чанков, которых больше нет
+        removed = diff.removed()
+        with profiler.stage("write", len(diff.updated) + len(removed)):
+            diff.apply_updates(collection)
+            delete_ids(collection, removed)
+        chunks_count = len(diff.seen)
+        index_changes = diff.stats()
         
-        collection.add(
-            ids=batch_ids,
-            embeddings=batch_embeddings,
-            documents=batch_texts,
-            metadatas=batch_metadatas
+        if documents_count:
+            # 5. Проверка новой версии до активации
+            print(f"Индекс создан: {chunks_count} чанков (новых: {index_changes['added']}, "
+                  f"с новыми метаданными: {index_changes['updated']}, без изменений: {index_changes['unchanged']}, "
+                  f"удалено: {index_changes['removed']})")
+            print()
+            print("Шаг 5: Проверка новой версии индекса...")
+            with profiler.stage("validate", chunks_count):
+                validation = index_versions.validate_index(collection, embedding_model, chunks_count)
+    except BaseException:
+        index_versions.discard_version(index_path)
+        raise
+    finally:
+        if isinstance(embedding_model, EmbeddingPool):
+            embedding_model.close()
+        # Кеш закрывается при любом исходе: ошибка, пустая база или непройденная проверка
+        if cache is not None:
+            cache_stats = cache.stats()
+            cache.close()
+    
+    if documents_count == 0:
+        index_versions.discard_version(index_path)
+        print("Ошибка: Не найдено документов для обработки")
+        return
+    
+    print(f"Чанков по собственному эмбеддингу: {validation['self_match']:.1%}, "
+          f"проверочных запросов: {validation['queries_passed']} из {validation['queries']}")
+    if not validation["passed"]:
+        index_versions.discard_version(index_path)
+        for error in validation["errors"]:
+            print(f"✗ {error}")
+        print("Ошибка: новая версия не прошла проверку, текущий индекс не изменен")
+        return
+    
+    # 6. Атомарное переключение указателя на новую версию
+    with profiler.stage("promote"):
+        manifest = index_versions.promote(
+            index_path.name, INDEX_VERSIONS_PATH, KEEP_INDEX_VERSIONS,
+            info={"chunks_count": chunks_count, "documents_count": documents_count, "validation": validation}
         )
+    print(f"✓ Версия {index_path.name} активирована "
+          f"(предыдущие для отката: {', '.join(manifest['previous']) or 'нет'})")
+    print()
+    if cache_stats is not None:
+        print(f"Кеш эмбеддингов: {cache_stats['hits']} найдено, {cache_stats['misses']} посчитано заново")
+    batching_stats = encoder.stats()
+    if batching_stats["texts"]:
+        print(f"Паддинг: {batching_stats['padding_ratio']:.1%} "
+              f"(при батчах по {EMBEDDING_BATCH_SIZE} чанков: {batching_stats['baseline_padding_ratio']:.1%}), "
+              f"оценка ускорения: {batching_stats['estimated_speedup']:.2f}x, "
+              f"скорость: {batching_stats['texts_per_second']:.1f} чанков/с")
+    print()
     
-    print(f"Индекс создан: {len(ids)} чанков добавлено")
+    # Время, CPU, скорость и память по этапам
+    profile = profiler.report()
+    print("Этапы сборки (этапы конвейера шага 4 работают одновременно):")
+    for line in format_report(profile):
+        print(f"  {line}")
     print()
     
     # Статистика
@@ -252,31 +712,45 @@ def build_index():
     print("Индексация завершена!")
     print("=" * 60)
     print(f"Время выполнения: {elapsed_time:.2f} секунд ({elapsed_time/60:.2f} минут)")
-    print(f"Документов обработано: {len(documents)}")
-    print(f"Чанков создано: {len(chunks)}")
-    print(f"Среднее чанков на документ: {len(chunks)/len(documents):.2f}")
-    print(f"Путь к индексу: {CHROMA_DB_PATH.absolute()}")
+    print(f"Документов обработано: {documents_count}")
+    print(f"Чанков создано: {chunks_count}")
+    print(f"Среднее чанков на документ: {chunks_count/documents_count:.2f}")
+    print(f"Путь к индексу: {index_path}")
     print()
     
     # Сохраняем статистику
     stats = {
         "model": EMBEDDING_MODEL,
+        "embedding_backend": EMBEDDING_BACKEND,
         "embedding_size": EMBEDDING_SIZE,
+        "embedding_workers": EMBEDDING_WORKERS,
         "chunk_size": CHUNK_SIZE,
         "chunk_overlap": CHUNK_OVERLAP,
-        "documents_count": len(documents),
-        "chunks_count": len(chunks),
+        "distance_metric": DISTANCE_METRIC,
+        "hnsw": {"M": HNSW_M, "construction_ef": HNSW_CONSTRUCTION_EF, "search_ef": HNSW_SEARCH_EF},
+        "documents_count": documents_count,
+        "duplicates_skipped": duplicates_skipped,
+        "duplicate_clusters": duplicate_clusters,
+        "chunks_count": chunks_count,
+        "embedding_cache": cache_stats,
+        "embedding_batching": batching_stats,
+        "index_changes": dict(index_changes, base_version=base_path.name if base_path is not None else None),
         "indexing_time_seconds": elapsed_time,
-        "index_path": str(CHROMA_DB_PATH.absolute())
+        "stages": profile["stages"],
+        "resources": profile["total"],
+        "index_version": index_path.name,
+        "index_validation": validation,
+        "index_path": str(index_path)
     }
     
-    import json
-    with open("index_stats.json", "w", encoding="utf-8") as f:
+    with open(STATS_FILE, "w", encoding="utf-8") as f:
         json.dump(stats, f, indent=2, ensure_ascii=False)
     
-    print("Статистика сохранена в index_stats.json")
+    print(f"Статистика сохранена в {STATS_FILE}")
+    if profiler.dump_profile(PROFILE_FILE):
+        print(f"Профиль cProfile сохранен в {PROFILE_FILE} (python -m pstats {PROFILE_FILE}), "
+              f"сводка - в {PROFILE_FILE.with_suffix('.txt')}")
 
 
 if __name__ == "__main__":
     build_index()
-
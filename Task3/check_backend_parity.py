@@ -0,0 +1,142 @@
+"""
+Проверка совпадения эмбеддингов разных бэкендов (embedding_backend.py) с PyTorch.
+
+1. Чанки из индекса кодируются PyTorch и проверяемым бэкендом: косинусное
+   сходство пар векторов (среднее и минимальное) и скорость кодирования.
+2. Вопросы золотого набора (Task7/golden_questions.txt) ищутся в индексе
+   с эмбеддингами обоих бэкендов: recall@k - доля top-k чанков PyTorch,
+   найденных и с эмбеддингами бэкенда.
+
+Бэкенд считается совместимым, если минимальное сходство не ниже
+MIN_COSINE, а recall@k не ниже MIN_RECALL. Тогда его можно включить через
+EMBEDDING_BACKEND и для запросов (Task4, Task5), и для индексации.
+
+Использование:
+    python check_backend_parity.py
+    python check_backend_parity.py --backends onnx-int8 --k 10 --sample 1000
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+
+import embedding_backend
+from build_index import COLLECTION_NAME, EMBEDDING_MODEL
+from index_versions import resolve_index_path
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+GOLDEN_QUESTIONS_PATH = SCRIPT_DIR.parent / "Task7" / "golden_questions.txt"
+RESULT_FILE = SCRIPT_DIR / "backend_parity.json"
+CHROMA_DB_PATH = resolve_index_path()  # Текущая версия индекса
+
+MIN_COSINE = 0.99  # Минимальное сходство эмбеддингов чанка
+MIN_RECALL = 0.9  # Минимальный recall@k на золотых вопросах
+
+
+def load_questions(questions_file: Path) -> List[str]:
+    """Вопросы золотого набора (формат Task7: вопрос | ответ | категория | должен_ответить)."""
+    questions = []
+    with open(questions_file, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#") and "|" in line:
+                questions.append(line.split("|")[0].strip())
+    return questions
+
+
+def encode_timed(model, texts: List[str]) -> tuple:
+    """Эмбеддинги текстов и скорость кодирования (текстов в секунду)."""
+    model.encode(texts[:8])  # Прогрев
+    start = time.perf_counter()
+    embeddings = np.asarray(model.encode(texts, batch_size=32, convert_to_numpy=True), dtype=np.float32)
+    return embeddings, len(texts) / (time.perf_counter() - start)
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Косинусное сходство соответствующих строк двух матриц."""
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def top_k_ids(collection, embeddings: np.ndarray, k: int) -> List[List[str]]:
+    """ID top-k чанков индекса для каждого запроса."""
+    return collection.query(query_embeddings=embeddings.tolist(), n_results=k, include=[])["ids"]
+
+
+def recall_at_k(reference: List[List[str]], found: List[List[str]]) -> float:
+    """Средняя доля эталонных top-k, найденных в top-k проверяемого бэкенда."""
+    return float(np.mean([len(set(ref) & set(ids)) / len(ref) for ref, ids in zip(reference, found) if ref]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка совпадения эмбеддингов бэкендов с PyTorch")
+    parser.add_argument("--backends", nargs="+", default=[embedding_backend.ONNX, embedding_backend.ONNX_INT8],
+                        choices=[embedding_backend.ONNX, embedding_backend.ONNX_INT8])
+    parser.add_argument("--k", type=int, default=5, help="k для recall@k")
+    parser.add_argument("--sample", type=int, default=500, help="Чанков индекса для сравнения эмбеддингов")
+    parser.add_argument("--questions", default=str(GOLDEN_QUESTIONS_PATH), help="Файл золотых вопросов")
+    args = parser.parse_args()
+
+    if not CHROMA_DB_PATH.exists():
+        print(f"Ошибка: Векторная база данных не найдена по пути {CHROMA_DB_PATH}")
+        print("Сначала запустите build_index.py для создания индекса")
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path=str(CHROMA_DB_PATH), settings=Settings(anonymized_telemetry=False))
+    collection = client.get_collection(name=COLLECTION_NAME)
+    chunks = collection.get(limit=args.sample, include=["documents"])["documents"]
+    questions = load_questions(Path(args.questions))
+
+    print("=" * 60)
+    print("Проверка совпадения эмбеддингов бэкендов")
+    print("=" * 60)
+    print(f"Модель: {EMBEDDING_MODEL}")
+    print(f"Чанков: {len(chunks)}, золотых вопросов: {len(questions)}, k = {args.k}")
+    print()
+
+    reference_model = embedding_backend.load_embedding_model(EMBEDDING_MODEL, embedding_backend.TORCH)
+    reference_chunks, reference_speed = encode_timed(reference_model, chunks)
+    reference_ids = top_k_ids(collection, np.asarray(reference_model.encode(questions), dtype=np.float32), args.k)
+    del reference_model
+
+    results: Dict[str, Dict] = {
+        embedding_backend.TORCH: {"texts_per_second": reference_speed}
+    }
+    compatible = True
+    for backend in args.backends:
+        model = embedding_backend.load_embedding_model(EMBEDDING_MODEL, backend)
+        embeddings, speed = encode_timed(model, chunks)
+        similarity = cosine(embeddings, reference_chunks)
+        recall = recall_at_k(reference_ids, top_k_ids(collection, np.asarray(model.encode(questions)), args.k))
+        del model
+
+        passed = float(similarity.min()) >= MIN_COSINE and recall >= MIN_RECALL
+        compatible = compatible and passed
+        results[backend] = {
+            "cosine_mean": float(similarity.mean()),
+            "cosine_min": float(similarity.min()),
+            f"recall@{args.k}": recall,
+            "texts_per_second": speed,
+            "speedup": speed / reference_speed,
+            "passed": passed,
+        }
+        print(f"{'✓' if passed else '✗'} {backend}: сходство среднее {similarity.mean():.5f}, "
+              f"минимальное {similarity.min():.5f}; recall@{args.k} = {recall:.3f}; "
+              f"{speed:.1f} чанков/с ({speed / reference_speed:.2f}x к PyTorch)")
+
+    with open(RESULT_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print()
+    print(f"Пороги: сходство >= {MIN_COSINE}, recall@{args.k} >= {MIN_RECALL}")
+    print(f"Результаты сохранены в {RESULT_FILE}")
+    sys.exit(0 if compatible else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Проверка согласованности чанков в коллекции индекса.
+
+Находит:
+- дубликаты: несколько чанков на одной позиции документа (filename, chunk_index),
+  например после записи с ID по collection.count() и последующей пересборки;
+- сиротские чанки: документа нет ни по пути source, ни в базе знаний,
+  или номер чанка не меньше total_chunks;
+- неполные документы: у документа не хватает чанков до total_chunks;
+- ID, не совпадающие с chunk_id(filename, chunk_index, текст) (chunk_ids.py):
+  ID прежнего вида (chunk_5) или текст изменился без смены ID.
+
+С --fix сиротские чанки и дубликаты удаляются (из дубликатов остается чанк
+с правильным ID, а если такого нет - первый). Код выхода 1, если найдены проблемы.
+
+Использование:
+    python check_index.py
+    python check_index.py --fix
+"""
+
+import sys
+import argparse
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+import chromadb
+from chromadb.config import Settings
+
+from build_index import COLLECTION_NAME, KNOWLEDGE_BASE_PATH, list_documents
+from chunk_ids import chunk_id, delete_ids, iter_collection
+from index_versions import resolve_index_path
+
+EXAMPLES = 5  # ID в примерах для каждой проблемы
+
+
+def check_collection(collection, knowledge_base_path: Path) -> Dict[str, List[str]]:
+    """
+    Проверяет коллекцию.
+
+    Returns:
+        Списки ID по проблемам: duplicates (лишние копии), orphaned, incomplete
+        (имена документов), mismatched_ids
+    """
+    known_files = {path.name for path in list_documents(knowledge_base_path)} if knowledge_base_path.exists() else set()
+    positions = defaultdict(list)
+    totals: Dict[str, int] = {}
+    orphaned = []
+    mismatched = []
+
+    for item in iter_collection(collection, include=["metadatas", "documents"]):
+        metadata = item["metadata"] or {}
+        filename = metadata.get("filename", "")
+        chunk_index = metadata.get("chunk_index", -1)
+        total_chunks = metadata.get("total_chunks", 0)
+        expected_id = chunk_id(filename, chunk_index, item["document"] or "")
+
+        if item["id"] != expected_id:
+            mismatched.append(item["id"])
+        source = metadata.get("source", "")
+        if (filename not in known_files and not (source and Path(source).exists())) \
+                or not 0 <= chunk_index < total_chunks:
+            orphaned.append(item["id"])
+            continue
+        positions[(filename, chunk_index)].append((item["id"], item["id"] == expected_id))
+        totals[filename] = max(totals.get(filename, 0), total_chunks)
+
+    duplicates = []
+    for items in positions.values():
+        if len(items) > 1:
+            # Остается чанк с правильным ID (или первый), остальные - лишние
+            keep = next((item_id for item_id, correct in items if correct), items[0][0])
+            duplicates.extend(item_id for item_id, _ in items if item_id != keep)
+
+    counts = defaultdict(int)
+    for filename, _ in positions:
+        counts[filename] += 1
+    incomplete = sorted(filename for filename, total in totals.items() if counts[filename] < total)
+
+    return {
+        "duplicates": duplicates,
+        "orphaned": orphaned,
+        "incomplete": incomplete,
+        "mismatched_ids": mismatched,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка согласованности чанков в индексе")
+    parser.add_argument("--index", default=None, help="Папка индекса (по умолчанию текущая версия)")
+    parser.add_argument("--knowledge-base", default=str(KNOWLEDGE_BASE_PATH), help="Папка с документами")
+    parser.add_argument("--fix", action="store_true", help="Удалить сиротские чанки и дубликаты")
+    args = parser.parse_args()
+
+    index_path = Path(args.index) if args.index else resolve_index_path()
+    if not index_path.exists():
+        print(f"Ошибка: Векторная база данных не найдена по пути {index_path}")
+        sys.exit(1)
+
+    client = chromadb.PersistentClient(path=str(index_path), settings=Settings(anonymized_telemetry=False))
+    collection = client.get_collection(name=COLLECTION_NAME)
+
+    print("=" * 60)
+    print("Проверка согласованности индекса")
+    print("=" * 60)
+    print(f"Индекс: {index_path}")
+    print(f"Чанков: {collection.count()}")
+    print()
+
+    problems = check_collection(collection, Path(args.knowledge_base))
+    titles = {
+        "duplicates": "Дубликаты (лишние копии чанков)",
+        "orphaned": "Сиротские чанки",
+        "incomplete": "Документы с недостающими чанками",
+        "mismatched_ids": "ID не совпадают с содержимым",
+    }
+    for key, title in titles.items():
+        items = problems[key]
+        print(f"{'✗' if items else '✓'} {title}: {len(items)}")
+        for item in items[:EXAMPLES]:
+            print(f"    {item}")
+
+    if args.fix:
+        to_delete = problems["duplicates"] + problems["orphaned"]
+        delete_ids(collection, to_delete)
+        print()
+        print(f"Удалено чанков: {len(to_delete)}, осталось: {collection.count()}")
+        deleted = set(to_delete)
+        remaining = problems["incomplete"] + [item for item in problems["mismatched_ids"] if item not in deleted]
+        if remaining:
+            print("Недостающие чанки и ID прежнего вида исправит пересборка (build_index.py)")
+        sys.exit(1 if remaining else 0)
+
+    sys.exit(1 if any(problems.values()) else 0)
+
+
+if __name__ == "__main__":
+    main()
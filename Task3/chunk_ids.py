@@ -0,0 +1,124 @@
+"""
+Детерминированные ID чанков и сравнение чанков с содержимым индекса.
+
+ID чанка зависит только от документа, позиции чанка в нем и текста:
+    <имя файла>:<номер чанка>:<первые 16 символов SHA-256 текста>
+Имя файла, а не абсолютный путь (source), чтобы ID не зависели от расположения
+проекта. Один и тот же чанк получает один и тот же ID при любой сборке, поэтому
+все, кто пишут в индекс, используют upsert, а сборка и обновление сравнивают
+множества ID (IndexDiff) и записывают только изменившиеся чанки.
+"""
+
+import json
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+ID_HASH_LENGTH = 16
+PAGE_SIZE = 5000  # Чанков в одном запросе collection.get()
+# Поля, которые не входят в хеш метаданных: source - абсолютный путь, он меняется
+# при переносе проекта, и иначе все чанки индекса считались бы обновленными
+DIGEST_EXCLUDED_KEYS = {"source"}
+
+
+def text_digest(text: str) -> str:
+    """Хеш текста чанка для ID."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:ID_HASH_LENGTH]
+
+
+def chunk_id(filename: str, chunk_index: int, text: str) -> str:
+    """ID чанка по документу, номеру чанка и тексту."""
+    return f"{filename}:{chunk_index}:{text_digest(text)}"
+
+
+def parse_chunk_id(value: str) -> Optional[Tuple[str, int, str]]:
+    """(имя файла, номер чанка, хеш текста) или None для ID другого вида (например, chunk_5)."""
+    parts = value.rsplit(":", 2)
+    if len(parts) != 3 or not parts[1].isdigit() or len(parts[2]) != ID_HASH_LENGTH:
+        return None
+    return parts[0], int(parts[1]), parts[2]
+
+
+def metadata_digest(metadata: Dict) -> str:
+    """Хеш метаданных чанка: при равных ID метаданные обновляются, только если он изменился."""
+    metadata = {key: value for key, value in metadata.items() if key not in DIGEST_EXCLUDED_KEYS}
+    return hashlib.sha256(json.dumps(metadata, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def iter_collection(collection, include: Sequence[str] = ("metadatas",), where: Optional[Dict] = None,
+                    page_size: int = PAGE_SIZE) -> Iterator[Dict]:
+    """Читает коллекцию страницами по page_size: {"id", "metadata", "document"} для каждого чанка."""
+    offset = 0
+    while True:
+        page = collection.get(where=where, limit=page_size, offset=offset, include=list(include))
+        if not page["ids"]:
+            return
+        metadatas = page.get("metadatas") or [None] * len(page["ids"])
+        documents = page.get("documents") or [None] * len(page["ids"])
+        for item_id, metadata, document in zip(page["ids"], metadatas, documents):
+            yield {"id": item_id, "metadata": metadata, "document": document}
+        offset += len(page["ids"])
+
+
+def existing_chunks(collection, where: Optional[Dict] = None) -> Dict[str, str]:
+    """ID чанков коллекции (или ее части where) и хеши их метаданных."""
+    return {item["id"]: metadata_digest(item["metadata"] or {}) for item in iter_collection(collection, where=where)}
+
+
+def delete_ids(collection, ids: Iterable[str], page_size: int = PAGE_SIZE):
+    """Удаляет чанки по ID страницами по page_size."""
+    ids = list(ids)
+    for start in range(0, len(ids), page_size):
+        collection.delete(ids=ids[start:start + page_size])
+
+
+class IndexDiff:
+    """
+    Сравнение новых чанков с содержимым индекса:
+    - added - ID нет в индексе: нужны эмбеддинги и upsert;
+    - updated - ID есть, метаданные изменились: достаточно collection.update();
+    - unchanged - ID и метаданные совпадают: чанк не трогается;
+    - removed() - ID индекса, которых нет среди новых чанков.
+    """
+
+    def __init__(self, existing: Optional[Dict[str, str]] = None):
+        self.existing = existing or {}
+        self.seen = set()
+        self.added = 0
+        self.updated: List[Tuple[str, Dict]] = []
+        self.unchanged = 0
+
+    def classify(self, ids: Sequence[str], metadatas: Sequence[Dict]) -> List[int]:
+        """
+        Отмечает чанки как встреченные и возвращает номера новых (added).
+        Чанки с изменившимися метаданными копятся в updated.
+        """
+        new = []
+        for index, (item_id, metadata) in enumerate(zip(ids, metadatas)):
+            self.seen.add(item_id)
+            digest = self.existing.get(item_id)
+            if digest is None:
+                new.append(index)
+            elif digest != metadata_digest(metadata):
+                self.updated.append((item_id, metadata))
+            else:
+                self.unchanged += 1
+        self.added += len(new)
+        return new
+
+    def apply_updates(self, collection, page_size: int = PAGE_SIZE):
+        """Записывает изменившиеся метаданные."""
+        for start in range(0, len(self.updated), page_size):
+            page = self.updated[start:start + page_size]
+            collection.update(ids=[item_id for item_id, _ in page], metadatas=[metadata for _, metadata in page])
+
+    def removed(self) -> List[str]:
+        """ID индекса, которых нет среди новых чанков."""
+        return [item_id for item_id in self.existing if item_id not in self.seen]
+
+    def stats(self) -> Dict:
+        return {
+            "added": self.added,
+            "updated": len(self.updated),
+            "unchanged": self.unchanged,
+            "removed": len(self.removed()),
+        }
@@ -0,0 +1,127 @@
+"""
+Разбиение текста на чанки за один проход по строке.
+
+TextChunker дает те же чанки, что RecursiveCharacterTextSplitter из LangChain
+с параметрами индекса (separators, chunk_size, chunk_overlap, разделитель
+остается в начале следующего куска, пробелы по краям чанка обрезаются), но:
+- работает со смещениями в исходной строке: куски текста не копируются
+  (re.split, join) и не оборачиваются в Document с глубокой копией метаданных;
+- возвращает границы чанков (start, end), поэтому текст чанка можно взять
+  из документа только тогда, когда он нужен: text[start:end];
+- начало чанка известно точно, без поиска текста чанка (text.find) в документе.
+
+Совпадение с RecursiveCharacterTextSplitter и ускорение проверяются
+бенчмарком python -m benchmarks.bench_chunker.
+"""
+
+from bisect import bisect_left
+from typing import List, Sequence, Tuple
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEPARATORS = ["\n\n", "\n", ". ", " ", ""]
+
+
+class TextChunker:
+    """Рекурсивное разбиение по разделителям со смещениями вместо копий текста."""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                 separators: Sequence[str] = SEPARATORS):
+        if chunk_size <= 0:
+            raise ValueError(f"chunk_size должен быть больше 0, получено {chunk_size}")
+        if not 0 <= chunk_overlap <= chunk_size:
+            raise ValueError(f"chunk_overlap должен быть от 0 до chunk_size, получено {chunk_overlap}")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """Границы чанков текста: чанк i - text[start:end]."""
+        chunks: List[Tuple[int, int]] = []
+        self._split(text, 0, len(text), 0, chunks)
+        return chunks
+
+    def split_text(self, text: str) -> List[str]:
+        """Тексты чанков (как RecursiveCharacterTextSplitter.split_text)."""
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def _bounds(self, text: str, start: int, end: int, separator: str) -> List[int]:
+        """
+        Границы кусков text[start:end], разрезанного перед каждым вхождением
+        разделителя (разделитель остается в начале куска): начала кусков и end.
+        """
+        if not separator:
+            return list(range(start, end + 1))
+        bounds = [start]
+        find = text.find
+        step = len(separator)
+        position = find(separator, start, end)
+        while position != -1:
+            if position != start:
+                bounds.append(position)
+            position = find(separator, position + step, end)
+        bounds.append(end)
+        return bounds
+
+    def _split(self, text: str, start: int, end: int, level: int, chunks: List[Tuple[int, int]]):
+        # Первый разделитель, который встречается в тексте; следующие - для слишком длинных кусков
+        separator = self.separators[-1]
+        next_level = len(self.separators)
+        for index in range(level, len(self.separators)):
+            candidate = self.separators[index]
+            if not candidate:
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                next_level = index + 1
+                break
+
+        bounds = self._bounds(text, start, end, separator)
+        # Подряд идущие короткие куски сливаются в чанки, длинные разбиваются дальше
+        chunk_size = self.chunk_size
+        good_from = -1
+        for index in range(len(bounds) - 1):
+            if bounds[index + 1] - bounds[index] < chunk_size:
+                if good_from < 0:
+                    good_from = index
+                continue
+            if good_from >= 0:
+                self._merge(text, bounds, good_from, index, chunks)
+                good_from = -1
+            if next_level >= len(self.separators):
+                chunks.append((bounds[index], bounds[index + 1]))
+            else:
+                self._split(text, bounds[index], bounds[index + 1], next_level, chunks)
+        if good_from >= 0:
+            self._merge(text, bounds, good_from, len(bounds) - 1, chunks)
+
+    def _merge(self, text: str, bounds: List[int], first: int, last: int, chunks: List[Tuple[int, int]]):
+        """
+        Сливает куски first..last-1 (кусок i - text[bounds[i]:bounds[i + 1]])
+        в чанки до chunk_size символов с перекрытием до chunk_overlap, как
+        TextSplitter._merge_splits(). Куски идут подряд, поэтому текущий чанк -
+        отрезок bounds[head]..bounds[i], а его длина - разность границ.
+        """
+        chunk_size = self.chunk_size
+        chunk_overlap = self.chunk_overlap
+        head = first
+        for index in range(first, last):
+            piece_end = bounds[index + 1]
+            if head < index and piece_end - bounds[head] > chunk_size:
+                self._append_stripped(text, bounds[head], bounds[index], chunks)
+                # Из начала чанка убираются куски, пока не останется перекрытие
+                # и пока следующий кусок не поместится
+                threshold = max(bounds[index] - chunk_overlap, piece_end - chunk_size)
+                head = bisect_left(bounds, threshold, head, index)
+        self._append_stripped(text, bounds[head], bounds[last], chunks)
+
+    @staticmethod
+    def _append_stripped(text: str, start: int, end: int, chunks: List[Tuple[int, int]]):
+        """Добавляет чанк без пробельных символов по краям (пустой пропускается)."""
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            chunks.append((start, end))
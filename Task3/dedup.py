@@ -0,0 +1,184 @@
+"""
+Поиск почти дубликатов документов перед индексацией (MinHash + LSH).
+
+Документ представляется множеством шинглов (последовательностей из SHINGLE_SIZE слов),
+для множества вычисляется MinHash-сигнатура, а LSH по полосам сигнатуры
+находит пары-кандидаты без сравнения всех документов со всеми.
+Кандидаты с оценкой сходства Жаккара не ниже порога объединяются в кластеры;
+в индекс попадает один канонический документ кластера, остальные
+записываются в его метаданные как псевдонимы.
+"""
+
+import re
+import zlib
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+SHINGLE_SIZE = 5  # Слов в шингле
+NUM_PERM = 128  # Длина MinHash-сигнатуры
+LSH_BANDS = 16  # Полос LSH (NUM_PERM = LSH_BANDS * строк в полосе)
+DEDUP_THRESHOLD = 0.8  # Минимальное сходство Жаккара для почти дубликатов
+SEED = 1
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_BLOCK_SIZE = 4096  # Шинглов за один шаг (ограничивает память на больших документах)
+
+
+def _permutations(num_perm: int = NUM_PERM, seed: int = SEED) -> Tuple[np.ndarray, np.ndarray]:
+    """Коэффициенты хеш-функций вида (a * x + b) mod p."""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_PERM_A, _PERM_B = _permutations()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Возвращает множество хешей шинглов текста (без учета регистра и пунктуации)."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash_signature(shingle_hashes: set) -> np.ndarray:
+    """Вычисляет MinHash-сигнатуру множества шинглов."""
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    values = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+
+    for start in range(0, len(values), _BLOCK_SIZE):
+        block = values[start:start + _BLOCK_SIZE, np.newaxis]
+        # Переполнение uint64 при умножении допустимо: важна только детерминированность
+        with np.errstate(over="ignore"):
+            hashed = (block * _PERM_A + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+        np.minimum(signature, hashed.min(axis=0), out=signature)
+
+    return signature
+
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Оценка сходства Жаккара по двум сигнатурам."""
+    return float(np.mean(first == second))
+
+
+def lsh_candidates(signatures: List[np.ndarray], bands: int = LSH_BANDS) -> set:
+    """Находит пары документов, у которых совпадает хотя бы одна полоса сигнатуры."""
+    rows = NUM_PERM // bands
+    candidates = set()
+
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = {}
+        for index, signature in enumerate(signatures):
+            key = signature[band * rows:(band + 1) * rows].tobytes()
+            buckets.setdefault(key, []).append(index)
+
+        for members in buckets.values():
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    candidates.add((members[i], members[j]))
+
+    return candidates
+
+
+def find_duplicate_clusters(texts: List[str], threshold: float = DEDUP_THRESHOLD) -> List[List[int]]:
+    """
+    Группирует почти одинаковые тексты.
+
+    Returns:
+        Список кластеров (индексы текстов); кластеры из одного текста не возвращаются
+    """
+    return clusters_from_signatures([minhash_signature(shingles(text)) for text in texts], threshold)
+
+
+def clusters_from_signatures(signatures: List[np.ndarray], threshold: float = DEDUP_THRESHOLD) -> List[List[int]]:
+    """Группирует документы по готовым MinHash-сигнатурам (см. find_duplicate_clusters)."""
+    # Объединение кандидатов с достаточным сходством (система непересекающихся множеств)
+    parent = list(range(len(signatures)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    for i, j in lsh_candidates(signatures):
+        if estimate_similarity(signatures[i], signatures[j]) >= threshold:
+            parent[find(i)] = find(j)
+
+    clusters: Dict[int, List[int]] = {}
+    for index in range(len(signatures)):
+        clusters.setdefault(find(index), []).append(index)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+def deduplicate_documents(documents: List, threshold: float = DEDUP_THRESHOLD) -> Tuple[List, List[Dict]]:
+    """
+    Оставляет по одному документу из каждого кластера почти дубликатов.
+
+    Каноническим выбирается самый длинный документ кластера (при равенстве -
+    с меньшим именем файла). Имена файлов остальных записываются в его
+    метаданные "aliases" через запятую (ChromaDB хранит только скалярные значения).
+
+    Args:
+        documents: Документы LangChain с метаданными "filename"
+        threshold: Минимальное сходство Жаккара
+
+    Returns:
+        Кортеж (документы без дубликатов, описание кластеров)
+    """
+    clusters = find_duplicate_clusters([doc.page_content for doc in documents], threshold)
+
+    duplicates = set()
+    report = []
+    for members in clusters:
+        members.sort(key=lambda i: (-len(documents[i].page_content), documents[i].metadata["filename"]))
+        canonical, aliases = members[0], members[1:]
+        duplicates.update(aliases)
+
+        alias_names = [documents[i].metadata["filename"] for i in aliases]
+        documents[canonical].metadata["aliases"] = ",".join(alias_names)
+        report.append({"canonical": documents[canonical].metadata["filename"], "aliases": alias_names})
+
+    unique = [doc for index, doc in enumerate(documents) if index not in duplicates]
+    return unique, report
+
+
+def plan_deduplication(
+    entries: Iterable[Tuple[str, str]],
+    threshold: float = DEDUP_THRESHOLD
+) -> Tuple[Dict[str, List[str]], List[Dict]]:
+    """
+    Находит почти дубликаты, не держа тексты в памяти: для каждого документа
+    сохраняются только имя, длина и сигнатура (NUM_PERM чисел).
+    Канонический документ выбирается так же, как в deduplicate_documents().
+
+    Args:
+        entries: Пары (имя файла, текст), например, читаемые с диска по одному
+        threshold: Минимальное сходство Жаккара
+
+    Returns:
+        Кортеж ({канонический файл: [файлы-дубликаты]}, описание кластеров)
+    """
+    names = []
+    lengths = []
+    signatures = []
+    for name, text in entries:
+        names.append(name)
+        lengths.append(len(text))
+        signatures.append(minhash_signature(shingles(text)))
+
+    aliases = {}
+    report = []
+    for members in clusters_from_signatures(signatures, threshold):
+        members.sort(key=lambda i: (-lengths[i], names[i]))
+        canonical = names[members[0]]
+        aliases[canonical] = [names[i] for i in members[1:]]
+        report.append({"canonical": canonical, "aliases": aliases[canonical]})
+    return aliases, report
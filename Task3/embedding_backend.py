@@ -0,0 +1,222 @@
+"""
+Выбор реализации модели эмбеддингов: PyTorch или ONNX Runtime.
+
+- torch      - SentenceTransformer (как раньше);
+- onnx       - трансформер модели, экспортированный в ONNX, в onnxruntime;
+- onnx-int8  - то же с динамической квантизацией весов в int8.
+
+Модель экспортируется при первом использовании в onnx_models/<модель>/ вместе
+с токенизатором и параметрами пулинга (CLS или среднее, нормализация), взятыми
+из SentenceTransformer, поэтому эмбеддинги совпадают с PyTorch с точностью
+до погрешности вычислений (проверяется check_backend_parity.py).
+Все реализации имеют метод encode(), совместимый с SentenceTransformer.encode().
+"""
+
+import os
+import re
+import json
+import inspect
+from pathlib import Path
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+
+try:
+    import onnxruntime
+except ImportError:  # onnxruntime нужен только для бэкендов onnx и onnx-int8
+    onnxruntime = None
+
+TORCH = "torch"
+ONNX = "onnx"
+ONNX_INT8 = "onnx-int8"
+BACKENDS = [TORCH, ONNX, ONNX_INT8]
+DEFAULT_BACKEND = TORCH
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+ONNX_MODELS_DIR = SCRIPT_DIR / "onnx_models"
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+CONFIG_FILE = "embedding_config.json"
+ONNX_OPSET = 14
+
+
+def cache_model_name(model_name: str, backend: str) -> str:
+    """
+    Имя модели для кеша эмбеддингов: векторы разных бэкендов немного
+    отличаются, поэтому хранятся раздельно.
+    """
+    return model_name if backend == TORCH else f"{model_name}@{backend}"
+
+
+def model_dir(model_name: str, onnx_dir: Path = ONNX_MODELS_DIR) -> Path:
+    """Папка экспортированной модели."""
+    return onnx_dir / re.sub(r"[^\w.-]", "_", model_name)
+
+
+def pooling_mode(pooling) -> str:
+    """Режим пулинга модуля Pooling (у sentence-transformers до 5.x - get_pooling_mode_str())."""
+    if hasattr(pooling, "get_pooling_mode_str"):
+        return pooling.get_pooling_mode_str()
+    return pooling.pooling_mode
+
+
+def export_onnx(model_name: str, out_dir: Path, quantize: bool = False) -> Path:
+    """
+    Экспортирует трансформер SentenceTransformer в ONNX (динамические размеры
+    батча и длины), сохраняет токенизатор и параметры пулинга.
+    С quantize=True дополнительно создает версию с весами int8.
+
+    Returns:
+        Путь к файлу модели (квантизованной, если quantize=True)
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model_path = out_dir / MODEL_FILE
+    if not model_path.exists():
+        st_model = SentenceTransformer(model_name, device="cpu")
+        transformer = st_model[0]
+        pooling = next(module for module in st_model if isinstance(module, Pooling))
+        config = {
+            "model": model_name,
+            "pooling": pooling_mode(pooling),
+            "normalize": any(isinstance(module, Normalize) for module in st_model),
+            "max_seq_length": st_model.max_seq_length,
+        }
+        if config["pooling"] not in ("cls", "mean"):
+            raise ValueError(f"Пулинг {config['pooling']} не поддерживается экспортом в ONNX")
+
+        transformer.tokenizer.save_pretrained(str(out_dir))
+        sample = transformer.tokenizer(["sample text"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        class HiddenStates(torch.nn.Module):
+            """Трансформер с входами по именам и одним выходом last_hidden_state."""
+
+            def __init__(self, auto_model):
+                super().__init__()
+                self.auto_model = auto_model
+
+            def forward(self, *inputs):
+                return self.auto_model(**dict(zip(input_names, inputs)), return_dict=True).last_hidden_state
+
+        wrapped = HiddenStates(transformer.auto_model).eval()
+        tmp_path = model_path.with_suffix(f".{os.getpid()}.tmp")
+        # С PyTorch 2.9 по умолчанию экспорт через dynamo (нужен onnxscript);
+        # прежний экспорт через TorchScript сам понимает dynamic_axes
+        export_options = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_options["dynamo"] = False
+        with torch.no_grad():
+            torch.onnx.export(
+                wrapped,
+                tuple(sample[name] for name in input_names),
+                str(tmp_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                **export_options
+            )
+        tmp_path.replace(model_path)
+        with open(out_dir / CONFIG_FILE, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+
+    if not quantize:
+        return model_path
+
+    quantized_path = out_dir / QUANTIZED_MODEL_FILE
+    if not quantized_path.exists():
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        tmp_path = quantized_path.with_suffix(f".{os.getpid()}.tmp")
+        quantize_dynamic(str(model_path), str(tmp_path), weight_type=QuantType.QInt8)
+        tmp_path.replace(quantized_path)
+    return quantized_path
+
+
+class OnnxEmbeddingModel:
+    """Модель эмбеддингов в onnxruntime с тем же пулингом, что у SentenceTransformer."""
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: Optional[int] = None,
+                 onnx_dir: Path = ONNX_MODELS_DIR):
+        if onnxruntime is None:
+            raise ImportError("Для бэкендов onnx и onnx-int8 установите пакет onnxruntime")
+        from transformers import AutoTokenizer
+
+        directory = model_dir(model_name, onnx_dir)
+        model_path = export_onnx(model_name, directory, quantize)
+        with open(directory / CONFIG_FILE, "r", encoding="utf-8") as f:
+            config = json.load(f)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(str(directory))
+        self.pooling = config["pooling"]
+        self.normalize = config["normalize"]
+        self.max_seq_length = config["max_seq_length"]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_seq_length,
+                                return_tensors="np")
+        feed = {name: inputs[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        if self.pooling == "cls":
+            embeddings = hidden[:, 0]
+        else:
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            embeddings = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32)
+
+    def encode(self, sentences: Union[str, Sequence[str]], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True) -> np.ndarray:
+        """Эмбеддинги текста (вектор) или списка текстов (матрица), как SentenceTransformer.encode()."""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        # Как SentenceTransformer: батчи из текстов близкой длины
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        embeddings = None
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            result = self._encode_batch([texts[i] for i in batch])
+            if embeddings is None:
+                embeddings = np.empty((len(texts), result.shape[1]), dtype=np.float32)
+            embeddings[batch] = result
+        if embeddings is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+def prepare_model(model_name: str, backend: str):
+    """Экспортирует модель в ONNX заранее (например, до запуска воркеров пула)."""
+    if backend in (ONNX, ONNX_INT8):
+        export_onnx(model_name, model_dir(model_name), quantize=backend == ONNX_INT8)
+
+
+def load_embedding_model(model_name: str, backend: str = DEFAULT_BACKEND, threads: Optional[int] = None,
+                         device: Optional[str] = None):
+    """
+    Загружает модель эмбеддингов выбранного бэкенда.
+
+    Args:
+        model_name: Название модели (например, BAAI/bge-base-en-v1.5)
+        backend: torch, onnx или onnx-int8
+        threads: Потоков вычислений для onnxruntime (None - по умолчанию)
+        device: Устройство для PyTorch (None - GPU, если есть)
+    """
+    if backend == TORCH:
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name, device=device)
+    if backend in (ONNX, ONNX_INT8):
+        return OnnxEmbeddingModel(model_name, quantize=backend == ONNX_INT8, threads=threads)
+    raise ValueError(f"Неизвестный бэкенд эмбеддингов: {backend} (допустимые: {', '.join(BACKENDS)})")
@@ -0,0 +1,193 @@
+"""
+Кеш эмбеддингов на диске.
+
+Ключ - модель эмбеддингов и SHA-256 нормализованного текста чанка, поэтому
+при пересборке индекса заново считаются только чанки, текст которых изменился.
+Векторы хранятся как float32 подряд в одном файле на модель
+(<папка кеша>/<модель>.f32) и читаются через np.memmap, а индекс SQLite
+(<папка кеша>/index.sqlite) хранит номер строки вектора для каждого ключа.
+Запись идет в транзакции SQLite, поэтому кеш можно использовать
+из нескольких процессов (build_index.py, Task5, Task6) одновременно.
+"""
+
+import re
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+CACHE_DIR = SCRIPT_DIR / "embedding_cache"
+INDEX_FILE = "index.sqlite"
+LOOKUP_BATCH_SIZE = 500  # Ключей в одном запросе SELECT ... IN (...)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+"""
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст для ключа кеша: Unicode NFC и пробельные символы,
+    сжатые до одного пробела. Токенизатор BGE (WordPiece) не различает
+    виды и количество пробелов, поэтому эмбеддинг от этого не меняется.
+    """
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 нормализованного текста."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_file_name(model_name: str) -> str:
+    """Имя файла векторов модели (символы, недопустимые в именах файлов, заменяются)."""
+    return re.sub(r"[^\w.-]", "_", model_name) + ".f32"
+
+
+class EmbeddingCache:
+    """Кеш эмбеддингов одной модели."""
+
+    def __init__(self, model_name: str, cache_dir: Path = CACHE_DIR):
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.cache_dir / model_file_name(model_name)
+        self._connection = sqlite3.connect(str(self.cache_dir / INDEX_FILE), timeout=60, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self.hits = 0
+        self.misses = 0
+
+    def _model_info(self) -> Optional[tuple]:
+        return self._connection.execute(
+            "SELECT dim, rows FROM models WHERE model = ?", (self.model_name,)
+        ).fetchone()
+
+    def _mapped(self, rows_needed: int, dim: int) -> np.ndarray:
+        """Возвращает memmap файла векторов, переоткрывая его, если файл вырос."""
+        if self._vectors is None or self._vectors.shape[0] < rows_needed:
+            rows = self.vectors_path.stat().st_size // (dim * 4)
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, dim))
+        return self._vectors
+
+    def get_many(self, texts: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Возвращает найденные в кеше эмбеддинги: {хеш текста: вектор}."""
+        hashes = list({text_hash(text) for text in texts})
+        with self._lock:
+            info = self._model_info()
+            if info is None:
+                return {}
+            dim = info[0]
+
+            rows = {}
+            for start in range(0, len(hashes), LOOKUP_BATCH_SIZE):
+                batch = hashes[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self._connection.execute(
+                    f"SELECT text_hash, row FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    (self.model_name, *batch)
+                ).fetchall())
+            if not rows:
+                return {}
+
+            vectors = self._mapped(max(rows.values()) + 1, dim)
+            return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, texts: Sequence[str], embeddings: np.ndarray):
+        """Добавляет эмбеддинги в кеш (уже известные тексты пропускаются)."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        unique = {}
+        for text, vector in zip(texts, embeddings):
+            unique.setdefault(text_hash(text), vector)
+        if not unique:
+            return
+
+        with self._lock:
+            # BEGIN IMMEDIATE блокирует запись для других процессов до COMMIT,
+            # поэтому строки в файле векторов не пересекаются
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                info = self._model_info()
+                dim = embeddings.shape[1]
+                if info is not None and info[0] != dim:
+                    raise ValueError(f"Размер эмбеддингов {dim} не совпадает с кешем модели ({info[0]})")
+                rows = info[1] if info is not None else 0
+
+                existing = set()
+                keys = list(unique)
+                for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                    batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                    placeholders = ",".join("?" * len(batch))
+                    existing.update(row[0] for row in self._connection.execute(
+                        f"SELECT text_hash FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                        (self.model_name, *batch)
+                    ))
+                new_keys = [key for key in keys if key not in existing]
+
+                if new_keys:
+                    block = np.stack([unique[key] for key in new_keys])
+                    # Пишем с позиции rows: хвост от прерванной записи перезаписывается
+                    with open(self.vectors_path, "r+b" if self.vectors_path.exists() else "wb") as f:
+                        f.seek(rows * dim * 4)
+                        f.write(block.tobytes())
+                    self._connection.executemany(
+                        "INSERT INTO embeddings (model, text_hash, row) VALUES (?, ?, ?)",
+                        [(self.model_name, key, rows + i) for i, key in enumerate(new_keys)]
+                    )
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO models (model, dim, rows) VALUES (?, ?, ?)",
+                        (self.model_name, dim, rows + len(new_keys))
+                    )
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def encode(self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Возвращает эмбеддинги текстов в исходном порядке: найденные берутся
+        из кеша, остальные считаются encode_fn (один раз на уникальный текст)
+        и сохраняются в кеш.
+        """
+        cached = self.get_many(texts)
+        hashes = [text_hash(text) for text in texts]
+
+        missing = {}
+        for text, key in zip(texts, hashes):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            computed = np.asarray(encode_fn(list(missing.values())), dtype=np.float32)
+            self.put_many(list(missing.values()), computed)
+            cached.update(zip(missing, computed))
+
+        misses = sum(1 for key in hashes if key in missing)
+        self.hits += len(hashes) - misses
+        self.misses += misses
+        return np.stack([cached[key] for key in hashes]) if hashes else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> Dict:
+        """Счетчики попаданий и промахов за время работы."""
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    def close(self):
+        self._connection.close()
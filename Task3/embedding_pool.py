@@ -0,0 +1,110 @@
+"""
+Многопроцессная генерация эмбеддингов на CPU.
+
+Один процесс SentenceTransformer на CPU использует лишь часть ядер: PyTorch
+плохо масштабирует один батч BERT на много потоков. EmbeddingPool запускает
+N процессов-воркеров, в каждом своя копия модели (любого бэкенда из
+embedding_backend.py) и T потоков вычислений (torch.set_num_threads для PyTorch),
+делит тексты на шарды, раздает их воркерам и собирает эмбеддинги в исходном
+порядке. Метод encode() совместим с SentenceTransformer.encode(), поэтому пул
+подставляется вместо модели в create_embeddings() и update_index.py,
+а encode_batches() принимает уже сформированные батчи (token_batching.py).
+"""
+
+import os
+import multiprocessing
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from embedding_backend import DEFAULT_BACKEND, TORCH, load_embedding_model, prepare_model
+from token_batching import MAX_SEQ_LENGTH
+
+SHARD_SIZE = 32  # Максимум текстов в одном задании воркеру
+
+# Модель внутри процесса-воркера
+_worker_model = None
+
+
+def default_torch_threads(workers: int) -> int:
+    """Потоков PyTorch на воркер: ядра делятся поровну между воркерами."""
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def _init_worker(model_name: str, torch_threads: int, backend: str):
+    """Инициализация воркера: ограничение потоков и загрузка своей копии модели."""
+    global _worker_model
+    if backend == TORCH:
+        import torch
+        torch.set_num_threads(torch_threads)
+    _worker_model = load_embedding_model(model_name, backend, threads=torch_threads, device="cpu")
+
+
+def _encode_shard(args) -> np.ndarray:
+    texts, batch_size = args
+    return np.asarray(_worker_model.encode(
+        texts,
+        show_progress_bar=False,
+        batch_size=batch_size,
+        convert_to_numpy=True
+    ), dtype=np.float32)
+
+
+def shard_texts(texts: Sequence[str], workers: int, shard_size: int = SHARD_SIZE) -> List[List[str]]:
+    """
+    Делит тексты на шарды подряд: не больше shard_size текстов в шарде
+    и не меньше шардов, чем воркеров (чтобы небольшой батч занял все процессы).
+    """
+    size = max(1, min(shard_size, -(-len(texts) // workers)))
+    return [list(texts[start:start + size]) for start in range(0, len(texts), size)]
+
+
+class EmbeddingPool:
+    """Пул процессов с копиями модели эмбеддингов."""
+
+    def __init__(self, model_name: str, workers: int, torch_threads: Optional[int] = None,
+                 shard_size: int = SHARD_SIZE, backend: str = DEFAULT_BACKEND):
+        self.model_name = model_name
+        self.backend = backend
+        self.workers = workers
+        self.torch_threads = torch_threads or default_torch_threads(workers)
+        self.shard_size = shard_size
+        # Токенизатор в основном процессе нужен для батчей по бюджету токенов
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_seq_length = min(self.tokenizer.model_max_length, MAX_SEQ_LENGTH)
+        # Экспорт в ONNX один раз, а не одновременно в каждом воркере
+        prepare_model(model_name, backend)
+        # spawn: fork после инициализации PyTorch может зависнуть на его пулах потоков
+        context = multiprocessing.get_context("spawn")
+        self._pool = context.Pool(
+            processes=workers,
+            initializer=_init_worker,
+            initargs=(model_name, self.torch_threads, backend)
+        )
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True) -> np.ndarray:
+        """Эмбеддинги текстов (float32) в исходном порядке."""
+        if len(texts) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        shards = shard_texts(texts, self.workers, self.shard_size)
+        # imap отдает результаты в порядке шардов, даже если воркеры закончили в другом
+        results = self._pool.imap(_encode_shard, [(shard, batch_size) for shard in shards])
+        return np.vstack(list(results))
+
+    def encode_batches(self, batches: Sequence[Sequence[str]]) -> List[np.ndarray]:
+        """Кодирует каждый батч одним вызовом модели в одном из воркеров; результаты в порядке батчей."""
+        return list(self._pool.imap(_encode_shard, [(list(batch), len(batch)) for batch in batches]))
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            self._pool.terminate()
+        self.close()
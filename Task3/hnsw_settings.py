@@ -0,0 +1,63 @@
+"""
+Метрика расстояния и параметры графа HNSW коллекции индекса.
+
+Параметры задаются при создании коллекции и хранятся в ее метаданных
+(hnsw:space, hnsw:M, hnsw:construction_ef, hnsw:search_ef), поэтому
+индекс сам описывает, как он построен:
+- space - метрика: cosine (1 - косинусное сходство, по умолчанию; его ожидает
+  RELEVANCE_THRESHOLD в Task4), l2 (квадрат евклидова расстояния, метрика
+  ChromaDB по умолчанию и индексов до появления этих настроек) или ip (1 - скалярное произведение);
+- M - число связей у вершины графа: больше - выше recall, больше памяти и дольше сборка;
+- construction_ef - число кандидатов при построении графа: больше - точнее граф, дольше сборка;
+- search_ef - число кандидатов при поиске (не меньше top_k): больше - выше recall, медленнее запрос.
+
+Значения по умолчанию меняются переменными окружения INDEX_DISTANCE_METRIC,
+HNSW_M, HNSW_CONSTRUCTION_EF и HNSW_SEARCH_EF. Подобрать их по recall@k
+и задержке запросов помогает python -m benchmarks.bench_hnsw.
+"""
+
+import os
+from typing import Dict, Optional
+
+COSINE = "cosine"
+L2 = "l2"
+IP = "ip"
+DISTANCE_METRICS = (COSINE, L2, IP)
+DEFAULT_METRIC = L2  # Метрика коллекций без hnsw:space (ChromaDB по умолчанию)
+
+DISTANCE_METRIC = os.getenv("INDEX_DISTANCE_METRIC", COSINE)
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_CONSTRUCTION_EF = int(os.getenv("HNSW_CONSTRUCTION_EF", "100"))
+HNSW_SEARCH_EF = int(os.getenv("HNSW_SEARCH_EF", "64"))
+
+
+def hnsw_metadata(space: str = DISTANCE_METRIC, m: int = HNSW_M,
+                  construction_ef: int = HNSW_CONSTRUCTION_EF, search_ef: int = HNSW_SEARCH_EF) -> Dict:
+    """Метаданные коллекции с метрикой и параметрами HNSW."""
+    if space not in DISTANCE_METRICS:
+        raise ValueError(f"Неизвестная метрика {space!r}, доступны: {', '.join(DISTANCE_METRICS)}")
+    if m < 2 or construction_ef < 1 or search_ef < 1:
+        raise ValueError(f"Некорректные параметры HNSW: M={m}, construction_ef={construction_ef}, search_ef={search_ef}")
+    return {
+        "hnsw:space": space,
+        "hnsw:M": m,
+        "hnsw:construction_ef": construction_ef,
+        "hnsw:search_ef": search_ef,
+    }
+
+
+def collection_metric(collection) -> str:
+    """Метрика коллекции по ее метаданным."""
+    return (collection.metadata or {}).get("hnsw:space", DEFAULT_METRIC)
+
+
+def cosine_distance(distance: Optional[float], space: str) -> Optional[float]:
+    """
+    Расстояние ChromaDB в метрике space, пересчитанное в косинусное
+    для нормализованных эмбеддингов (BGE): у единичных векторов квадрат
+    евклидова расстояния равен 2 * (1 - cos), а 1 - скалярное произведение
+    совпадает с косинусным расстоянием.
+    """
+    if distance is None or space != L2:
+        return distance
+    return distance / 2
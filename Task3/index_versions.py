@@ -0,0 +1,431 @@
+"""
+Версии векторного индекса и переключение между ними (blue/green).
+
+build_index.py не удаляет работающий индекс: каждая сборка пишется в новую
+папку chroma_versions/<версия>/, проверяется набором запросов и только после
+этого становится текущей. Текущая версия записана в файле-указателе
+chroma_versions/current.json, который заменяется атомарно (os.replace), поэтому
+читатели видят либо старую, либо новую версию целиком. KEEP_VERSIONS
+предыдущих версий остаются на диске для мгновенного отката.
+
+Все, кто читает или дополняет индекс (Task4, Task5, Task6, Task7, test_search.py),
+находят его через resolve_index_path(). Пока ни одна версия не активирована,
+используется прежняя папка chroma_db/. RAG-движки держат подключение через
+IndexConnection: оно переключается на новую версию без перезапуска и не
+закрывает прежнюю, пока ее читают запросы других потоков.
+
+Запись в индекс идет под блокировкой IndexLock (файл chroma_versions/index.lock):
+build_index.py держит ее всю сборку, а Task5 и Task6 - пока дописывают текущую
+версию. Сборка не копирует наполовину записанную версию, а обновление, начатое
+во время сборки, дожидается активации новой версии и пишет уже в нее.
+
+Использование:
+    python index_versions.py                  # список версий
+    python index_versions.py --rollback       # вернуть предыдущую версию
+    python index_versions.py --promote <версия>
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+import chromadb
+from chromadb.config import Settings
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировка через msvcrt
+    fcntl = None
+    import msvcrt
+
+SCRIPT_DIR = Path(__file__).parent.absolute()
+VERSIONS_DIR = SCRIPT_DIR / "chroma_versions"
+LEGACY_INDEX_PATH = SCRIPT_DIR / "chroma_db"  # Индекс до появления версий
+MANIFEST_FILE = "current.json"
+KEEP_VERSIONS = int(os.getenv("INDEX_KEEP_VERSIONS", "3"))  # Предыдущих версий для отката
+LOCK_FILE = "index.lock"
+LOCK_POLL_SECONDS = 0.5  # Интервал повторных попыток блокировки в Windows
+INDEX_CHECK_SECONDS = float(os.getenv("INDEX_CHECK_SECONDS", "1"))  # Как часто читатели проверяют указатель
+
+# Проверка новой версии перед активацией
+VALIDATION_QUERIES = [
+    "What is the Force and how does it work?",
+    "Tell me about Luke Skywalker's training",
+    "What is a lightsaber and how is it constructed?",
+    "Who is Darth Vader and what is his story?",
+    "What is the Death Star?"
+]
+VALIDATION_TOP_K = 5
+VALIDATION_SAMPLE = 200  # Чанков, которые должны находиться по собственному эмбеддингу
+SELF_MATCH_DISTANCE = 1e-3  # Расстояние, при котором чанк считается найденным
+
+
+def read_manifest(versions_dir: Path = VERSIONS_DIR) -> Dict:
+    """Содержимое указателя ({}, если ни одна версия не активирована)."""
+    try:
+        with open(versions_dir / MANIFEST_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def current_version(versions_dir: Path = VERSIONS_DIR) -> Optional[str]:
+    """Имя текущей версии (None - используется прежняя папка chroma_db/)."""
+    return read_manifest(versions_dir).get("current")
+
+
+def resolve_index_path(versions_dir: Path = VERSIONS_DIR, legacy_path: Path = LEGACY_INDEX_PATH) -> Path:
+    """Папка текущей версии индекса."""
+    version = current_version(versions_dir)
+    return versions_dir / version if version else legacy_path
+
+
+def manifest_stamp(versions_dir: Path = VERSIONS_DIR) -> Optional[Tuple[int, int]]:
+    """Время изменения и inode указателя (None, если его нет): меняются при каждой активации."""
+    try:
+        stat = os.stat(versions_dir / MANIFEST_FILE)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino
+
+
+def close_client(client):
+    """Закрывает клиент ChromaDB и загруженный им индекс (close() есть в новых версиях ChromaDB)."""
+    if hasattr(client, "close"):
+        client.close()
+
+
+class IndexSnapshot:
+    """Открытая версия индекса: папка, клиент ChromaDB и коллекция."""
+
+    def __init__(self, path: Path, client, collection):
+        self.path = path
+        self.client = client
+        self.collection = collection
+        self.users = 0  # Запросов, которые сейчас читают эту версию
+        self.retired = False  # Текущей стала более новая версия
+
+
+class IndexConnection:
+    """
+    Подключение читателя (RAG-движки Task4 и Task5) к текущей версии индекса.
+
+    Указатель проверяется не чаще раза в check_interval секунд и только по времени
+    изменения файла. Когда build_index.py активирует новую версию, ее открывает один
+    поток, а запросы переключаются на нее атомарно. Прежняя версия закрывается после
+    того, как завершатся запросы, которые уже читают ее, поэтому переключение
+    не прерывает запросы других потоков.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        versions_dir: Path = VERSIONS_DIR,
+        legacy_path: Path = LEGACY_INDEX_PATH,
+        check_interval: float = INDEX_CHECK_SECONDS,
+        on_switch: Optional[Callable[[Path], None]] = None
+    ):
+        self.collection_name = collection_name
+        self.versions_dir = versions_dir
+        self.legacy_path = legacy_path
+        self.check_interval = check_interval
+        self.on_switch = on_switch
+        self._lock = threading.Lock()  # Текущая версия и счетчики запросов
+        self._refresh_lock = threading.Lock()  # Новую версию открывает один поток
+        self._stamp = manifest_stamp(versions_dir)
+        self._checked_at = time.monotonic()
+        self._snapshot = self._open(resolve_index_path(versions_dir, legacy_path))
+
+    @property
+    def path(self) -> Path:
+        """Папка текущей версии."""
+        return self._snapshot.path
+
+    def _open(self, path: Path) -> IndexSnapshot:
+        if not path.exists():
+            raise FileNotFoundError(
+                f"Векторная база данных не найдена по пути {path}. "
+                "Сначала запустите Task3/build_index.py для создания индекса."
+            )
+        print(f"Подключение к векторной базе данных ({path.name})...")
+        client = chromadb.PersistentClient(path=str(path), settings=Settings(anonymized_telemetry=False))
+        collection = client.get_collection(name=self.collection_name)
+        print(f"Коллекция '{self.collection_name}' загружена")
+        return IndexSnapshot(path, client, collection)
+
+    def refresh(self):
+        """Переключается на новую версию, если указатель изменился с прошлой проверки."""
+        if time.monotonic() - self._checked_at < self.check_interval:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            # Версию уже проверяет другой поток; этот запрос читает текущую
+            return
+        try:
+            self._checked_at = time.monotonic()
+            stamp = manifest_stamp(self.versions_dir)
+            if stamp == self._stamp:
+                return
+            path = resolve_index_path(self.versions_dir, self.legacy_path)
+            if path != self._snapshot.path:
+                try:
+                    snapshot = self._open(path)
+                except Exception as e:
+                    # Указатель проверяется снова через check_interval, запросы идут к прежней версии
+                    print(f"Не удалось подключиться к версии индекса {path.name}: {e}")
+                    return
+                with self._lock:
+                    previous, self._snapshot = self._snapshot, snapshot
+                    previous.retired = True
+                    close_previous = previous.users == 0
+                if close_previous:
+                    close_client(previous.client)
+                if self.on_switch is not None:
+                    self.on_switch(path)
+            self._stamp = stamp
+        finally:
+            self._refresh_lock.release()
+
+    @contextmanager
+    def collection(self) -> Iterator:
+        """
+        Коллекция текущей версии на время запроса. Версия, которую читает запрос,
+        не закрывается до его завершения, даже если текущей уже стала другая.
+        """
+        self.refresh()
+        with self._lock:
+            snapshot = self._snapshot
+            snapshot.users += 1
+        try:
+            yield snapshot.collection
+        finally:
+            with self._lock:
+                snapshot.users -= 1
+                close_snapshot = snapshot.retired and snapshot.users == 0
+            if close_snapshot:
+                close_client(snapshot.client)
+
+
+class IndexLock:
+    """
+    Блокировка записи в индекс между процессами (на время сборки или дописывания).
+    Если блокировку держит другой процесс, вызывается on_wait (например, чтобы
+    сообщить об ожидании), и процесс ждет ее освобождения.
+    """
+
+    def __init__(self, versions_dir: Path = VERSIONS_DIR, on_wait: Optional[Callable[[], None]] = None):
+        self.path = versions_dir / LOCK_FILE
+        self.on_wait = on_wait
+        self._file = None
+
+    def acquire(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        if not self._lock(blocking=False):
+            if self.on_wait is not None:
+                self.on_wait()
+            self._lock(blocking=True)
+
+    def release(self):
+        if self._file is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        else:
+            self._file.seek(0)
+            msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        self._file.close()
+        self._file = None
+
+    def _lock(self, blocking: bool) -> bool:
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+                return True
+            except BlockingIOError:
+                return False
+        while True:
+            try:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                if not blocking:
+                    return False
+                time.sleep(LOCK_POLL_SECONDS)
+
+    def __enter__(self) -> "IndexLock":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+def list_versions(versions_dir: Path = VERSIONS_DIR) -> List[str]:
+    """Версии на диске, от старых к новым."""
+    if not versions_dir.exists():
+        return []
+    return sorted(path.name for path in versions_dir.iterdir() if path.is_dir())
+
+
+def new_version_dir(versions_dir: Path = VERSIONS_DIR) -> Path:
+    """Создает пустую папку для новой версии (имя - время сборки)."""
+    versions_dir.mkdir(parents=True, exist_ok=True)
+    name = time.strftime("%Y%m%d-%H%M%S")
+    path = versions_dir / name
+    suffix = 1
+    while path.exists():
+        suffix += 1
+        path = versions_dir / f"{name}-{suffix}"
+    path.mkdir()
+    return path
+
+
+def discard_version(path: Path):
+    """Удаляет папку версии, которая не была активирована."""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def promote(version: str, versions_dir: Path = VERSIONS_DIR, keep: int = KEEP_VERSIONS,
+            info: Optional[Dict] = None) -> Dict:
+    """
+    Делает версию текущей: указатель записывается во временный файл и
+    заменяет прежний атомарно. Прежняя текущая версия становится первой
+    в списке предыдущих; версии сверх keep удаляются с диска.
+
+    Args:
+        version: Имя папки версии в versions_dir
+        keep: Сколько предыдущих версий хранить для отката
+        info: Сведения о версии для указателя (число чанков, результаты проверки)
+
+    Returns:
+        Новое содержимое указателя
+    """
+    if not (versions_dir / version).is_dir():
+        raise FileNotFoundError(f"Версия индекса не найдена: {versions_dir / version}")
+
+    manifest = read_manifest(versions_dir)
+    history = [name for name in [manifest.get("current")] + manifest.get("previous", [])
+               if name and name != version]
+    new_manifest = {
+        "current": version,
+        "previous": history[:keep],
+        "promoted_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "info": info if info is not None else manifest.get("versions_info", {}).get(version, {}),
+    }
+    # Сведения о версиях сохраняются, чтобы откат показывал, что возвращается
+    versions_info = {name: value for name, value in manifest.get("versions_info", {}).items()
+                     if name in history[:keep]}
+    versions_info[version] = new_manifest["info"]
+    new_manifest["versions_info"] = versions_info
+
+    tmp_path = versions_dir / f"{MANIFEST_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(new_manifest, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, versions_dir / MANIFEST_FILE)
+
+    # Удаляются только версии, выпавшие из истории: папки сборок, которые
+    # еще идут, в указатель не попадали и не затрагиваются
+    for name in history[keep:]:
+        discard_version(versions_dir / name)
+    return new_manifest
+
+
+def rollback(versions_dir: Path = VERSIONS_DIR, keep: int = KEEP_VERSIONS) -> Dict:
+    """Делает текущей последнюю предыдущую версию."""
+    previous = read_manifest(versions_dir).get("previous", [])
+    if not previous:
+        raise ValueError("Нет предыдущих версий индекса для отката")
+    return promote(previous[0], versions_dir, keep)
+
+
+def validate_index(collection, model, expected_count: int, queries: Sequence[str] = VALIDATION_QUERIES,
+                   top_k: int = VALIDATION_TOP_K, sample: int = VALIDATION_SAMPLE) -> Dict:
+    """
+    Проверяет собранную версию перед активацией:
+    - в коллекции ровно expected_count чанков;
+    - чанки выборки находятся по собственному эмбеддингу (индекс HNSW цел);
+    - каждый проверочный запрос возвращает top_k результатов с конечным расстоянием.
+
+    Returns:
+        {"passed": bool, "errors": [...], "count": ..., "self_match": ..., "queries": ...}
+    """
+    errors = []
+    count = collection.count()
+    if count != expected_count:
+        errors.append(f"в коллекции {count} чанков вместо {expected_count}")
+
+    self_match = 0.0
+    stored = collection.get(limit=sample, include=["embeddings"])
+    if len(stored["ids"]):
+        found = collection.query(query_embeddings=np.asarray(stored["embeddings"]).tolist(), n_results=1,
+                                 include=["distances"])
+        matched = sum(
+            1 for chunk_id, ids, distances in zip(stored["ids"], found["ids"], found["distances"])
+            if ids and (ids[0] == chunk_id or distances[0] <= SELF_MATCH_DISTANCE)
+        )
+        self_match = matched / len(stored["ids"])
+        if matched < len(stored["ids"]):
+            errors.append(f"по собственному эмбеддингу найдено {matched} из {len(stored['ids'])} чанков")
+
+    queries_passed = 0
+    if queries and count:
+        embeddings = np.asarray(model.encode(list(queries), convert_to_numpy=True), dtype=np.float32)
+        results = collection.query(query_embeddings=embeddings.tolist(), n_results=min(top_k, count),
+                                   include=["distances"])
+        for query, distances in zip(queries, results["distances"]):
+            if len(distances) == min(top_k, count) and all(np.isfinite(distances)):
+                queries_passed += 1
+            else:
+                errors.append(f"запрос '{query}' вернул {len(distances)} результатов")
+
+    return {
+        "passed": not errors,
+        "errors": errors,
+        "count": count,
+        "self_match": self_match,
+        "queries": len(queries),
+        "queries_passed": queries_passed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Версии векторного индекса")
+    parser.add_argument("--rollback", action="store_true", help="Вернуть предыдущую версию")
+    parser.add_argument("--promote", metavar="VERSION", help="Сделать версию текущей")
+    args = parser.parse_args()
+
+    if args.rollback or args.promote:
+        with IndexLock(on_wait=lambda: print("Индекс собирается или обновляется, ожидание...")):
+            manifest = rollback() if args.rollback else promote(args.promote)
+        print(f"✓ Текущая версия индекса: {manifest['current']}")
+        return
+
+    manifest = read_manifest()
+    if not manifest:
+        print(f"Версий индекса нет, используется {LEGACY_INDEX_PATH}")
+        return
+    print(f"Версии индекса в {VERSIONS_DIR}:")
+    for name in reversed(list_versions()):
+        if name == manifest["current"]:
+            mark = "* текущая"
+        elif name in manifest.get("previous", []):
+            mark = "  предыдущая"
+        else:
+            mark = "  не активирована"
+        info = manifest.get("versions_info", {}).get(name, {})
+        chunks = f", чанков: {info['chunks_count']}" if "chunks_count" in info else ""
+        print(f"{mark:<18} {name}{chunks}")
+
+
+if __name__ == "__main__":
+    main()
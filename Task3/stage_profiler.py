@@ -0,0 +1,176 @@
+"""
+Профиль этапов индексации: время, CPU, скорость и память.
+
+StageProfiler суммирует по этапам (загрузка, разбиение, модель, эмбеддинги,
+запись в ChromaDB и т.д.):
+- wall_seconds - время внутри этапа (без ожидания в очередях конвейера);
+- cpu_seconds - процессорное время потока, выполнявшего этап (потоки PyTorch
+  и процессы EmbeddingPool сюда не входят, они видны в общем cpu_seconds);
+- items и items_per_second - обработанные объекты (документы, чанки);
+- peak_rss_mb - пиковое потребление памяти процессом к концу этапа;
+- для эмбеддингов дополнительно tokens и tokens_per_second.
+Этапы потоковой индексации выполняются одновременно, поэтому сумма их времени
+больше общего времени сборки.
+
+С profile=True дополнительно собирается профиль cProfile всех потоков
+(основного и потоков конвейера), который сохраняет dump_profile().
+"""
+
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # resource есть только в Unix; на Windows память не измеряется
+    resource = None
+
+PROFILE_TOP = 40  # Функций в текстовой сводке профиля
+
+
+def peak_rss_mb(children: bool = False) -> Optional[float]:
+    """Пиковое потребление памяти процессом (или самым большим из дочерних) в МБ."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss в килобайтах в Linux и в байтах в macOS
+    return usage / 1024 / 1024 if sys.platform == "darwin" else usage / 1024
+
+
+class StageRecord:
+    """Счетчики одного вызова этапа: число объектов и дополнительные величины (tokens)."""
+
+    def __init__(self, items: int = 0):
+        self.items = items
+        self.values: Dict[str, float] = {}
+
+
+class StageProfiler:
+    """Сбор времени, CPU, скорости и памяти по этапам (потокобезопасно)."""
+
+    def __init__(self, profile: bool = False):
+        self.stages: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._start_cpu = time.process_time()
+        self._profiles: List[cProfile.Profile] = []
+        self._main_profile = None
+        if profile:
+            self._main_profile = cProfile.Profile()
+            self._main_profile.enable()
+
+    @property
+    def profiling(self) -> bool:
+        return self._main_profile is not None
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0) -> Iterator[StageRecord]:
+        """Замеряет вызов этапа; число объектов можно задать позже через record.items."""
+        record = StageRecord(items)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield record
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.thread_time() - cpu
+            rss = peak_rss_mb()
+            with self._lock:
+                stage = self.stages.setdefault(name, {"wall_seconds": 0.0, "cpu_seconds": 0.0, "calls": 0, "items": 0})
+                stage["wall_seconds"] += wall
+                stage["cpu_seconds"] += cpu
+                stage["calls"] += 1
+                stage["items"] += record.items
+                for key, value in record.values.items():
+                    stage[key] = stage.get(key, 0) + value
+                stage["peak_rss_mb"] = rss
+
+    @contextmanager
+    def thread_profile(self):
+        """Профиль cProfile потока конвейера (если профилирование включено)."""
+        if not self.profiling:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+: одновременно может работать только один профилировщик,
+            # и профиль основного потока уже включен
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._profiles.append(profile)
+
+    def report(self) -> Dict:
+        """Статистика этапов и всей работы для файла статистики."""
+        stages = {}
+        with self._lock:
+            for name, stage in self.stages.items():
+                stage = dict(stage)
+                wall = stage["wall_seconds"]
+                stage["items_per_second"] = stage["items"] / wall if wall else 0.0
+                if "tokens" in stage:
+                    stage["tokens_per_second"] = stage["tokens"] / wall if wall else 0.0
+                stages[name] = stage
+        return {
+            "stages": stages,
+            "total": {
+                "wall_seconds": time.perf_counter() - self._start_wall,
+                "cpu_seconds": time.process_time() - self._start_cpu,
+                "peak_rss_mb": peak_rss_mb(),
+                "peak_rss_children_mb": peak_rss_mb(children=True),
+            },
+        }
+
+    def dump_profile(self, path: Path) -> Optional[Path]:
+        """
+        Сохраняет профиль cProfile всех потоков в path (.prof, открывается
+        python -m pstats или snakeviz) и текстовую сводку рядом (.txt).
+        """
+        if not self.profiling:
+            return None
+        self._main_profile.disable()
+        stats = pstats.Stats(self._main_profile)
+        for profile in self._profiles:
+            stats.add(profile)
+        stats.dump_stats(str(path))
+        with open(path.with_suffix(".txt"), "w", encoding="utf-8") as f:
+            pstats.Stats(str(path), stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        return path
+
+
+def measure(profiler: Optional[StageProfiler], name: str, items: int = 0):
+    """profiler.stage(name, items) или замер, который ничего не записывает, если profiler=None."""
+    if profiler is None:
+        return nullcontext(StageRecord(items))
+    return profiler.stage(name, items)
+
+
+def profile_thread(profiler: Optional[StageProfiler]):
+    """profiler.thread_profile() или пустой контекст, если profiler=None."""
+    return profiler.thread_profile() if profiler is not None else nullcontext()
+
+
+def format_report(report: Dict) -> List[str]:
+    """Строки таблицы этапов для вывода в консоль или лог."""
+    lines = [f"{'Этап':<14}{'Время, с':>10}{'CPU, с':>9}{'Объектов':>10}{'Объектов/с':>12}{'Токенов/с':>11}{'RSS, МБ':>9}"]
+    for name, stage in report["stages"].items():
+        tokens = f"{stage['tokens_per_second']:.0f}" if "tokens_per_second" in stage else "-"
+        rss = f"{stage['peak_rss_mb']:.0f}" if stage.get("peak_rss_mb") is not None else "-"
+        lines.append(f"{name:<14}{stage['wall_seconds']:>10.2f}{stage['cpu_seconds']:>9.2f}{stage['items']:>10}"
+                     f"{stage['items_per_second']:>12.1f}{tokens:>11}{rss:>9}")
+    total = report["total"]
+    rss = f"{total['peak_rss_mb']:.0f}" if total["peak_rss_mb"] is not None else "-"
+    lines.append(f"{'всего':<14}{total['wall_seconds']:>10.2f}{total['cpu_seconds']:>9.2f}"
+                 f"{'':>10}{'':>12}{'':>11}{rss:>9}")
+    return lines
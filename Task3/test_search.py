@@ -8,13 +8,15 @@ from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
 
+from hnsw_settings import COSINE, collection_metric, cosine_distance
+from index_versions import resolve_index_path
 
 # Конфигурация
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
 
 # Определяем пути относительно текущего файла
 SCRIPT_DIR = Path(__file__).parent.absolute()
-CHROMA_DB_PATH = SCRIPT_DIR / "chroma_db"
+CHROMA_DB_PATH = resolve_index_path()  # Текущая версия индекса (index_versions.py)
 COLLECTION_NAME = "star_wars_knowledge_base"
 TOP_K = 3  # Количество результатов для каждого запроса
 
@@ -44,13 +46,14 @@ def search_query(query: str, collection, embedding_model, top_k: int = TOP_K):
     return results
 
 
-def format_results(results: dict, query: str):
+def format_results(results: dict, query: str, metric: str = COSINE):
     """
     Форматирует результаты поиска для вывода.
     
     Args:
         results: Результаты поиска из ChromaDB
         query: Исходный запрос
+        metric: Метрика расстояния коллекции (hnsw:space)
     """
     print("=" * 80)
     print(f"Запрос: {query}")
@@ -75,7 +78,11 @@ def format_results(results: dict, query: str):
         print(f"  Заголовок: {metadata['title']}")
         print(f"  Чанк: {metadata['chunk_index'] + 1}/{metadata['total_chunks']}")
         if distance is not None:
-            print(f"  Расстояние (косинусное): {distance:.4f}")
+            if metric == COSINE:
+                print(f"  Расстояние (косинусное): {distance:.4f}")
+            else:
+                print(f"  Расстояние ({metric}): {distance:.4f}, "
+                      f"косинусное: {cosine_distance(distance, metric):.4f}")
         print(f"  Текст чанка:")
         print(f"  {'-' * 76}")
         # Показываем первые 500 символов чанка
@@ -119,6 +126,8 @@ def test_search():
     # Получаем статистику
     count = collection.count()
     print(f"Всего чанков в индексе: {count}")
+    metric = collection_metric(collection)
+    print(f"Метрика расстояния: {metric}")
     print()
     
     # Примеры запросов для тестирования
@@ -136,7 +145,7 @@ def test_search():
     # Выполняем поиск для каждого запроса
     for query in test_queries:
         results = search_query(query, collection, embedding_model, TOP_K)
-        format_results(results, query)
+        format_results(results, query, metric)
         print()
     
     print("=" * 80)
@@ -0,0 +1,156 @@
+"""
+Батчи для модели эмбеддингов по бюджету токенов.
+
+SentenceTransformer.encode() сортирует тексты одного вызова по длине в символах
+и режет их на батчи по batch_size штук; каждый батч дополняется паддингом до
+самого длинного текста в нем. Чанки бывают от нескольких символов до CHUNK_SIZE,
+и батч коротких чанков того же размера, что и батч длинных, недогружает модель.
+
+BucketedEncoder сортирует тексты по длине в токенах и набирает батчи, пока
+<число текстов> x <длина самого длинного> не превысит бюджет TOKEN_BUDGET:
+длинных чанков в батче меньше, коротких - больше. Батч также закрывается, если
+следующий текст короче самого длинного больше чем на MAX_TEXT_PADDING, иначе
+в большой батч попадают тексты сильно разной длины. После кодирования
+эмбеддинги возвращаются в исходном порядке. Метод encode() совместим с
+SentenceTransformer.encode(), поэтому BucketedEncoder подставляется вместо модели.
+"""
+
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+TOKEN_BUDGET = 8192  # Токенов с паддингом в одном батче (32 чанка по 256 токенов)
+MAX_BATCH_SIZE = 256  # Максимум текстов в батче, даже очень коротких
+MAX_TEXT_PADDING = 0.2  # Максимальная доля паддинга у одного текста батча
+BASELINE_BATCH_SIZE = 32  # batch_size прежнего вызова model.encode() для сравнения
+MAX_SEQ_LENGTH = 512  # Максимальная длина входа BGE-base-en-v1.5 в токенах
+CHARS_PER_TOKEN = 4  # Оценка длины без токенизатора
+
+
+def token_lengths(texts: Sequence[str], tokenizer=None, max_length: int = MAX_SEQ_LENGTH) -> List[int]:
+    """
+    Длины текстов в токенах (со служебными токенами, с учетом обрезки до max_length).
+    Без токенизатора длина оценивается по числу символов.
+    """
+    if tokenizer is None:
+        return [min(max_length, len(text) // CHARS_PER_TOKEN + 2) for text in texts]
+    input_ids = tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=max_length)["input_ids"]
+    return [len(ids) for ids in input_ids]
+
+
+def plan_batches(
+    lengths: Sequence[int],
+    token_budget: int = TOKEN_BUDGET,
+    max_batch_size: int = MAX_BATCH_SIZE,
+    max_text_padding: float = MAX_TEXT_PADDING
+) -> List[List[int]]:
+    """
+    Делит тексты на батчи по бюджету токенов и близкой длине.
+
+    Returns:
+        Списки индексов текстов; первый текст каждого батча - самый длинный в нем
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batches = []
+    batch: List[int] = []
+    for index in order:
+        # Тексты идут по убыванию длины, поэтому паддинг батча - длина его первого текста
+        longest = lengths[batch[0]] if batch else lengths[index]
+        if batch and (len(batch) >= max_batch_size
+                      or (len(batch) + 1) * longest > token_budget
+                      or lengths[index] < longest * (1 - max_text_padding)):
+            batches.append(batch)
+            batch = []
+        batch.append(index)
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def padded_tokens(lengths: Sequence[int], batches: List[List[int]]) -> int:
+    """Токенов, которые обрабатывает модель (с паддингом до самого длинного в батче)."""
+    return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+
+def baseline_batches(texts: Sequence[str], batch_size: int = BASELINE_BATCH_SIZE) -> List[List[int]]:
+    """Батчи, как их формирует SentenceTransformer.encode(): по длине в символах, по batch_size штук."""
+    order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class BucketedEncoder:
+    """Обертка модели (или EmbeddingPool), кодирующая тексты батчами по бюджету токенов."""
+
+    def __init__(self, model, tokenizer=None, token_budget: int = TOKEN_BUDGET,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_length: Optional[int] = None):
+        self.model = model
+        self.tokenizer = tokenizer if tokenizer is not None else getattr(model, "tokenizer", None)
+        self.max_length = max_length or getattr(model, "max_seq_length", None) or MAX_SEQ_LENGTH
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.texts = 0
+        self.batches = 0
+        self.tokens = 0
+        self.padded_tokens = 0
+        self.baseline_padded_tokens = 0
+        self.encode_seconds = 0.0
+
+    def encode(self, texts: Sequence[str], batch_size: int = BASELINE_BATCH_SIZE, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True) -> np.ndarray:
+        """
+        Эмбеддинги текстов (float32) в исходном порядке. batch_size учитывается
+        только в статистике: размер батча определяется бюджетом токенов.
+        """
+        if len(texts) == 0:
+            return np.zeros((0, 0), dtype=np.float32)
+        lengths = token_lengths(texts, self.tokenizer, self.max_length)
+        batches = plan_batches(lengths, self.token_budget, self.max_batch_size)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+
+        start = time.perf_counter()
+        if hasattr(self.model, "encode_batches"):
+            # EmbeddingPool: батчи раздаются воркерам целиком
+            results = self.model.encode_batches(batch_texts)
+        else:
+            results = [
+                self.model.encode(items, batch_size=len(items), show_progress_bar=False, convert_to_numpy=True)
+                for items in batch_texts
+            ]
+        self.encode_seconds += time.perf_counter() - start
+
+        embeddings = None
+        for batch, result in zip(batches, results):
+            result = np.asarray(result, dtype=np.float32)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), result.shape[1]), dtype=np.float32)
+            embeddings[batch] = result
+
+        self.texts += len(texts)
+        self.batches += len(batches)
+        self.tokens += sum(lengths)
+        self.padded_tokens += padded_tokens(lengths, batches)
+        self.baseline_padded_tokens += padded_tokens(lengths, baseline_batches(texts, batch_size))
+        return embeddings
+
+    def stats(self) -> Dict:
+        """
+        Статистика батчей: доля паддинга при батчах по бюджету токенов и при
+        прежних батчах по batch_size, оценка ускорения (во сколько раз меньше
+        токенов обрабатывает модель) и измеренная скорость кодирования.
+        """
+        def ratio(padded: int) -> float:
+            return 1 - self.tokens / padded if padded else 0.0
+
+        return {
+            "token_budget": self.token_budget,
+            "texts": self.texts,
+            "batches": self.batches,
+            "tokens": self.tokens,
+            "padding_ratio": ratio(self.padded_tokens),
+            "baseline_padding_ratio": ratio(self.baseline_padded_tokens),
+            "estimated_speedup": self.baseline_padded_tokens / self.padded_tokens if self.padded_tokens else 1.0,
+            "encode_seconds": self.encode_seconds,
+            "texts_per_second": self.texts / self.encode_seconds if self.encode_seconds else 0.0,
+            "tokens_per_second": self.tokens / self.encode_seconds if self.encode_seconds else 0.0,
+        }
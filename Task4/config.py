@@ -10,6 +10,9 @@ from dotenv import load_dotenv
 # Пути
 SCRIPT_DIR = Path(__file__).parent.absolute()
 PROJECT_ROOT = SCRIPT_DIR.parent
+# Версии индекса Task3/build_index.py; текущая указана в chroma_versions/current.json
+# (Task3/index_versions.py). chroma_db - индекс до появления версий
+CHROMA_VERSIONS_PATH = PROJECT_ROOT / "Task3" / "chroma_versions"
 CHROMA_DB_PATH = PROJECT_ROOT / "Task3" / "chroma_db"
 
 # Загрузка переменных из .env файла
@@ -42,10 +45,18 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME", "star_wars_knowledge_base")
 
 # Модель эмбеддингов (должна совпадать с той, что использовалась при создании индекса)
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-base-en-v1.5")
+# Реализация модели для запросов: torch, onnx или onnx-int8 (Task3/embedding_backend.py).
+# Совпадение эмбеддингов с индексом проверяется Task3/check_backend_parity.py
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
 
 # Параметры поиска
 TOP_K = int(os.getenv("TOP_K", "3"))  # Количество релевантных чанков для извлечения
 
+# Нормализация запроса: оригинальные термины (например, "Darth Vader") заменяются
+# на названия из базы знаний тем же скомпилированным словарем, что и при её создании
+NORMALIZE_QUERY_TERMS = os.getenv("NORMALIZE_QUERY_TERMS", "false").lower() in ("1", "true", "yes")
+TERMS_MAP_PATH = Path(os.getenv("TERMS_MAP_PATH", str(PROJECT_ROOT / "Task2" / "terms_map.json")))
+
 # Параметры LLM (YandexGPT)
 YANDEX_API_KEY = os.getenv("YANDEX_API_KEY")
 YANDEX_FOLDER_ID = os.getenv("YANDEX_FOLDER_ID")
@@ -6,18 +6,20 @@
 from typing import List, Dict, Optional, Tuple
 from pathlib import Path
 import json
+import sys
 
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
 import requests
 
 from config import (
     CHROMA_DB_PATH,
+    CHROMA_VERSIONS_PATH,
     COLLECTION_NAME,
     EMBEDDING_MODEL,
+    EMBEDDING_BACKEND,
     TOP_K,
     RELEVANCE_THRESHOLD,
+    NORMALIZE_QUERY_TERMS,
+    TERMS_MAP_PATH,
     YANDEX_API_KEY,
     YANDEX_FOLDER_ID,
     YANDEX_MODEL,
@@ -25,6 +27,12 @@ from config import (
     YANDEX_MAX_TOKENS
 )
 
+# Модель эмбеддингов выбранного бэкенда (Task3/embedding_backend.py)
+sys.path.insert(0, str(Path(__file__).parent.parent / "Task3"))
+from embedding_backend import load_embedding_model
+from hnsw_settings import collection_metric, cosine_distance
+from index_versions import IndexConnection
+
 
 class RAGEngine:
     """
@@ -34,24 +42,23 @@ class RAGEngine:
     def __init__(self):
         """Инициализация RAG-движка."""
         # Загрузка модели эмбеддингов
-        print("Загрузка модели эмбеддингов...")
-        self.embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        print(f"Загрузка модели эмбеддингов ({EMBEDDING_BACKEND})...")
+        self.embedding_model = load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND)
         print("Модель эмбеддингов загружена")
         
-        # Подключение к ChromaDB
-        if not CHROMA_DB_PATH.exists():
-            raise FileNotFoundError(
-                f"Векторная база данных не найдена по пути {CHROMA_DB_PATH}. "
-                "Сначала запустите Task3/build_index.py для создания индекса."
-            )
-        
-        print("Подключение к векторной базе данных...")
-        self.client = chromadb.PersistentClient(
-            path=str(CHROMA_DB_PATH),
-            settings=Settings(anonymized_telemetry=False)
+        # Подключение к ChromaDB (текущая версия индекса); новая версия
+        # подхватывается без перезапуска (Task3/index_versions.py)
+        self.index = IndexConnection(
+            COLLECTION_NAME, CHROMA_VERSIONS_PATH, CHROMA_DB_PATH, on_switch=self._on_index_switch
         )
-        self.collection = self.client.get_collection(name=COLLECTION_NAME)
-        print(f"Коллекция '{COLLECTION_NAME}' загружена")
+        
+        # Словарь для нормализации запросов (скомпилированный terms_map.json из Task2)
+        self.query_replacer = None
+        if NORMALIZE_QUERY_TERMS:
+            sys.path.insert(0, str(Path(__file__).parent.parent / "Task2"))
+            from term_replacer import load_replacer
+            self.query_replacer = load_replacer(TERMS_MAP_PATH)
+            print(f"Нормализация запросов включена: {len(self.query_replacer.replacements)} терминов")
         
         # Инициализация LLM клиента (YandexGPT)
         self._init_llm()
@@ -59,6 +66,10 @@ class RAGEngine:
         # Few-shot примеры (извлекаются из базы при первом использовании)
         self.few_shot_examples: Optional[List[Tuple[str, str]]] = None
         
+    def _on_index_switch(self, index_path: Path):
+        """Few-shot примеры извлекаются заново из новой версии индекса."""
+        self.few_shot_examples = None
+    
     def _init_llm(self):
         """Инициализация клиента LLM (YandexGPT)."""
         if not YANDEX_API_KEY or not YANDEX_FOLDER_ID:
@@ -95,10 +106,11 @@ class RAGEngine:
             ).tolist()
             
             # Ищем релевантные чанки
-            results = self.collection.query(
-                query_embeddings=query_embedding,
-                n_results=1
-            )
+            with self.index.collection() as collection:
+                results = collection.query(
+                    query_embeddings=query_embedding,
+                    n_results=1
+                )
             
             if results["documents"] and len(results["documents"][0]) > 0:
                 doc = results["documents"][0][0]
@@ -137,22 +149,32 @@ class RAGEngine:
         Returns:
             Список словарей с найденными чанками и метаданными
         """
+        # Приводим оригинальные названия к названиям из базы знаний
+        if self.query_replacer is not None:
+            query = self.query_replacer.replace(query)
+        
         # Генерируем эмбеддинг для запроса
         query_embedding = self.embedding_model.encode(
             query, convert_to_numpy=False
         ).tolist()
         
         # Выполняем поиск
-        results = self.collection.query(
-            query_embeddings=query_embedding,
-            n_results=top_k
-        )
+        # Версия индекса, которую читает запрос, не закрывается до его завершения
+        with self.index.collection() as collection:
+            results = collection.query(
+                query_embeddings=query_embedding,
+                n_results=top_k
+            )
+            # RELEVANCE_THRESHOLD задан для косинусного расстояния, расстояния индексов
+            # с другой метрикой (hnsw:space) пересчитываются (Task3/hnsw_settings.py)
+            distance_metric = collection_metric(collection)
         
         # Форматируем результаты
         chunks = []
         if results["ids"] and len(results["ids"][0]) > 0:
             for i in range(len(results["ids"][0])):
                 distance = results["distances"][0][i] if "distances" in results else None
+                distance = cosine_distance(distance, distance_metric)
                 
                 # Проверяем релевантность
                 if distance is not None and distance > RELEVANCE_THRESHOLD:
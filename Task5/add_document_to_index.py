@@ -1,14 +1,17 @@
 """
 Скрипт для добавления отдельного документа в существующую векторную базу.
 Используется для добавления злонамеренного файла в базу знаний.
+
+Время, CPU, скорость и память по этапам (Task3/stage_profiler.py) сохраняются
+в add_document_stats.json; с PROFILE_INDEXING=1 рядом сохраняется профиль cProfile.
 """
 
+import os
 import sys
+import json
 from pathlib import Path
 from typing import List
 
-from sentence_transformers import SentenceTransformer
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import chromadb
 from chromadb.config import Settings
@@ -16,14 +19,26 @@ from tqdm import tqdm
 
 # Конфигурация (должна совпадать с Task3/build_index.py)
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, onnx или onnx-int8
 
 # Пути
 SCRIPT_DIR = Path(__file__).parent.absolute()
 PROJECT_ROOT = SCRIPT_DIR.parent
-CHROMA_DB_PATH = PROJECT_ROOT / "Task3" / "chroma_db"
 COLLECTION_NAME = "star_wars_knowledge_base"
+STATS_FILE = SCRIPT_DIR / "add_document_stats.json"
+PROFILE_FILE = STATS_FILE.with_name("add_document_profile.prof")
+PROFILE_INDEXING = os.getenv("PROFILE_INDEXING", "false").lower() in ("1", "true", "yes")
+
+# Общий с Task3/build_index.py кеш эмбеддингов; чанки и их метаданные
+# строятся функциями build_index.py, как при сборке индекса
+sys.path.insert(0, str(PROJECT_ROOT / "Task3"))
+import build_index
+from chunk_ids import IndexDiff, delete_ids, existing_chunks
+from embedding_backend import cache_model_name, load_embedding_model
+from embedding_cache import EmbeddingCache
+from index_versions import IndexLock, resolve_index_path
+from stage_profiler import StageProfiler, format_report
+from token_batching import BucketedEncoder
 
 
 def load_single_document(file_path: Path) -> Document:
@@ -67,22 +82,8 @@ def split_document(doc: Document) -> List[Document]:
     Returns:
         Список чанков с метаданными
     """
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    
-    chunks = text_splitter.split_documents([doc])
-    
-    # Добавляем метаданные о позиции чанка
-    for chunk_index, chunk in enumerate(chunks):
-        chunk.metadata["chunk_id"] = f"malicious_{chunk_index}"
-        chunk.metadata["chunk_index"] = chunk_index
-        chunk.metadata["total_chunks"] = len(chunks)
-    
-    return chunks
+    # Те же чанки, метаданные позиции (start_index) и ID, что у Task3/build_index.py
+    return build_index.split_document(doc, build_index.create_text_splitter())
 
 
 def add_document_to_index(file_path: Path):
@@ -97,96 +98,136 @@ def add_document_to_index(file_path: Path):
     print("=" * 60)
     print(f"Файл: {file_path}")
     print()
+    profiler = StageProfiler(profile=PROFILE_INDEXING)
     
-    # Проверка существования базы данных
-    if not CHROMA_DB_PATH.exists():
-        print(f"Ошибка: Векторная база данных не найдена по пути {CHROMA_DB_PATH}")
+    # Проверка существования базы данных (документ добавляется в текущую версию индекса)
+    index_path = resolve_index_path()
+    if not index_path.exists():
+        print(f"Ошибка: Векторная база данных не найдена по пути {index_path}")
         print("Сначала запустите Task3/build_index.py для создания индекса")
         return
     
     # 1. Загрузка документа
     print("Шаг 1: Загрузка документа...")
-    doc = load_single_document(file_path)
+    with profiler.stage("load", 1):
+        doc = load_single_document(file_path)
     print(f"Загружен документ: {doc.metadata['title']}")
     print(f"Размер: {len(doc.page_content)} символов")
     print()
     
     # 2. Разбиение на чанки
     print("Шаг 2: Разбиение документа на чанки...")
-    chunks = split_document(doc)
+    with profiler.stage("split") as stage:
+        chunks = split_document(doc)
+        stage.items = len(chunks)
     print(f"Создано чанков: {len(chunks)}")
     print()
     
     # 3. Загрузка модели эмбеддингов
     print("Шаг 3: Загрузка модели эмбеддингов...")
-    embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+    # Батчи по бюджету токенов (Task3/token_batching.py)
+    with profiler.stage("model_load"):
+        embedding_model = BucketedEncoder(load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND))
     print("Модель загружена")
     print()
     
     # 4. Генерация эмбеддингов
     print("Шаг 4: Генерация эмбеддингов...")
     texts = [chunk.page_content for chunk in chunks]
-    embeddings = embedding_model.encode(
-        texts,
-        show_progress_bar=True,
-        batch_size=32,
-        convert_to_numpy=True
-    )
+    cache = EmbeddingCache(cache_model_name(EMBEDDING_MODEL, EMBEDDING_BACKEND))
+    with profiler.stage("embed", len(texts)) as stage:
+        embeddings = cache.encode(texts, lambda missing: embedding_model.encode(
+            missing,
+            show_progress_bar=True,
+            batch_size=32,
+            convert_to_numpy=True
+        ))
+        stage.values["tokens"] = embedding_model.tokens
+    cache.close()
     
     if hasattr(embeddings, 'tolist'):
         embeddings = embeddings.tolist()
     else:
         embeddings = [emb.tolist() if hasattr(emb, 'tolist') else list(emb) for emb in embeddings]
     
-    print(f"Сгенерировано эмбеддингов: {len(embeddings)}")
+    print(f"Сгенерировано эмбеддингов: {len(embeddings)} (из кеша: {cache.hits})")
+    batching_stats = embedding_model.stats()
+    if batching_stats["texts"]:
+        print(f"Паддинг: {batching_stats['padding_ratio']:.1%} "
+              f"(при батчах по 32 чанка: {batching_stats['baseline_padding_ratio']:.1%})")
     print()
     
-    # 5. Подключение к существующей базе
-    print("Шаг 5: Подключение к векторной базе данных...")
-    client = chromadb.PersistentClient(
-        path=str(CHROMA_DB_PATH),
-        settings=Settings(anonymized_telemetry=False)
-    )
-    
-    # Получаем существующую коллекцию
-    try:
-        collection = client.get_collection(name=COLLECTION_NAME)
-        print(f"Коллекция '{COLLECTION_NAME}' найдена")
-    except Exception as e:
-        print(f"Ошибка: Коллекция '{COLLECTION_NAME}' не найдена")
-        print("Сначала запустите Task3/build_index.py для создания индекса")
-        return
-    
-    # Получаем текущее количество чанков для генерации уникальных ID
-    current_count = collection.count()
-    print(f"Текущее количество чанков в базе: {current_count}")
-    print()
-    
-    # 6. Добавление в базу
-    print("Шаг 6: Добавление чанков в индекс...")
-    ids = [f"chunk_{current_count + i}" for i in range(len(chunks))]
-    texts = [chunk.page_content for chunk in chunks]
-    metadatas = [
-        {
-            "source": chunk.metadata["source"],
-            "filename": chunk.metadata["filename"],
-            "title": chunk.metadata["title"],
-            "chunk_id": chunk.metadata["chunk_id"],
-            "chunk_index": chunk.metadata["chunk_index"],
-            "total_chunks": chunk.metadata["total_chunks"]
-        }
-        for chunk in chunks
-    ]
-    
-    collection.add(
-        ids=ids,
-        embeddings=embeddings,
-        documents=texts,
-        metadatas=metadatas
-    )
-    
-    print(f"Добавлено чанков: {len(ids)}")
-    print(f"Новое количество чанков в базе: {collection.count()}")
+    # 5-6. Запись под блокировкой индекса (Task3/index_versions.py): если идет
+    # сборка build_index.py, документ добавляется в активированную ею версию
+    with IndexLock(on_wait=lambda: print("Индекс собирается или обновляется другим процессом, ожидание...")):
+        # 5. Подключение к существующей базе
+        print("Шаг 5: Подключение к векторной базе данных...")
+        index_path = resolve_index_path()
+        client = chromadb.PersistentClient(
+            path=str(index_path),
+            settings=Settings(anonymized_telemetry=False)
+        )
+        
+        # Получаем существующую коллекцию
+        try:
+            collection = client.get_collection(name=COLLECTION_NAME)
+            print(f"Коллекция '{COLLECTION_NAME}' найдена")
+        except Exception as e:
+            print(f"Ошибка: Коллекция '{COLLECTION_NAME}' не найдена")
+            print("Сначала запустите Task3/build_index.py для создания индекса")
+            return
+        
+        print(f"Текущее количество чанков в базе: {collection.count()}")
+        print()
+        
+        # 6. Добавление в базу
+        print("Шаг 6: Добавление чанков в индекс...")
+        ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [build_index.chunk_metadata(chunk) for chunk in chunks]
+        
+        # Повторное добавление того же файла не создает дубликатов: записываются
+        # только новые чанки, чанки прежней версии файла удаляются
+        with profiler.stage("diff", len(ids)):
+            diff = IndexDiff(existing_chunks(collection, where={"filename": doc.metadata["filename"]}))
+            new = diff.classify(ids, metadatas)
+        removed = diff.removed()
+        with profiler.stage("write", len(new) + len(diff.updated) + len(removed)):
+            if new:
+                collection.upsert(
+                    ids=[ids[i] for i in new],
+                    embeddings=[embeddings[i] for i in new],
+                    documents=[texts[i] for i in new],
+                    metadatas=[metadatas[i] for i in new]
+                )
+            diff.apply_updates(collection)
+            delete_ids(collection, removed)
+        
+        changes = diff.stats()
+        print(f"Добавлено чанков: {changes['added']} (уже были в индексе: {changes['unchanged'] + changes['updated']}, "
+              f"удалено устаревших: {changes['removed']})")
+        print(f"Новое количество чанков в базе: {collection.count()}")
+        print()
+    
+    # Время, CPU, скорость и память по этапам
+    profile = profiler.report()
+    for line in format_report(profile):
+        print(line)
+    stats = {
+        "file": str(file_path),
+        "chunks_count": len(chunks),
+        "index_path": str(index_path),
+        "index_changes": changes,
+        "embedding_cache": cache.stats(),
+        "embedding_batching": batching_stats,
+        "stages": profile["stages"],
+        "resources": profile["total"],
+    }
+    with open(STATS_FILE, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2, ensure_ascii=False)
+    print(f"Статистика сохранена в {STATS_FILE}")
+    if profiler.dump_profile(PROFILE_FILE):
+        print(f"Профиль cProfile сохранен в {PROFILE_FILE}")
     print()
     print("=" * 60)
     print("Документ успешно добавлен в векторную базу!")
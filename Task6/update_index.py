@@ -2,6 +2,9 @@
 Скрипт для автоматического обновления векторного индекса базы знаний.
 Сканирует источник данных, находит новые или измененные документы,
 обновляет векторную БД и логирует процесс.
+
+Время, CPU, скорость и память по этапам (Task3/stage_profiler.py) сохраняются
+в JSON результата; с PROFILE_INDEXING=1 рядом сохраняется профиль cProfile.
 """
 
 import os
@@ -14,8 +17,6 @@ from pathlib import Path
 from typing import List, Dict, Set, Tuple
 from hashlib import md5
 
-from sentence_transformers import SentenceTransformer
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 import chromadb
 from chromadb.config import Settings
@@ -25,18 +26,35 @@ from tqdm import tqdm
 # Конфигурация
 EMBEDDING_MODEL = "BAAI/bge-base-en-v1.5"
 EMBEDDING_SIZE = 768
-CHUNK_SIZE = 1000
-CHUNK_OVERLAP = 200
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch, onnx или onnx-int8 (Task3/embedding_backend.py)
+# Процессов с копией модели (1 - модель в текущем процессе) и потоков PyTorch в каждом (0 - ядра поровну)
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_TORCH_THREADS = int(os.getenv("EMBEDDING_TORCH_THREADS", "0"))
+# Профиль cProfile обновления рядом с JSON результата
+PROFILE_INDEXING = os.getenv("PROFILE_INDEXING", "false").lower() in ("1", "true", "yes")
 
 # Пути
 SCRIPT_DIR = Path(__file__).parent.absolute()
 PROJECT_ROOT = SCRIPT_DIR.parent
 KNOWLEDGE_BASE_PATH = PROJECT_ROOT / "Task2" / "knowledge_base"
-CHROMA_DB_PATH = PROJECT_ROOT / "Task3" / "chroma_db"
 COLLECTION_NAME = "star_wars_knowledge_base"
 LOG_DIR = SCRIPT_DIR / "logs"
 STATE_FILE = SCRIPT_DIR / "update_state.json"  # Файл для отслеживания обработанных файлов
 
+# Общий с Task3/build_index.py кеш эмбеддингов: при изменении файла
+# пересчитываются только чанки, текст которых изменился. Чанки и их метаданные
+# строятся функциями build_index.py, поэтому совпадают с собранным индексом
+sys.path.insert(0, str(PROJECT_ROOT / "Task3"))
+import build_index
+from chunk_ids import IndexDiff, delete_ids, existing_chunks
+from dedup import DEDUP_THRESHOLD, plan_deduplication
+from embedding_backend import cache_model_name, load_embedding_model
+from embedding_cache import EmbeddingCache
+from embedding_pool import EmbeddingPool
+from index_versions import IndexLock, resolve_index_path
+from stage_profiler import StageProfiler, format_report
+from token_batching import BucketedEncoder
+
 # Настройка логирования
 LOG_DIR.mkdir(exist_ok=True)
 LOG_FILE = LOG_DIR / f"update_index_{datetime.now().strftime('%Y%m%d')}.log"
@@ -77,14 +95,29 @@ def save_state(state: Dict):
 
 
 def get_file_hash(file_path: Path) -> str:
-    """Вычисляет MD5 хеш файла."""
+    """
+    Вычисляет MD5 хеш файла вместе с его метаданными <имя>.meta.json:
+    изменение метаданных тоже требует обновить чанки документа.
+    """
     hash_md5 = md5()
-    with open(file_path, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
-            hash_md5.update(chunk)
+    for path in document_files(file_path):
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(4096), b""):
+                hash_md5.update(chunk)
     return hash_md5.hexdigest()
 
 
+def get_file_mtime(file_path: Path) -> float:
+    """Время последнего изменения документа или его метаданных."""
+    return max(path.stat().st_mtime for path in document_files(file_path))
+
+
+def document_files(file_path: Path) -> List[Path]:
+    """Файл документа и, если есть, файл его метаданных <имя>.meta.json (Task3/build_index.py)."""
+    meta_path = file_path.with_suffix(build_index.META_SUFFIX)
+    return [file_path, meta_path] if meta_path.exists() else [file_path]
+
+
 def find_new_or_modified_files(knowledge_base_path: Path, state: Dict) -> List[Tuple[Path, bool]]:
     """
     Находит новые или измененные файлы.
@@ -96,14 +129,15 @@ def find_new_or_modified_files(knowledge_base_path: Path, state: Dict) -> List[T
         logger.error(f"База знаний не найдена: {knowledge_base_path}")
         return []
     
-    txt_files = list(knowledge_base_path.glob("*.txt"))
+    # Только тексты документов: <имя>.meta.json учитываются вместе со своим документом
+    txt_files = build_index.list_documents(knowledge_base_path)
     new_or_modified = []
     processed_files = state.get("processed_files", {})
     
     for file_path in txt_files:
         filename = file_path.name
         current_hash = get_file_hash(file_path)
-        current_mtime = file_path.stat().st_mtime
+        current_mtime = get_file_mtime(file_path)
         
         if filename not in processed_files:
             # Новый файл
@@ -121,20 +155,26 @@ def find_new_or_modified_files(knowledge_base_path: Path, state: Dict) -> List[T
 
 
 def load_document(file_path: Path) -> Document:
-    """Загружает документ из файла."""
+    """
+    Загружает документ из файла с метаданными из <имя>.meta.json
+    (page_offsets, source_path, source_type и т.д.), как Task3/build_index.py.
+    """
     try:
         with open(file_path, "r", encoding="utf-8") as f:
             content = f.read()
         
         title = file_path.stem.replace("_", " ")
         
+        metadata = {
+            "source": str(file_path),
+            "filename": file_path.name,
+            "title": title
+        }
+        metadata.update(build_index.load_sidecar_metadata(file_path))
+        
         doc = Document(
             page_content=content,
-            metadata={
-                "source": str(file_path),
-                "filename": file_path.name,
-                "title": title
-            }
+            metadata=metadata
         )
         return doc
     except Exception as e:
@@ -142,54 +182,60 @@ def load_document(file_path: Path) -> Document:
         raise
 
 
-def split_document(doc: Document) -> List[Document]:
-    """Разбивает документ на чанки."""
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
-    
-    chunks = text_splitter.split_documents([doc])
-    
-    # Добавляем метаданные о позиции чанка
-    for chunk_index, chunk in enumerate(chunks):
-        chunk.metadata["chunk_index"] = chunk_index
-        chunk.metadata["total_chunks"] = len(chunks)
+def find_duplicates(paths: List[Path]) -> Tuple[Dict[str, str], Dict[str, str], List[Dict]]:
+    """
+    Ищет почти дубликаты во всей базе знаний (Task3/dedup.py), как build_index.py:
+    новый файл сравнивается не только с другими новыми, но и с уже проиндексированными.
     
-    return chunks
+    Returns:
+        Кортеж ({дубликат: канонический файл}, {канонический файл: "дубликат1,дубликат2"},
+        описание кластеров)
+    """
+    plan, clusters = plan_deduplication(build_index.read_texts(paths), DEDUP_THRESHOLD)
+    duplicate_of = {name: canonical for canonical, names in plan.items() for name in names}
+    aliases = {canonical: ",".join(names) for canonical, names in plan.items()}
+    return duplicate_of, aliases, clusters
 
 
-def remove_old_chunks_for_file(collection, filename: str):
-    """Удаляет старые чанки для файла из индекса."""
-    try:
-        # Получаем все чанки с данным filename
-        results = collection.get(
-            where={"filename": filename}
-        )
-        
-        if results and len(results["ids"]) > 0:
-            collection.delete(ids=results["ids"])
-            logger.info(f"Удалено {len(results['ids'])} старых чанков для файла {filename}")
-            return len(results["ids"])
-    except Exception as e:
-        logger.warning(f"Ошибка при удалении старых чанков для {filename}: {e}")
-    
-    return 0
+def find_cluster_changes(
+    paths: List[Path],
+    state: Dict,
+    files_to_process: List[Tuple[Path, bool]],
+    duplicate_of: Dict[str, str],
+    aliases: Dict[str, str]
+) -> List[Tuple[Path, bool]]:
+    """
+    Неизменившиеся файлы, у которых изменилась роль в кластере дубликатов:
+    файл стал или перестал быть дубликатом, или у канонического документа
+    изменился список дубликатов (метаданные "aliases" его чанков).
+    """
+    queued = {file_path.name for file_path, _ in files_to_process}
+    changed = []
+    for file_path in paths:
+        info = state.get("processed_files", {}).get(file_path.name)
+        if file_path.name in queued or info is None:
+            continue
+        if (info.get("duplicate_of") != duplicate_of.get(file_path.name)
+                or info.get("aliases", "") != aliases.get(file_path.name, "")):
+            changed.append((file_path, False))
+            logger.info(f"Изменился кластер дубликатов файла: {file_path.name}")
+    return changed
 
 
 def update_index():
     """Основная функция обновления индекса."""
     start_time = time.time()
     start_datetime = datetime.now()
+    profiler = StageProfiler(profile=PROFILE_INDEXING)
     
     logger.info("=" * 60)
     logger.info("Начало обновления векторного индекса")
     logger.info("=" * 60)
     logger.info(f"Время запуска: {start_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"Источник данных: {KNOWLEDGE_BASE_PATH}")
-    logger.info(f"Векторная БД: {CHROMA_DB_PATH}")
+    # Обновляется текущая версия индекса (Task3/index_versions.py)
+    index_path = resolve_index_path()
+    logger.info(f"Векторная БД: {index_path}")
     logger.info("")
     
     # Проверка существования базы знаний
@@ -204,8 +250,8 @@ def update_index():
         }
     
     # Проверка существования векторной БД
-    if not CHROMA_DB_PATH.exists():
-        logger.error(f"Векторная БД не найдена: {CHROMA_DB_PATH}")
+    if not index_path.exists():
+        logger.error(f"Векторная БД не найдена: {index_path}")
         logger.error("Сначала запустите Task3/build_index.py для создания индекса")
         return {
             "success": False,
@@ -222,12 +268,26 @@ def update_index():
     logger.info("Сканирование источника данных...")
     files_to_process = find_new_or_modified_files(KNOWLEDGE_BASE_PATH, state)
     
+    # Почти дубликаты индексируются один раз, как в Task3/build_index.py
+    duplicate_of: Dict[str, str] = {}
+    aliases: Dict[str, str] = {}
+    duplicate_clusters = []
+    if files_to_process and build_index.DEDUPLICATE:
+        logger.info(f"Поиск почти дубликатов по базе знаний (порог сходства {DEDUP_THRESHOLD})...")
+        paths = build_index.list_documents(KNOWLEDGE_BASE_PATH)
+        with profiler.stage("dedup", len(paths)):
+            duplicate_of, aliases, duplicate_clusters = find_duplicates(paths)
+        logger.info(f"Найдено кластеров дубликатов: {len(duplicate_clusters)}")
+        for cluster in duplicate_clusters:
+            logger.info(f"  {cluster['canonical']} <- {', '.join(cluster['aliases'])}")
+        files_to_process += find_cluster_changes(paths, state, files_to_process, duplicate_of, aliases)
+    
     if not files_to_process:
         logger.info("Новых или измененных файлов не найдено")
         # Получаем текущий размер индекса
         try:
             client = chromadb.PersistentClient(
-                path=str(CHROMA_DB_PATH),
+                path=str(index_path),
                 settings=Settings(anonymized_telemetry=False)
             )
             collection = client.get_collection(name=COLLECTION_NAME)
@@ -253,9 +313,20 @@ def update_index():
     logger.info("")
     
     # Загрузка модели эмбеддингов
-    logger.info("Загрузка модели эмбеддингов...")
+    logger.info(f"Загрузка модели эмбеддингов ({EMBEDDING_BACKEND})...")
     try:
-        embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+        with profiler.stage("model_load"):
+            if EMBEDDING_WORKERS > 1:
+                embedding_model = EmbeddingPool(EMBEDDING_MODEL, EMBEDDING_WORKERS, EMBEDDING_TORCH_THREADS or None,
+                                                backend=EMBEDDING_BACKEND)
+                logger.info(f"Процессов с моделью: {embedding_model.workers}, "
+                            f"потоков вычислений в каждом: {embedding_model.torch_threads}")
+            else:
+                embedding_model = load_embedding_model(EMBEDDING_MODEL, EMBEDDING_BACKEND,
+                                                       EMBEDDING_TORCH_THREADS or None)
+        # Батчи по бюджету токенов (Task3/token_batching.py)
+        encoder = BucketedEncoder(embedding_model)
+        embedding_cache = EmbeddingCache(cache_model_name(EMBEDDING_MODEL, EMBEDDING_BACKEND))
         logger.info("Модель загружена")
     except Exception as e:
         logger.error(f"Ошибка при загрузке модели: {e}")
@@ -267,112 +338,151 @@ def update_index():
             "total_chunks": 0
         }
     
-    # Подключение к векторной БД
-    logger.info("Подключение к векторной БД...")
-    try:
-        client = chromadb.PersistentClient(
-            path=str(CHROMA_DB_PATH),
-            settings=Settings(anonymized_telemetry=False)
-        )
-        collection = client.get_collection(name=COLLECTION_NAME)
-        initial_chunks_count = collection.count()
-        logger.info(f"Текущий размер индекса: {initial_chunks_count} чанков")
-    except Exception as e:
-        logger.error(f"Ошибка при подключении к БД: {e}")
-        return {
-            "success": False,
-            "error": f"Ошибка подключения к БД: {e}",
-            "new_chunks": 0,
-            "updated_files": 0,
-            "total_chunks": 0
-        }
-    
-    # Обработка файлов
-    total_new_chunks = 0
-    processed_count = 0
-    errors = []
-    
-    for file_path, is_new in tqdm(files_to_process, desc="Обработка файлов"):
+    # Запись под блокировкой индекса (Task3/index_versions.py): если идет сборка
+    # build_index.py, обновление ждет ее и дописывает активированную ею версию
+    with IndexLock(on_wait=lambda: logger.info("Индекс собирается или обновляется другим процессом, ожидание...")):
+        # Подключение к векторной БД
+        logger.info("Подключение к векторной БД...")
         try:
-            filename = file_path.name
-            logger.info(f"Обработка файла: {filename} ({'новый' if is_new else 'измененный'})")
-            
-            # Если файл изменен, удаляем старые чанки
-            if not is_new:
-                removed_count = remove_old_chunks_for_file(collection, filename)
-                logger.info(f"Удалено старых чанков: {removed_count}")
-            
-            # Загрузка документа
-            doc = load_document(file_path)
-            
-            # Разбиение на чанки
-            chunks = split_document(doc)
-            logger.info(f"Создано чанков: {len(chunks)}")
-            
-            # Генерация эмбеддингов
-            texts = [chunk.page_content for chunk in chunks]
-            embeddings = embedding_model.encode(
-                texts,
-                show_progress_bar=False,
-                batch_size=32,
-                convert_to_numpy=True
-            )
-            
-            if hasattr(embeddings, 'tolist'):
-                embeddings = embeddings.tolist()
-            else:
-                embeddings = [emb.tolist() if hasattr(emb, 'tolist') else list(emb) for emb in embeddings]
-            
-            # Получаем текущее количество чанков для генерации уникальных ID
-            current_count = collection.count()
-            ids = [f"chunk_{current_count + i}" for i in range(len(chunks))]
-            
-            # Подготовка метаданных
-            metadatas = [
-                {
-                    "source": chunk.metadata["source"],
-                    "filename": chunk.metadata["filename"],
-                    "title": chunk.metadata["title"],
-                    "chunk_index": chunk.metadata["chunk_index"],
-                    "total_chunks": chunk.metadata["total_chunks"]
-                }
-                for chunk in chunks
-            ]
-            
-            # Добавление в индекс
-            collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas
+            index_path = resolve_index_path()
+            client = chromadb.PersistentClient(
+                path=str(index_path),
+                settings=Settings(anonymized_telemetry=False)
             )
-            
-            total_new_chunks += len(chunks)
-            processed_count += 1
-            
-            # Обновление состояния
-            file_hash = get_file_hash(file_path)
-            file_mtime = file_path.stat().st_mtime
-            state["processed_files"][filename] = {
-                "hash": file_hash,
-                "mtime": file_mtime,
-                "chunks_count": len(chunks),
-                "last_processed": datetime.now().isoformat()
+            collection = client.get_collection(name=COLLECTION_NAME)
+            initial_chunks_count = collection.count()
+            logger.info(f"Текущий размер индекса: {initial_chunks_count} чанков")
+        except Exception as e:
+            logger.error(f"Ошибка при подключении к БД: {e}")
+            return {
+                "success": False,
+                "error": f"Ошибка подключения к БД: {e}",
+                "new_chunks": 0,
+                "updated_files": 0,
+                "total_chunks": 0
             }
+        
+        # Обработка файлов
+        text_splitter = build_index.create_text_splitter()
+        total_new_chunks = 0
+        total_updated_chunks = 0
+        total_removed_chunks = 0
+        processed_count = 0
+        duplicates_skipped = 0
+        errors = []
+        
+        for file_path, is_new in tqdm(files_to_process, desc="Обработка файлов"):
+            try:
+                filename = file_path.name
+                
+                # Дубликат не индексируется; его чанки, если он был в индексе, удаляются
+                if filename in duplicate_of:
+                    removed = list(existing_chunks(collection, where={"filename": filename}))
+                    with profiler.stage("write", len(removed)):
+                        delete_ids(collection, removed)
+                    total_removed_chunks += len(removed)
+                    duplicates_skipped += 1
+                    state["processed_files"][filename] = {
+                        "hash": get_file_hash(file_path),
+                        "mtime": get_file_mtime(file_path),
+                        "chunks_count": 0,
+                        "duplicate_of": duplicate_of[filename],
+                        "last_processed": datetime.now().isoformat()
+                    }
+                    logger.info(f"Пропущен дубликат {filename} (индексируется {duplicate_of[filename]}), "
+                                f"удалено чанков: {len(removed)}")
+                    continue
+                
+                logger.info(f"Обработка файла: {filename} ({'новый' if is_new else 'измененный'})")
+                
+                # Загрузка документа
+                with profiler.stage("load", 1):
+                    doc = load_document(file_path)
+                
+                # Разбиение на чанки (как в Task3/build_index.py)
+                if filename in aliases:
+                    doc.metadata["aliases"] = aliases[filename]
+                with profiler.stage("split") as stage:
+                    chunks = build_index.split_document(doc, text_splitter)
+                    stage.items = len(chunks)
+                logger.info(f"Создано чанков: {len(chunks)}")
+                
+                # Сравнение с чанками файла в индексе: эмбеддинги нужны только новым
+                # чанкам, у прежних обновляются метаданные, исчезнувшие удаляются
+                metadatas = [build_index.chunk_metadata(chunk) for chunk in chunks]
+                with profiler.stage("diff", len(chunks)):
+                    diff = IndexDiff(existing_chunks(collection, where={"filename": filename}))
+                    new = diff.classify([chunk.metadata["chunk_id"] for chunk in chunks], metadatas)
+                changes = diff.stats()
+                logger.info(f"Новых чанков: {changes['added']}, с новыми метаданными: {changes['updated']}, "
+                            f"без изменений: {changes['unchanged']}, удалено: {changes['removed']}")
+                chunks = [chunks[i] for i in new]
+                metadatas = [metadatas[i] for i in new]
+                
+                # Генерация эмбеддингов
+                texts = [chunk.page_content for chunk in chunks]
+                with profiler.stage("embed", len(texts)) as stage:
+                    tokens = encoder.tokens
+                    embeddings = embedding_cache.encode(texts, lambda missing: encoder.encode(
+                        missing,
+                        show_progress_bar=False,
+                        batch_size=32,
+                        convert_to_numpy=True
+                    ))
+                    stage.values["tokens"] = encoder.tokens - tokens
+                
+                if hasattr(embeddings, 'tolist'):
+                    embeddings = embeddings.tolist()
+                else:
+                    embeddings = [emb.tolist() if hasattr(emb, 'tolist') else list(emb) for emb in embeddings]
+                
+                # Запись в индекс: ID детерминированы, поэтому повторная запись безопасна
+                removed = diff.removed()
+                with profiler.stage("write", len(chunks) + len(diff.updated) + len(removed)):
+                    if chunks:
+                        collection.upsert(
+                            ids=[chunk.metadata["chunk_id"] for chunk in chunks],
+                            embeddings=embeddings,
+                            documents=texts,
+                            metadatas=metadatas
+                        )
+                    diff.apply_updates(collection)
+                    delete_ids(collection, removed)
+                
+                total_new_chunks += changes["added"]
+                total_updated_chunks += changes["updated"]
+                total_removed_chunks += changes["removed"]
+                processed_count += 1
+                
+                # Обновление состояния
+                file_hash = get_file_hash(file_path)
+                file_mtime = get_file_mtime(file_path)
+                state["processed_files"][filename] = {
+                    "hash": file_hash,
+                    "mtime": file_mtime,
+                    "chunks_count": len(diff.seen),
+                    "aliases": aliases.get(filename, ""),
+                    "last_processed": datetime.now().isoformat()
+                }
+                
+                logger.info(f"Файл {filename} успешно обработан: записано {len(chunks)} новых чанков")
             
-            logger.info(f"Файл {filename} успешно обработан: добавлено {len(chunks)} чанков")
-            
-        except Exception as e:
-            error_msg = f"Ошибка при обработке {file_path.name}: {e}"
-            logger.error(error_msg)
-            errors.append(error_msg)
-    
-    # Сохранение состояния
-    state["last_update"] = start_datetime.isoformat()
-    save_state(state)
-    
-    # Финальная статистика
-    final_chunks_count = collection.count()
+            except Exception as e:
+                error_msg = f"Ошибка при обработке {file_path.name}: {e}"
+                logger.error(error_msg)
+                errors.append(error_msg)
+        
+        # Сохранение состояния
+        state["last_update"] = start_datetime.isoformat()
+        save_state(state)
+        cache_stats = embedding_cache.stats()
+        batching_stats = encoder.stats()
+        embedding_cache.close()
+        if isinstance(embedding_model, EmbeddingPool):
+            embedding_model.close()
+        
+        # Финальная статистика
+        final_chunks_count = collection.count()
     elapsed_time = time.time() - start_time
     end_datetime = datetime.now()
     
@@ -382,11 +492,20 @@ def update_index():
     logger.info("=" * 60)
     logger.info(f"Время завершения: {end_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"Время выполнения: {elapsed_time:.2f} секунд ({elapsed_time/60:.2f} минут)")
-    logger.info(f"Обработано файлов: {processed_count} из {len(files_to_process)}")
+    logger.info(f"Обработано файлов: {processed_count} из {len(files_to_process)} "
+                f"(пропущено дубликатов: {duplicates_skipped})")
     logger.info(f"Добавлено новых чанков: {total_new_chunks}")
+    logger.info(f"Обновлены метаданные чанков: {total_updated_chunks}, удалено чанков: {total_removed_chunks}")
+    logger.info(f"Эмбеддингов из кеша: {cache_stats['hits']}, посчитано заново: {cache_stats['misses']}")
+    logger.info(f"Паддинг: {batching_stats['padding_ratio']:.1%} "
+                f"(при батчах по 32 чанка: {batching_stats['baseline_padding_ratio']:.1%})")
     logger.info(f"Размер индекса до обновления: {initial_chunks_count} чанков")
     logger.info(f"Размер индекса после обновления: {final_chunks_count} чанков")
     logger.info(f"Ошибок: {len(errors)}")
+    profile = profiler.report()
+    logger.info("Этапы обновления:")
+    for line in format_report(profile):
+        logger.info(f"  {line}")
     
     if errors:
         logger.error("Список ошибок:")
@@ -400,9 +519,18 @@ def update_index():
         "end_time": end_datetime.isoformat(),
         "elapsed_time_seconds": elapsed_time,
         "updated_files": processed_count,
+        "duplicates_skipped": duplicates_skipped,
+        "duplicate_clusters": duplicate_clusters,
         "new_chunks": total_new_chunks,
+        "updated_chunks": total_updated_chunks,
+        "removed_chunks": total_removed_chunks,
+        "embedding_cache": cache_stats,
+        "embedding_batching": batching_stats,
         "initial_chunks_count": initial_chunks_count,
         "final_chunks_count": final_chunks_count,
+        "index_path": str(index_path),
+        "stages": profile["stages"],
+        "resources": profile["total"],
         "errors": errors
     }
     
@@ -411,6 +539,9 @@ def update_index():
         json.dump(result, f, indent=2, ensure_ascii=False)
     
     logger.info(f"Результат сохранен в: {result_file}")
+    profile_file = profiler.dump_profile(result_file.with_name(result_file.stem.replace("result", "profile") + ".prof"))
+    if profile_file:
+        logger.info(f"Профиль cProfile сохранен в: {profile_file}")
     
     return result
 
@@ -12,8 +12,10 @@ from chromadb.config import Settings
 SCRIPT_DIR = Path(__file__).parent.absolute()
 PROJECT_ROOT = SCRIPT_DIR.parent
 sys.path.insert(0, str(PROJECT_ROOT / "Task4"))
+sys.path.insert(0, str(PROJECT_ROOT / "Task3"))
 
-from config import CHROMA_DB_PATH, COLLECTION_NAME
+from config import CHROMA_DB_PATH as LEGACY_CHROMA_DB_PATH, CHROMA_VERSIONS_PATH, COLLECTION_NAME
+from index_versions import IndexLock, resolve_index_path
 
 # Сущности для удаления (по названиям файлов/документов)
 ENTITIES_TO_REMOVE = [
@@ -31,15 +33,25 @@ def remove_entities_from_index():
     print("Удаление сущностей из векторного индекса")
     print("=" * 60)
     
-    if not CHROMA_DB_PATH.exists():
-        print(f"Ошибка: Векторная база данных не найдена по пути {CHROMA_DB_PATH}")
+    # Удаление под блокировкой индекса (Task3/index_versions.py): сборка build_index.py
+    # не скопирует версию посреди удаления, а удаление, начатое во время сборки,
+    # дождется активации новой версии и удалит чанки уже из нее
+    with IndexLock(CHROMA_VERSIONS_PATH,
+                   on_wait=lambda: print("Индекс собирается или обновляется другим процессом, ожидание...")):
+        remove_entities(resolve_index_path(CHROMA_VERSIONS_PATH, LEGACY_CHROMA_DB_PATH))
+
+
+def remove_entities(index_path: Path):
+    """Удаляет чанки сущностей из версии индекса index_path (вызывается под IndexLock)."""
+    if not index_path.exists():
+        print(f"Ошибка: Векторная база данных не найдена по пути {index_path}")
         print("Сначала запустите Task3/build_index.py для создания индекса.")
         return
     
     # Подключение к ChromaDB
-    print("Подключение к векторной базе данных...")
+    print(f"Подключение к векторной базе данных ({index_path.name})...")
     client = chromadb.PersistentClient(
-        path=str(CHROMA_DB_PATH),
+        path=str(index_path),
         settings=Settings(anonymized_telemetry=False)
     )
     